@@ -3,17 +3,17 @@
 
 import os
 import time
+import asyncio
 import hashlib
 import json
 from datetime import datetime, timedelta
 from typing import List, Optional
 from functools import wraps
 
-import cv2
-import numpy as np
 from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, status, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
 import uvicorn
@@ -21,8 +21,15 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
-# 导入植物识别模块
-import plantid
+# 导入植物识别模块；依赖numpy、cv2、onnxruntime的模块在模型加载线程中才导入，端口可以先开始监听
+from app_config import get_config
+from result_cache import create_result_cache, make_cache_key, make_entry
+from inference_pool import InferencePool, InferencePoolFullError
+from metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, ServiceMetrics
+from model_loader import FAILED, ModelLoader, ModelNotReadyError
+from near_duplicate import create_near_duplicate_index
+from stage_timer import StageTimer
+from upload_stream import NDJSONStreamingResponse, detect_format, stream_uploads
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -47,11 +54,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 服务指标
+metrics = ServiceMetrics()
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 # 安全认证
 security = HTTPBearer()
 
 # 全局变量
 plant_identifier = None
+micro_batcher = None
 api_keys = {
     "demo_key": "demo_user",
     "test_key": "test_user"
@@ -75,6 +87,9 @@ class IdentificationResponse(BaseModel):
     process_time: float
     timestamp: str
     image_hash: Optional[str] = None
+    from_cache: bool = False
+    near_duplicate_of: Optional[str] = None
+    timings: Optional[dict] = None
 
 class BatchIdentificationResponse(BaseModel):
     status: str
@@ -90,10 +105,25 @@ class HealthResponse(BaseModel):
     timestamp: str
     uptime: float
     model_loaded: bool
+    live: bool = True
+    ready: bool = False
+    model_state: Optional[str] = None
+
+# 缓存；开启near_duplicate时，图片摘要未命中再按感知哈希查找相近的已识别图片
+result_cache = create_result_cache()
+near_duplicate_index = create_near_duplicate_index()
 
-# 缓存
-cache = {}
-cache_ttl = 3600  # 1小时
+# 推理线程池，避免解码与推理阻塞事件循环
+inference_pool = InferencePool(
+    max_workers=get_config('performance', 'max_workers', 4),
+    max_queue_size=get_config('performance', 'max_queue_size', 32),
+    retry_after=get_config('performance', 'retry_after', 1)
+)
+metrics.add_gauge('inference_queue_depth', '推理线程池排队的任务数', lambda: inference_pool.queue_depth)
+metrics.add_gauge('inference_pending', '推理线程池正在执行与排队的任务数', lambda: inference_pool.pending)
+metrics.add_stats(result_cache.stats)
+if near_duplicate_index is not None:
+    metrics.add_stats(near_duplicate_index.stats)
 
 def get_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """验证API密钥"""
@@ -106,112 +136,238 @@ def get_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
         )
     return api_keys[token]
 
+def load_plant_identifier():
+    """创建植物识别器，由model_loader调用"""
+    from plant_engine import create_plant_identifier
+    start_time = time.perf_counter()
+    identifier = create_plant_identifier()
+    metrics.set_model_load_time(time.perf_counter() - start_time)
+    return identifier
+
+def warmup_plant_identifier(identifier):
+    """预热推理成功后才启用植物识别器，由model_loader调用"""
+    global plant_identifier, micro_batcher
+    from micro_batcher import MicroBatcher
+    # 每个进程（含prefork_server.py的各工作进程）各自预热，首个请求不承担会话初始化的开销
+    identifier.warmup()
+    if get_config('performance', 'micro_batching', True):
+        # 提交微批的是推理线程池中的线程，同时等待的请求数不超过线程数，批量也就不会更大
+        micro_batcher = MicroBatcher(
+            identifier,
+            max_batch_size=min(get_config('performance', 'batch_size', 10), inference_pool.max_workers),
+            max_wait_ms=get_config('performance', 'batch_timeout_ms', 5)
+        )
+    plant_identifier = identifier
+    print("植物识别器初始化成功")
+
+# 模型加载器，导入耗时按以下顺序分别统计；加载或预热失败后在后台按指数退避重试
+model_loader = ModelLoader(
+    load_plant_identifier,
+    imports=('numpy', 'cv2', 'onnxruntime', 'image_utils', 'batch_pipeline', 'micro_batcher', 'plant_engine'),
+    retry_after=get_config('startup', 'retry_after', 5),
+    warmup=warmup_plant_identifier,
+    reload_initial_delay=get_config('health', 'reload_initial_delay', 1),
+    reload_max_delay=get_config('health', 'reload_max_delay', 60)
+)
+
 def init_plant_identifier():
-    """初始化植物识别器"""
-    global plant_identifier
-    if plant_identifier is None:
-        try:
-            plant_identifier = plantid.PlantIdentifier()
-            print("植物识别器初始化成功")
-            return True
-        except Exception as e:
-            print(f"植物识别器初始化失败: {e}")
-            return False
-    return True
+    """初始化植物识别器，正在后台加载时等待加载完成"""
+    return model_loader.load()
+
+def require_plant_identifier():
+    """处理请求前确认植物识别器可用，加载中返回503，加载失败返回500"""
+    try:
+        identifier = model_loader.get()
+    except ModelNotReadyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    if identifier is None:
+        raise HTTPException(status_code=500, detail="植物识别器初始化失败")
+    return identifier
 
 def get_image_hash(image_data: bytes) -> str:
     """计算图片哈希值用于缓存"""
     return hashlib.md5(image_data).hexdigest()
 
-def check_cache(image_hash: str) -> Optional[dict]:
-    """检查缓存"""
-    if image_hash in cache:
-        cached_data = cache[image_hash]
-        if time.time() - cached_data['timestamp'] < cache_ttl:
-            return cached_data['data']
-    return None
-
-def set_cache(image_hash: str, data: dict):
-    """设置缓存"""
-    cache[image_hash] = {
-        'data': data,
-        'timestamp': time.time()
+def build_response(entry: tuple, image_hash: str, from_cache: bool, process_time: Optional[float] = None) -> dict:
+    """由精简的缓存记录构造响应数据，process_time默认取记录中的识别耗时"""
+    results, cached_process_time, timestamp = entry
+    if process_time is None:
+        process_time = cached_process_time
+    return {
+        'status': 'success',
+        'message': '识别成功',
+        'results': [
+            {'chinese_name': chinese_name, 'latin_name': latin_name, 'probability': probability, 'rank': i + 1}
+            for i, (chinese_name, latin_name, probability) in enumerate(results)
+        ],
+        'process_time': process_time,
+        'timestamp': timestamp,
+        'image_hash': image_hash,
+        'from_cache': from_cache
     }
-    # 清理过期缓存
-    current_time = time.time()
-    expired_keys = [k for k, v in cache.items() if current_time - v['timestamp'] > cache_ttl]
-    for key in expired_keys:
-        del cache[key]
+
+# 允许的图片扩展名
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp'}
 
 def validate_image_file(file: UploadFile) -> bool:
     """验证图片文件"""
-    allowed_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp'}
     file_extension = os.path.splitext(file.filename)[1].lower()
-    return file_extension in allowed_extensions
+    return file_extension in ALLOWED_EXTENSIONS
 
-def process_image(file: UploadFile, topk: int = 5) -> dict:
-    """处理图片识别"""
-    start_time = time.time()
-    
-    # 读取图片
-    file_content = file.file.read()
-    nparr = np.frombuffer(file_content, np.uint8)
-    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+# 单张图片最多返回的结果数
+MAX_TOPK = 20
+
+def validate_topk(topk: int):
+    """topk须在1到MAX_TOPK之间，否则返回400，避免返回并缓存全部类别"""
+    if not 1 <= topk <= MAX_TOPK:
+        raise HTTPException(status_code=400, detail=f"topk须在1到{MAX_TOPK}之间")
+
+async def run_inference(func, *args):
+    """在推理线程池中执行，队列已满时返回503"""
+    try:
+        return await inference_pool.run(func, *args)
+    except InferencePoolFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务繁忙，请稍后重试",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+async def run_inference_chunked(func, args_list: list) -> list:
+    """
+    在推理线程池中并行执行多个任务，每组不超过线程数，批量请求不会因文件数超过队列容量而被拒绝
+
+    各任务的异常作为结果返回，调用方逐个处理。
+    """
+    chunk_size = inference_pool.max_workers
+    results = []
+    for i in range(0, len(args_list), chunk_size):
+        results.extend(await asyncio.gather(
+            *(run_inference(func, *args) for args in args_list[i: i + chunk_size]),
+            return_exceptions=True))
+    return results
+
+async def run_inference_waiting(func, *args):
+    """在推理线程池中执行，队列已满时等待后重试，用于流式批量识别"""
+    while True:
+        try:
+            return await inference_pool.run(func, *args)
+        except InferencePoolFullError as e:
+            await asyncio.sleep(e.retry_after)
+
+def read_uploads(files: List[UploadFile], topk: int) -> tuple:
+    """
+    读取多个上传文件后批量查询缓存，Redis下只需一次往返
+
+    返回(内容, 哈希, 各阶段耗时)列表与对应的缓存记录（未命中为None）。
+    """
+    from image_utils import read_and_hash
+    uploads = []
+    for file in files:
+        timer = StageTimer()
+        file_content, image_hash = read_and_hash(file.file, timings=timer)
+        uploads.append((file_content, image_hash, timer))
+    cached_entries = result_cache.get_many([make_cache_key(image_hash, topk) for _, image_hash, _ in uploads])
+    return uploads, cached_entries
+
+def store_entries(items: list):
+    """写入多条缓存记录，items为(缓存键, 记录)列表"""
+    for key, entry in items:
+        result_cache.set(key, entry)
+
+def identify_image_data(file_content, image_hash: str, topk: int = 5, timer: Optional[StageTimer] = None) -> dict:
+    """解码并识别图片数据，结果写入缓存，各阶段耗时记入timer"""
+    identifier = require_plant_identifier()
+    from batch_pipeline import identify_staged
+    from image_utils import decode_for_inference
+    timer = StageTimer() if timer is None else timer
+    start_time = time.perf_counter()
     
+    with timer.stage('decode'):
+        image = decode_for_inference(file_content)
     if image is None:
         raise HTTPException(status_code=400, detail="无法读取图片文件")
     
-    # 检查缓存
-    image_hash = get_image_hash(file_content)
-    cached_result = check_cache(image_hash)
-    if cached_result:
-        cached_result['from_cache'] = True
-        return cached_result
+    # 近重复图片（缩放、重新压缩、去掉EXIF等）复用已有结果，并按本图的摘要缓存一份
+    phash = None
+    if near_duplicate_index is not None:
+        from near_duplicate import dhash
+        with timer.stage('near_duplicate'):
+            phash = dhash(image)
+            found = near_duplicate_index.lookup(phash, lambda matched: result_cache.get(make_cache_key(matched, topk)))
+        if found is not None:
+            matched_hash, entry = found
+            timer.cache_hit = True
+            result_cache.set(make_cache_key(image_hash, topk), entry)
+            response = build_response(entry, image_hash, from_cache=True, process_time=round(timer.elapsed(), 3))
+            response['near_duplicate_of'] = matched_hash
+            return response
     
     # 进行识别
-    if not init_plant_identifier():
-        raise HTTPException(status_code=500, detail="植物识别器初始化失败")
-    
-    outputs = plant_identifier.identify(image, topk=topk)
-    process_time = time.time() - start_time
+    outputs = identify_staged(identifier, image, topk, timer,
+                              infer=micro_batcher.infer if micro_batcher else None)
+    process_time = time.perf_counter() - start_time
     
     if outputs['status'] != 0:
         raise HTTPException(status_code=500, detail=outputs['message'])
     
-    # 格式化结果
-    results = []
-    for i, result in enumerate(outputs['results']):
-        results.append(IdentificationResult(
-            chinese_name=result['chinese_name'],
-            latin_name=result['latin_name'],
-            probability=result['probability'],
-            rank=i + 1
-        ))
+    # 缓存精简结果
+    entry = make_entry(outputs['results'], process_time)
+    result_cache.set(make_cache_key(image_hash, topk), entry)
+    if phash is not None:
+        near_duplicate_index.add(phash, image_hash)
     
-    response_data = {
-        'status': 'success',
-        'message': '识别成功',
-        'results': results,
-        'process_time': round(process_time, 3),
-        'timestamp': datetime.now().isoformat(),
-        'image_hash': image_hash,
-        'from_cache': False
-    }
-    
-    # 设置缓存
-    set_cache(image_hash, response_data)
-    
-    return response_data
+    return build_response(entry, image_hash, from_cache=False, process_time=round(timer.elapsed(), 3))
+
+def process_image_data(file_content, image_hash: str, topk: int = 5, timer: Optional[StageTimer] = None) -> dict:
+    """
+    识别已读取的图片数据，命中缓存时无需解码
+
+    返回的process_time为本次请求的实际耗时，命中缓存时不沿用缓存记录中的识别耗时。
+    """
+    timer = StageTimer() if timer is None else timer
+    try:
+        with timer.stage('cache_lookup'):
+            cached_result = result_cache.get(make_cache_key(image_hash, topk))
+        timer.cache_hit = cached_result is not None
+        if cached_result is not None:
+            return build_response(cached_result, image_hash, from_cache=True,
+                                  process_time=round(timer.elapsed(), 3))
+        
+        return identify_image_data(file_content, image_hash, topk, timer)
+    finally:
+        metrics.observe_stages(timer)
+
+def process_image(file: UploadFile, topk: int = 5, timer: Optional[StageTimer] = None) -> dict:
+    """处理图片识别，timer在请求进入时创建，排队等待推理线程的时间记为queue"""
+    from image_utils import read_and_hash
+    timer = StageTimer() if timer is None else timer
+    timer.add('queue', timer.elapsed())
+    # 读取图片，同时计算哈希
+    file_content, image_hash = read_and_hash(file.file, timings=timer)
+    return process_image_data(file_content, image_hash, topk, timer)
 
 @app.on_event("startup")
 async def startup_event():
     """应用启动事件"""
     print("正在启动植物识别API服务...")
-    if init_plant_identifier():
-        print("植物识别器初始化成功")
-    else:
+    if get_config('startup', 'background_load', True):
+        # 先开始监听端口，模型加载完成前/health报告未就绪，识别请求返回503
+        model_loader.start()
+    elif not init_plant_identifier():
         print("警告：植物识别器初始化失败")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭事件"""
+    inference_pool.shutdown(wait=False)
+    if micro_batcher is not None:
+        micro_batcher.close()
+
 @app.get("/", response_model=dict)
 async def root():
     """根路径"""
@@ -219,15 +375,18 @@ async def root():
         "message": "植物识别API服务",
         "version": "1.0.0",
         "docs": "/docs",
-        "health": "/health"
+        "health": "/health",
+        "liveness": "/health/live",
+        "readiness": "/health/ready"
     }
 
-@app.post("/identify", response_model=IdentificationResponse)
+@app.post("/identify", response_model=IdentificationResponse, response_model_exclude_none=True)
 @limiter.limit("10/minute")
 async def identify_plant(
     request: Request,
     file: UploadFile = File(...),
     topk: int = 5,
+    timings: bool = False,
     api_key: str = Depends(get_api_key)
 ):
     """
@@ -235,14 +394,20 @@ async def identify_plant(
     
     - **file**: 图片文件
     - **topk**: 返回结果数量 (1-20)
+    - **timings**: 是否在响应中返回各阶段耗时（秒），Server-Timing响应头总会返回
     - **api_key**: API密钥
     """
     if not validate_image_file(file):
         raise HTTPException(status_code=400, detail="不支持的文件格式")
+    validate_topk(topk)
     
+    timer = StageTimer()
     try:
-        result = process_image(file, topk)
-        return IdentificationResponse(**result)
+        result = await run_inference(process_image, file, topk, timer)
+        if timings:
+            result['timings'] = timer.summary()
+        # 结果由build_response按IdentificationResponse的字段构造，直接序列化，不再逐行校验
+        return JSONResponse(result, headers={'Server-Timing': timer.server_timing()})
     except HTTPException:
         raise
     except Exception as e:
@@ -261,79 +426,231 @@ async def batch_identify(
     - **files**: 图片文件列表
     - **api_key**: API密钥
     """
-    if len(files) > 10:
-        raise HTTPException(status_code=400, detail="一次最多处理10张图片")
+    max_files = get_config('api', 'max_batch_files', 10)
+    if len(files) > max_files:
+        raise HTTPException(status_code=400, detail=f"一次最多处理{max_files}张图片")
     
-    results = []
-    total_time = 0
+    identifier = require_plant_identifier()
+    from batch_pipeline import identify_prepared, prepare_image, round_timings, split_batches
     
+    batch_start = time.time()
+    topk = 3
+    
+    # 读取全部文件与查询缓存都在推理线程中进行，Redis的网络往返不阻塞事件循环
+    valid_files = [file for file in files if validate_image_file(file)]
+    uploads, cached_entries = await run_inference(read_uploads, valid_files, topk)
+    
+    # 未命中缓存的图片并行解码与预处理
+    pending = [k for k, entry in enumerate(cached_entries) if entry is None]
+    prepared = await run_inference_chunked(prepare_image, [(identifier, uploads[k][0]) for k in pending])
+    timings = [upload_timings for _, _, upload_timings in uploads]
+    errors = {}
+    ready = []
+    for k, prepared_result in zip(pending, prepared):
+        if isinstance(prepared_result, HTTPException):
+            raise prepared_result
+        if isinstance(prepared_result, Exception):
+            errors[k] = f'处理失败: {prepared_result}'
+            continue
+        tensor, stage_timings = prepared_result
+        timings[k].update(stage_timings)
+        if tensor is None:
+            errors[k] = '无法读取图片文件'
+        else:
+            ready.append((k, tensor))
+    
+    # 按批量大小分组，每组一次模型推理
+    batches = split_batches(ready, get_config('performance', 'batch_size', 10))
+    batch_outputs = await run_inference_chunked(
+        identify_prepared, [(identifier, [tensor for _, tensor in batch], topk) for batch in batches])
+    new_entries = []
+    for batch, batch_output in zip(batches, batch_outputs):
+        if isinstance(batch_output, HTTPException):
+            raise batch_output
+        for position, (k, _) in enumerate(batch):
+            if isinstance(batch_output, Exception):
+                errors[k] = str(batch_output)
+                continue
+            outputs, batch_timings = batch_output
+            timings[k].update(batch_timings)
+            if outputs[position]['status'] != 0:
+                errors[k] = outputs[position]['message']
+                continue
+            process_time = sum(v for stage, v in timings[k].items() if stage not in ('read', 'hash'))
+            cached_entries[k] = make_entry(outputs[position]['results'], process_time)
+            new_entries.append((make_cache_key(uploads[k][1], topk), cached_entries[k]))
+    if new_entries:
+        # 识别已经完成，写缓存不占用推理线程池的名额，线程池已满时也不会让请求失败
+        await run_in_threadpool(store_entries, new_entries)
+    for upload_timings in timings:
+        metrics.observe_stages(upload_timings)
+    
+    # 按上传顺序组装结果
+    positions = {id(file): k for k, file in enumerate(valid_files)}
+    results = []
     for file in files:
-        if not validate_image_file(file):
+        if id(file) not in positions:
             results.append({
                 'filename': file.filename,
                 'error': '不支持的文件格式'
             })
             continue
         
-        try:
-            start_time = time.time()
-            result = process_image(file, topk=3)
-            process_time = time.time() - start_time
-            total_time += process_time
-            
-            top_result = result['results'][0] if result['results'] else None
-            results.append({
-                'filename': file.filename,
-                'chinese_name': top_result.chinese_name if top_result else None,
-                'latin_name': top_result.latin_name if top_result else None,
-                'probability': top_result.probability if top_result else None,
-                'process_time': round(process_time, 3),
-                'from_cache': result.get('from_cache', False)
-            })
-        except Exception as e:
+        k = positions[id(file)]
+        if k in errors:
             results.append({
                 'filename': file.filename,
-                'error': str(e)
+                'error': errors[k],
+                'timings': round_timings(timings[k])
             })
+            continue
+        
+        result = build_response(cached_entries[k], uploads[k][1], from_cache=k not in pending)
+        top_result = result['results'][0] if result['results'] else {}
+        results.append({
+            'filename': file.filename,
+            'chinese_name': top_result.get('chinese_name'),
+            'latin_name': top_result.get('latin_name'),
+            'probability': top_result.get('probability'),
+            'process_time': round(sum(timings[k].values()), 3),
+            'from_cache': result['from_cache'],
+            'timings': round_timings(timings[k])
+        })
     
-    return BatchIdentificationResponse(
-        status='success',
-        message=f'批量识别完成，共处理{len(results)}个文件',
-        results=results,
-        total_files=len(results),
-        total_time=round(total_time, 3),
-        average_time=round(total_time / len(results), 3) if results else 0
-    )
+    total_time = time.time() - batch_start
+    
+    return JSONResponse({
+        'status': 'success',
+        'message': f'批量识别完成，共处理{len(results)}个文件',
+        'results': results,
+        'total_files': len(results),
+        'total_time': round(total_time, 3),
+        'average_time': round(total_time / len(results), 3) if results else 0
+    })
+
+@app.post("/identify/stream")
+@limiter.limit("5/minute")
+async def stream_identify(
+    request: Request,
+    topk: int = 5,
+    api_key: str = Depends(get_api_key)
+):
+    """
+    流式批量识别
+    
+    请求体为multipart/form-data（任意数量的文件）或tar、tar.gz、zip压缩包，
+    每识别完一张图片立即返回一行JSON（NDJSON），字段与/identify相同并附带filename。
+    
+    - **topk**: 返回结果数量 (1-20)
+    - **api_key**: API密钥
+    """
+    if detect_format(request.headers.get('content-type')) is None:
+        raise HTTPException(status_code=400, detail="请求体须为multipart/form-data或tar/zip压缩包")
+    validate_topk(topk)
+    require_plant_identifier()
+    
+    async def process(filename, file_content):
+        timer = StageTimer()
+        with timer.stage('hash'):
+            image_hash = get_image_hash(file_content)
+        return await run_inference_waiting(
+            process_image_data, file_content, image_hash, topk, timer)
+    
+    async def lines():
+        async for result in stream_uploads(
+                request, process, ALLOWED_EXTENSIONS,
+                max_inflight=get_config('api', 'stream_max_inflight', 8),
+                max_file_size=get_config('upload', 'max_file_size', 16 * 1024 * 1024),
+                max_archive_size=get_config('api', 'stream_max_archive_size', 512 * 1024 * 1024)):
+            yield json.dumps(result, ensure_ascii=False) + '\n'
+    
+    return NDJSONStreamingResponse(lines())
 
 @app.get("/health", response_model=HealthResponse)
-async def health_check():
-    """健康检查"""
+async def health_check(response: Response):
+    """健康检查，模型就绪时返回200，加载中返回503、加载失败返回500，容器健康检查据此判断是否就绪"""
     uptime = time.time() - app.start_time if hasattr(app, 'start_time') else 0
+    model_state = model_loader.state
+    if model_loader.ready:
+        health_status, message = 'healthy', '服务正常运行'
+    elif model_state == FAILED:
+        health_status, message = 'unhealthy', f'植物识别器初始化失败: {model_loader.error}'
+        response.status_code = 500
+    else:
+        health_status, message = 'starting', '植物识别器加载中'
+        response.status_code = 503
     
     return HealthResponse(
-        status='healthy' if init_plant_identifier() else 'unhealthy',
-        message='服务正常运行' if init_plant_identifier() else '植物识别器未初始化',
+        status=health_status,
+        message=message,
         timestamp=datetime.now().isoformat(),
         uptime=round(uptime, 2),
-        model_loaded=plant_identifier is not None
+        model_loaded=plant_identifier is not None,
+        ready=model_loader.ready,
+        model_state=model_state
+    )
+
+@app.get("/health/live")
+async def liveness_check():
+    """存活检查：能响应即为存活，不检查模型，也不会触发加载"""
+    return {
+        'status': 'alive',
+        'timestamp': datetime.now().isoformat(),
+        'uptime': round(time.time() - getattr(app, 'start_time', time.time()), 2)
+    }
+
+@app.get("/health/ready")
+async def readiness_check():
+    """
+    就绪检查：模型已加载且预热推理成功、推理队列未饱和时返回200，否则返回503
+
+    只读取已记录的状态，模型的重新加载由model_loader在后台完成。
+    """
+    model_status = model_loader.status()
+    pending = inference_pool.pending
+    saturated = pending >= inference_pool.capacity * get_config('health', 'ready_max_queue_ratio', 0.9)
+    reasons = []
+    if not model_status['ready']:
+        reasons.append('植物识别器加载中' if model_status['state'] != FAILED else '植物识别器初始化失败')
+    if saturated:
+        reasons.append('推理队列已满')
+    ready = not reasons
+    retry_after = model_status['next_retry_in'] or model_loader.retry_after
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            'status': 'ready' if ready else 'not_ready',
+            'reasons': reasons,
+            'model': model_status,
+            'queue': {'pending': pending, 'capacity': inference_pool.capacity},
+            'timestamp': datetime.now().isoformat()
+        },
+        headers=None if ready else {'Retry-After': str(max(1, int(retry_after + 0.999)))}
     )
 
 @app.get("/stats")
 async def get_stats(api_key: str = Depends(get_api_key)):
     """获取服务统计信息"""
     return {
-        'cache_size': len(cache),
-        'cache_hits': getattr(app.state, 'cache_hits', 0),
-        'total_requests': getattr(app.state, 'total_requests', 0),
+        **result_cache.stats(),
+        'total_requests': metrics.total_requests,
         'model_loaded': plant_identifier is not None,
         'uptime': time.time() - getattr(app, 'start_time', time.time())
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus指标"""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="指标导出未启用")
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE_LATEST)
+
 @app.delete("/cache")
 async def clear_cache(api_key: str = Depends(get_api_key)):
     """清空缓存"""
-    global cache
-    cache.clear()
+    result_cache.clear()
+    if near_duplicate_index is not None:
+        near_duplicate_index.clear()
     return {"message": "缓存已清空"}
 
 @app.exception_handler(HTTPException)
@@ -345,7 +662,8 @@ async def http_exception_handler(request, exc):
             "error": exc.detail,
             "timestamp": datetime.now().isoformat(),
             "path": str(request.url)
-        }
+        },
+        headers=getattr(exc, 'headers', None)
     )
 
 @app.exception_handler(Exception)
@@ -9,14 +9,14 @@ from datetime import datetime
 from typing import List, Optional
 from functools import wraps
 
-import cv2
-import numpy as np
+from image_utils import decode_for_inference, read_and_hash
+from result_cache import create_result_cache, make_cache_key, make_entry
 
 # 尝试导入FastAPI相关模块
 try:
     from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, status
     from fastapi.middleware.cors import CORSMiddleware
-    from fastapi.responses import JSONResponse
+    from fastapi.responses import JSONResponse, Response
     from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
     from pydantic import BaseModel, Field
     import uvicorn
@@ -31,7 +31,7 @@ except ImportError as e:
 
 # 导入植物识别模块
 try:
-    import plantid
+    from plant_engine import create_plant_identifier
     PLANTID_AVAILABLE = True
 except ImportError as e:
     print(f"植物识别模块导入失败: {e}")
@@ -80,8 +80,7 @@ api_keys = {
 }
 
 # 缓存
-cache = {}
-cache_ttl = 3600  # 1小时
+result_cache = create_result_cache()
 
 # 数据模型
 class IdentificationResult(BaseModel):
@@ -129,7 +128,7 @@ def init_plant_identifier():
     global plant_identifier
     if plant_identifier is None:
         try:
-            plant_identifier = plantid.PlantIdentifier()
+            plant_identifier = create_plant_identifier()
             print("植物识别器初始化成功")
             return True
         except Exception as e:
@@ -141,25 +140,22 @@ def get_image_hash(image_data: bytes) -> str:
     """计算图片哈希值用于缓存"""
     return hashlib.md5(image_data).hexdigest()
 
-def check_cache(image_hash: str) -> Optional[dict]:
-    """检查缓存"""
-    if image_hash in cache:
-        cached_data = cache[image_hash]
-        if time.time() - cached_data['timestamp'] < cache_ttl:
-            return cached_data['data']
-    return None
-
-def set_cache(image_hash: str, data: dict):
-    """设置缓存"""
-    cache[image_hash] = {
-        'data': data,
-        'timestamp': time.time()
+def build_response(entry: tuple, image_hash: str, from_cache: bool) -> dict:
+    """由精简的缓存记录构造响应数据"""
+    results, process_time, timestamp = entry
+    return {
+        'status': 'success',
+        'message': '识别成功',
+        'results': [
+            IdentificationResult(chinese_name=chinese_name, latin_name=latin_name,
+                                 probability=probability, rank=i + 1)
+            for i, (chinese_name, latin_name, probability) in enumerate(results)
+        ],
+        'process_time': process_time,
+        'timestamp': timestamp,
+        'image_hash': image_hash,
+        'from_cache': from_cache
     }
-    # 清理过期缓存
-    current_time = time.time()
-    expired_keys = [k for k, v in cache.items() if current_time - v['timestamp'] > cache_ttl]
-    for key in expired_keys:
-        del cache[key]
 
 def validate_image_file(file: UploadFile) -> bool:
     """验证图片文件"""
@@ -167,25 +163,30 @@ def validate_image_file(file: UploadFile) -> bool:
     file_extension = os.path.splitext(file.filename)[1].lower()
     return file_extension in allowed_extensions
 
+# 单张图片最多返回的结果数
+MAX_TOPK = 20
+
+def validate_topk(topk: int):
+    """topk须在1到MAX_TOPK之间，否则返回400，避免返回并缓存全部类别"""
+    if not 1 <= topk <= MAX_TOPK:
+        raise HTTPException(status_code=400, detail=f"topk须在1到{MAX_TOPK}之间")
+
 def process_image(file: UploadFile, topk: int = 5) -> dict:
     """处理图片识别"""
     start_time = time.time()
     
-    # 读取图片
-    file_content = file.file.read()
-    nparr = np.frombuffer(file_content, np.uint8)
-    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    # 读取图片，同时计算哈希
+    file_content, image_hash = read_and_hash(file.file)
+    
+    # 检查缓存，命中时无需解码
+    cached_result = result_cache.get(make_cache_key(image_hash, topk))
+    if cached_result is not None:
+        return build_response(cached_result, image_hash, from_cache=True)
     
+    image = decode_for_inference(file_content)
     if image is None:
         raise HTTPException(status_code=400, detail="无法读取图片文件")
     
-    # 检查缓存
-    image_hash = get_image_hash(file_content)
-    cached_result = check_cache(image_hash)
-    if cached_result:
-        cached_result['from_cache'] = True
-        return cached_result
-    
     # 进行识别
     if not init_plant_identifier():
         raise HTTPException(status_code=500, detail="植物识别器初始化失败")
@@ -196,30 +197,11 @@ def process_image(file: UploadFile, topk: int = 5) -> dict:
     if outputs['status'] != 0:
         raise HTTPException(status_code=500, detail=outputs['message'])
     
-    # 格式化结果
-    results = []
-    for i, result in enumerate(outputs['results']):
-        results.append(IdentificationResult(
-            chinese_name=result['chinese_name'],
-            latin_name=result['latin_name'],
-            probability=result['probability'],
-            rank=i + 1
-        ))
-    
-    response_data = {
-        'status': 'success',
-        'message': '识别成功',
-        'results': results,
-        'process_time': round(process_time, 3),
-        'timestamp': datetime.now().isoformat(),
-        'image_hash': image_hash,
-        'from_cache': False
-    }
-    
-    # 设置缓存
-    set_cache(image_hash, response_data)
+    # 缓存精简结果
+    entry = make_entry(outputs['results'], process_time)
+    result_cache.set(make_cache_key(image_hash, topk), entry)
     
-    return response_data
+    return build_response(entry, image_hash, from_cache=False)
 
 @app.on_event("startup")
 async def startup_event():
@@ -255,6 +237,7 @@ async def identify_plant(
     """
     if not validate_image_file(file):
         raise HTTPException(status_code=400, detail="不支持的文件格式")
+    validate_topk(topk)
     
     try:
         result = process_image(file, topk)
@@ -265,16 +248,19 @@ async def identify_plant(
         raise HTTPException(status_code=500, detail=f"处理失败: {str(e)}")
 
 @app.get("/health", response_model=HealthResponse)
-async def health_check():
-    """健康检查"""
+async def health_check(response: Response):
+    """健康检查，只读取模型状态，未加载时返回503，容器健康检查据此判断是否就绪"""
     uptime = time.time() - getattr(app, 'start_time', time.time())
+    loaded = plant_identifier is not None
+    if not loaded:
+        response.status_code = 503
     
     return HealthResponse(
-        status='healthy' if init_plant_identifier() else 'unhealthy',
-        message='服务正常运行' if init_plant_identifier() else '植物识别器未初始化',
+        status='healthy' if loaded else 'unhealthy',
+        message='服务正常运行' if loaded else '植物识别器未初始化',
         timestamp=datetime.now().isoformat(),
         uptime=round(uptime, 2),
-        model_loaded=plant_identifier is not None
+        model_loaded=loaded
     )
 
 @app.get("/test")
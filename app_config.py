@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+from functools import lru_cache
+
+try:
+    import yaml
+    YAML_AVAILABLE = True
+except ImportError:
+    YAML_AVAILABLE = False
+
+# 配置文件路径，可通过环境变量 PLANTID_CONFIG 覆盖
+CONFIG_PATH = os.environ.get(
+    'PLANTID_CONFIG',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.yaml')
+)
+
+@lru_cache(maxsize=1)
+def load_config() -> dict:
+    """读取config.yaml，文件缺失或无法解析时返回空配置"""
+    if not YAML_AVAILABLE:
+        print("未安装pyyaml，使用默认配置")
+        return {}
+    try:
+        with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+    except Exception as e:
+        print(f"配置文件读取失败: {e}")
+        return {}
+
+def get_config(section: str, key: str, default=None):
+    """读取单个配置项"""
+    return (load_config().get(section) or {}).get(key, default)
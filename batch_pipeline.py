@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from image_utils import decode_for_inference
+from stage_timer import StageTimer
+
+
+def prepare_image(engine, file_content) -> Tuple[Optional[np.ndarray], StageTimer]:
+    """解码并预处理单张图片，返回(张量, 各阶段耗时)，无法解码时张量为None"""
+    timer = StageTimer()
+    with timer.stage('decode'):
+        image = decode_for_inference(file_content)
+    if image is None:
+        return None, timer
+
+    with timer.stage('preprocess'):
+        tensor = engine.preprocess(image)
+    return tensor, timer
+
+
+def identify_staged(engine, image: np.ndarray, topk: int = 5, timer: Optional[StageTimer] = None,
+                    infer=None) -> dict:
+    """
+    逐阶段识别单张图片，预处理、推理、后处理的耗时记入timer
+
+    infer默认为engine.infer，可传入MicroBatcher.infer合并并发请求（此时推理耗时包含凑批等待）。
+    """
+    timer = StageTimer() if timer is None else timer
+    with timer.stage('preprocess'):
+        # 推理返回前本线程一直等待，张量可直接写入本线程的输入缓冲区
+        tensor = engine.preprocess(image, out=engine.input_buffer()[0])
+    if tensor is None:
+        return engine.error_outputs()
+
+    with timer.stage('inference'):
+        probs = (infer or engine.infer)(tensor)
+    with timer.stage('postprocess'):
+        return engine.postprocess(probs, topk)
+
+
+def identify_prepared(engine, tensors: List[np.ndarray], topk: int = 5) -> Tuple[List[dict], StageTimer]:
+    """
+    把预处理后的张量堆叠为一个批次推理，返回(结果列表, 每张图片分摊的推理与后处理耗时)
+
+    批次的耗时按张数平均分摊，记入每张图片的timings与阶段耗时指标时不会按批量放大。
+    """
+    timer = StageTimer()
+    with timer.stage('inference'):
+        probs = engine.forward(np.stack(tensors))
+    with timer.stage('postprocess'):
+        outputs = [engine.postprocess(one_probs, topk) for one_probs in probs]
+    return outputs, StageTimer({stage: seconds / len(tensors) for stage, seconds in timer.items()})
+
+
+def split_batches(items: list, batch_size: int) -> List[list]:
+    batch_size = max(1, int(batch_size))
+    return [items[i: i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+def round_timings(timings: dict) -> dict:
+    return {stage: round(seconds, 4) for stage, seconds in timings.items()}
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+大尺寸JPEG解码对比：全分辨率解码 vs DCT域缩小解码
+
+每种尺寸与解码方式在独立子进程中运行，分别统计解码延迟与峰值内存增量。
+用法: python benchmarks/bench_decode.py --sizes 4000x3000 8000x6000 --repeat 10
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from image_utils import decode_image, decode_image_reduced
+
+
+def make_jpeg(width, height, quality=90, seed=0):
+    """生成带纹理的合成照片，压缩率接近真实照片"""
+    rng = np.random.RandomState(seed)
+    small = rng.randint(0, 256, (max(1, height // 64), max(1, width // 64), 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    noise = rng.randint(0, 24, (height, width, 1), dtype=np.uint8)
+    image = cv2.add(image, np.repeat(noise, 3, axis=2))
+    return cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def peak_rss_mb():
+    """进程峰值常驻内存（MB）"""
+    # ru_maxrss会继承父进程的峰值，优先读取/proc中的VmHWM
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # Linux下ru_maxrss单位为KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_worker(path, mode, repeat, min_short):
+    """子进程：测量单一解码方式"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    baseline = peak_rss_mb()
+    latencies = []
+    shape = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        if mode == 'full':
+            image = decode_image(data)
+        else:
+            image = decode_image_reduced(data, min_short)
+        latencies.append(time.perf_counter() - start_time)
+        shape = image.shape
+        del image
+    print(json.dumps({
+        'shape': shape,
+        'median_ms': float(np.median(latencies)) * 1000,
+        'peak_mb': peak_rss_mb() - baseline,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大尺寸JPEG解码对比')
+    parser.add_argument('--sizes', nargs='+', default=['4000x3000', '8000x6000'],
+                        help='图片尺寸，宽x高')
+    parser.add_argument('--repeat', type=int, default=10, help='每种方式重复次数')
+    parser.add_argument('--min-short', type=int, default=224, help='缩小后短边下限')
+    parser.add_argument('--worker', nargs=2, metavar=('PATH', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker[0], args.worker[1], args.repeat, args.min_short)
+        return
+
+    print(f"{'尺寸':>12} {'方式':>8} {'解码尺寸':>14} {'中位延迟(ms)':>12} {'峰值内存增量(MB)':>16}")
+    for size in args.sizes:
+        width, height = map(int, size.lower().split('x'))
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
+            f.write(make_jpeg(width, height))
+            path = f.name
+        try:
+            for mode in ('full', 'reduced'):
+                output = subprocess.check_output([
+                    sys.executable, os.path.abspath(__file__), '--worker', path, mode,
+                    '--repeat', str(args.repeat), '--min-short', str(args.min_short)
+                ], cwd=PROJECT_DIR)
+                stats = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+                decoded = 'x'.join(str(v) for v in stats['shape'][1::-1])
+                print(f"{size:>12} {mode:>8} {decoded:>14} {stats['median_ms']:>12.1f} "
+                      f"{stats['peak_mb']:>16.1f}")
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
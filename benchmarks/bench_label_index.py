@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+标签索引对api_service冷启动的影响
+
+每种方式在多个全新子进程中分别统计：读取标签的耗时与常驻内存增量，
+以及导入api_service并完成init_plant_identifier的总耗时与之后的常驻内存。
+text为逐行解析标签文件，index为mmap加载label_index.py预先编译的索引
+（计时前已生成，页缓存中已有索引文件，相当于容器重启后的情况）。
+用法: python benchmarks/bench_label_index.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import yaml
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from app_config import load_config
+
+MODES = ('text', 'index')
+DEFAULT_INDEX_DIR = 'data/label_index'
+
+
+def read_rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def run_worker():
+    start_time = time.perf_counter()
+    from plant_engine import load_labels
+    # 配置文件的解析不计入读取标签的耗时
+    load_config()
+    rss_before = read_rss_mb()
+    labels_start = time.perf_counter()
+    labels = load_labels()
+    labels_time = time.perf_counter() - labels_start
+    labels_mb = read_rss_mb() - rss_before
+
+    import api_service
+    if not api_service.init_plant_identifier():
+        sys.exit(1)
+    print(json.dumps({
+        'labels_type': type(labels).__name__,
+        'labels_ms': labels_time * 1000,
+        'labels_mb': labels_mb,
+        'startup_ms': (time.perf_counter() - start_time) * 1000,
+        'rss_mb': read_rss_mb(),
+    }))
+
+
+def write_config(directory, mode):
+    """当前配置的副本，只修改label_index_dir"""
+    config = dict(load_config())
+    identification = dict(config.get('plant_identification') or {})
+    if mode == 'index':
+        identification['label_index_dir'] = identification.get('label_index_dir') or DEFAULT_INDEX_DIR
+    else:
+        identification['label_index_dir'] = ''
+    config['plant_identification'] = identification
+    path = os.path.join(directory, f'config.{mode}.yaml')
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return path
+
+
+def run_mode(config_path, runs):
+    env = dict(os.environ, PLANTID_CONFIG=config_path)
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--worker'],
+                                         cwd=PROJECT_DIR, env=env)
+        samples.append(json.loads(output.decode('utf-8').strip().splitlines()[-1]))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='标签索引对冷启动的影响')
+    parser.add_argument('--runs', type=int, default=5, help='每种方式的子进程数，取中位数')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker()
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        configs = {mode: write_config(directory, mode) for mode in MODES}
+        # 先生成索引，计时的子进程只加载
+        run_mode(configs['index'], 1)
+        results = {mode: run_mode(configs[mode], args.runs) for mode in MODES}
+
+    keys = ('labels_ms', 'labels_mb', 'startup_ms', 'rss_mb')
+    print(f"每种方式{args.runs}个子进程，取中位数")
+    print(f"{'方式':<8}{'标签表':>12}{'读取标签(ms)':>14}{'标签内存(MB)':>14}{'启动总耗时(ms)':>16}{'常驻内存(MB)':>14}")
+    for mode in MODES:
+        medians = [float(np.median([sample[key] for sample in results[mode]])) for key in keys]
+        print(f"{mode:<8}{results[mode][0]['labels_type']:>12}" +
+              ''.join(f"{value:>14.2f}" if i != 2 else f"{value:>16.1f}" for i, value in enumerate(medians)))
+
+
+if __name__ == '__main__':
+    main()
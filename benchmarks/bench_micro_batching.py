@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+微批处理吞吐量对比
+
+用法: python benchmarks/bench_micro_batching.py --concurrency 8 --requests 400
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# 添加项目目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from micro_batcher import MicroBatcher
+from plant_engine import PlantEngine
+
+
+def make_images(count, height=480, width=640, seed=0):
+    rng = np.random.RandomState(seed)
+    return [rng.randint(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def run(identify, images, concurrency):
+    """并发调用identify，返回每秒处理图片数"""
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda image: identify(image, topk=5), images))
+    return len(images) / (time.perf_counter() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='微批处理吞吐量对比')
+    parser.add_argument('--requests', type=int, default=200, help='请求总数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发数')
+    parser.add_argument('--batch-size', type=int, default=10, help='最大批量')
+    parser.add_argument('--window-ms', type=float, default=5.0, help='凑批等待时间（毫秒）')
+    args = parser.parse_args()
+
+    engine = PlantEngine()
+    images = make_images(args.requests)
+    # 预热
+    engine.identify(images[0])
+
+    baseline = run(engine.identify, images, args.concurrency)
+    print(f"逐请求推理: {baseline:.1f} images/sec")
+
+    batcher = MicroBatcher(engine, max_batch_size=args.batch_size, max_wait_ms=args.window_ms)
+    try:
+        batched = run(batcher.identify, images, args.concurrency)
+    finally:
+        batcher.close()
+    print(f"微批处理:   {batched:.1f} images/sec "
+          f"(batch_size={args.batch_size}, window={args.window_ms}ms)")
+    print(f"加速比:     {batched / baseline:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+感知哈希近重复缓存的命中率与误匹配率
+
+每张原图按服务中相同的方式解码后计算dHash并加入NearDuplicateIndex，
+再把原图的各种变体（缩小、重新压缩、转PNG、去掉EXIF、轻微裁剪、调亮）逐一查找：
+  命中率:   变体找回了自己的原图
+  误匹配率: 变体匹配到其他原图，或未加入索引的其他图片匹配到了任何原图
+后者相当于把别的照片的识别结果返回给了用户，阈值应在误匹配率可以接受的前提下尽量放宽。
+未指定--images时使用合成图片，合成图片之间差异较大，误匹配率会偏低，应以真实照片的结果为准。
+用法: python benchmarks/bench_near_duplicate.py --images images --limit 500 --thresholds 0 2 4 6 8 10 12
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from image_utils import decode_for_inference, list_images
+from near_duplicate import NearDuplicateIndex, dhash
+
+
+def encode(image, ext='.jpg', quality=90) -> bytes:
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext == '.jpg' else []
+    return cv2.imencode(ext, image, params)[1].tobytes()
+
+
+def crop(image, ratio):
+    height, width = image.shape[:2]
+    dy, dx = int(height * ratio), int(width * ratio)
+    return image[dy: height - dy, dx: width - dx]
+
+
+# 变体名 -> 由原图（BGR）生成上传内容
+VARIANTS = OrderedDict([
+    ('jpeg_q90', lambda image: encode(image, quality=90)),
+    ('jpeg_q50', lambda image: encode(image, quality=50)),
+    ('half_size', lambda image: encode(cv2.resize(image, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA),
+                                       quality=80)),
+    ('quarter_size', lambda image: encode(cv2.resize(image, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA),
+                                          quality=70)),
+    # 重新编码时不写EXIF，与聊天软件去掉元数据相同
+    ('strip_exif', lambda image: encode(image, quality=95)),
+    ('png', lambda image: encode(image, '.png')),
+    ('crop_2pct', lambda image: encode(crop(image, 0.02))),
+    ('brighter', lambda image: encode(cv2.convertScaleAbs(image, alpha=1.0, beta=20))),
+])
+
+
+def synthetic_images(count, seed=0):
+    """平滑的随机图片：低分辨率噪声放大后叠加渐变，近似照片的低频结构"""
+    rng = np.random.RandomState(seed)
+    images = []
+    for _ in range(count):
+        low = rng.randint(0, 256, (rng.randint(4, 12), rng.randint(4, 12), 3)).astype(np.uint8)
+        image = cv2.resize(low, (800, 600), interpolation=cv2.INTER_CUBIC)
+        noise = rng.randint(-12, 13, image.shape)
+        images.append(np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    return images
+
+
+def load_images(args):
+    if not args.images:
+        return synthetic_images(args.count)
+    images = []
+    for filename in list_images(args.images):
+        image = cv2.imread(filename, cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append(image)
+        if args.limit and len(images) >= args.limit:
+            break
+    return images
+
+
+def image_hash(data: bytes) -> int:
+    """与服务相同：按识别所用的方式解码后计算"""
+    return dhash(decode_for_inference(data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='感知哈希近重复缓存的命中率与误匹配率')
+    parser.add_argument('--images', default=None, help='图片目录（递归查找），默认使用合成图片')
+    parser.add_argument('--limit', type=int, default=0, help='最多使用的图片数，0为全部')
+    parser.add_argument('--count', type=int, default=300, help='合成图片数')
+    parser.add_argument('--holdout', type=float, default=0.3, help='不加入索引、只用于统计误匹配的图片比例')
+    parser.add_argument('--thresholds', nargs='+', type=int, default=[0, 2, 4, 6, 8, 10, 12])
+    args = parser.parse_args()
+
+    images = load_images(args)
+    if len(images) < 2:
+        print("图片太少，至少需要2张")
+        sys.exit(1)
+    num_indexed = max(1, int(len(images) * (1 - args.holdout)))
+    indexed, holdout = images[:num_indexed], images[num_indexed:]
+
+    start_time = time.perf_counter()
+    originals = [image_hash(encode(image, quality=95)) for image in indexed]
+    hash_ms = (time.perf_counter() - start_time) * 1000 / len(indexed)
+    variants = {name: [image_hash(func(image)) for image in indexed] for name, func in VARIANTS.items()}
+    others = [image_hash(encode(image, quality=95)) for image in holdout]
+    print(f"索引图片: {len(indexed)}，未加入索引的图片: {len(others)}，变体: {len(VARIANTS)}种，"
+          f"解码+dHash平均 {hash_ms:.2f}ms")
+
+    print(f"{'阈值':>4}" + ''.join(f"{name:>14}" for name in VARIANTS) +
+          f"{'总命中率':>10}{'变体误匹配':>10}{'其他图片误匹配':>14}{'查找(us)':>10}")
+    for threshold in args.thresholds:
+        index = NearDuplicateIndex(threshold=threshold, max_entries=len(indexed))
+        for k, phash in enumerate(originals):
+            index.add(phash, str(k))
+
+        hit_rates = []
+        hits = wrong = total = 0
+        for name in VARIANTS:
+            variant_hits = 0
+            for k, phash in enumerate(variants[name]):
+                found = index.find(phash)
+                if found == str(k):
+                    variant_hits += 1
+                elif found is not None:
+                    wrong += 1
+            hit_rates.append(variant_hits / len(indexed))
+            hits += variant_hits
+            total += len(indexed)
+
+        start_time = time.perf_counter()
+        false_matches = sum(index.find(phash) is not None for phash in others)
+        lookup_us = (time.perf_counter() - start_time) * 1e6 / len(others) if others else 0.0
+        false_rate = false_matches / len(others) if others else 0.0
+        print(f"{threshold:>4}" + ''.join(f"{rate:>14.3f}" for rate in hit_rates) +
+              f"{hits / total:>10.3f}{wrong / total:>10.3f}{false_rate:>14.3f}{lookup_us:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
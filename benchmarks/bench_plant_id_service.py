@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+plant-id-service.py的/filepath/延迟对比：每个请求新建识别器 vs 进程内共享识别器
+
+两种方式分别在独立的uvicorn子进程中运行，per_request通过替换
+get_plant_identifier还原每次请求都加载模型的旧行为。
+用法: python benchmarks/bench_plant_id_service.py --requests 50
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+
+import cv2
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+SERVICE_PATH = os.path.join(PROJECT_DIR, 'plant-id-service.py')
+
+
+def serve(mode, port):
+    """子进程：按指定方式启动服务"""
+    import uvicorn
+
+    spec = importlib.util.spec_from_file_location('plant_id_service', SERVICE_PATH)
+    service = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(service)
+    if mode == 'per_request':
+        service.get_plant_identifier = service.create_plant_identifier
+    uvicorn.run(service.app, host='127.0.0.1', port=port, log_level='warning')
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(base_url, process, timeout=120):
+    """等待服务开始接受请求，返回启动耗时"""
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < timeout:
+        if process.poll() is not None:
+            raise RuntimeError('服务进程已退出')
+        try:
+            urllib.request.urlopen(base_url + '/docs', timeout=1).read()
+            return time.perf_counter() - start_time
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('等待服务启动超时')
+
+
+def measure(mode, image_path, requests):
+    port = get_free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, str(port)],
+                               cwd=PROJECT_DIR, stdout=subprocess.DEVNULL)
+    try:
+        startup = wait_ready(base_url, process)
+        url = base_url + '/filepath/?' + urllib.parse.urlencode({'path': image_path})
+        latencies = []
+        for _ in range(requests):
+            start_time = time.perf_counter()
+            outputs = json.loads(urllib.request.urlopen(url, timeout=60).read())
+            latencies.append(time.perf_counter() - start_time)
+            if outputs.get('status') != 0:
+                raise RuntimeError(f'识别失败: {outputs}')
+    finally:
+        process.terminate()
+        process.wait()
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'startup_s': startup,
+        'first_ms': latencies[0],
+        'median_ms': float(np.median(latencies)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='plant-id-service /filepath/ 延迟对比')
+    parser.add_argument('--requests', type=int, default=50, help='每种方式的请求数')
+    parser.add_argument('--image', default=None, help='测试图片，默认生成640x480的合成图片')
+    parser.add_argument('--serve', nargs=2, metavar=('MODE', 'PORT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve[0], int(args.serve[1]))
+        return
+
+    image_path = args.image
+    if image_path is None:
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
+            image = np.random.RandomState(0).randint(0, 256, (480, 640, 3), dtype=np.uint8)
+            f.write(cv2.imencode('.jpg', image)[1].tobytes())
+            image_path = f.name
+    try:
+        print(f"{'方式':>12} {'启动(s)':>8} {'首个请求(ms)':>12} {'中位延迟(ms)':>12} {'P95延迟(ms)':>11}")
+        for mode in ('per_request', 'shared'):
+            stats = measure(mode, os.path.abspath(image_path), args.requests)
+            print(f"{mode:>12} {stats['startup_s']:>8.2f} {stats['first_ms']:>12.1f} "
+                  f"{stats['median_ms']:>12.1f} {stats['p95_ms']:>11.1f}")
+    finally:
+        if args.image is None:
+            os.remove(image_path)
+
+
+if __name__ == '__main__':
+    main()
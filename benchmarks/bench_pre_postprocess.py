@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+预处理与后处理各步骤耗时
+
+按PlantEngine的执行顺序逐步计时：缩放短边、中心裁剪、BGR转RGB、归一化、HWC转CHW，
+以及softmax、top-k选择、标签查找。reference为当前实现的逐步写法，
+vectorized为向量化写法（颜色转换并入转置、归一化合并为一次乘加、
+argpartition部分选择、预先拆分好的标签数组，后两者即PlantEngine所用的实现），
+两者结果会先校验一致再计时。
+用法: python benchmarks/bench_pre_postprocess.py --sizes 640x480 1920x1080 --topk 1 5 20 --impl both
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from app_config import get_config
+from label_table import LabelTable, top_k_indices
+from plant_engine import load_label_map, resolve_path
+from preprocessor import ImagePreprocessor
+
+NUM_CLASSES = 4066
+
+
+def load_labels():
+    """读取标签文件，不存在时生成同样数量的占位标签"""
+    path = resolve_path(get_config('plant_identification', 'label_map_path',
+                                   'plantid/models/quarrying_plantid_label_map.txt'))
+    if os.path.exists(path):
+        return load_label_map(path)
+    print(f"未找到标签文件 {path}，使用{NUM_CLASSES}个占位标签")
+    return {k: OrderedDict([('chinese_name', f'科{k}_属{k}_种{k}'), ('latin_name', f'Latin name {k}')])
+            for k in range(NUM_CLASSES)}
+
+
+def reference_stages(config, label_name_dict):
+    """与PlantEngine.preprocess/postprocess相同的逐步实现，每个函数的输入为上一步的输出"""
+    resize_short, crop_size, mean, std = config
+
+    def resize(image):
+        height, width = image.shape[:2]
+        short = min(height, width)
+        new_width = max(crop_size, int(round(width * resize_short / short)))
+        new_height = max(crop_size, int(round(height * resize_short / short)))
+        interpolation = cv2.INTER_AREA if new_width < width and new_height < height else cv2.INTER_LINEAR
+        return cv2.resize(image, (new_width, new_height), interpolation=interpolation)
+
+    def crop(image):
+        top = (image.shape[0] - crop_size) // 2
+        left = (image.shape[1] - crop_size) // 2
+        return image[top: top + crop_size, left: left + crop_size]
+
+    def bgr2rgb(image):
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def normalize(image):
+        image = image.astype(np.float32) / 255.0
+        return (image - mean) / std
+
+    def transpose(image):
+        return np.ascontiguousarray(np.transpose(image, (2, 0, 1)))
+
+    def softmax(logits):
+        logits = logits - np.max(logits, axis=-1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / np.sum(exp, axis=-1, keepdims=True)
+
+    def topk_select(probs, topk):
+        return probs, np.argsort(-probs)[:topk]
+
+    def label_lookup(selected):
+        probs, indices = selected
+        results = []
+        for ind in indices:
+            one_label = label_name_dict[int(ind)]
+            one_result = OrderedDict()
+            one_result['chinese_name'] = one_label['chinese_name'].split('_')[-1]
+            one_result['latin_name'] = one_label['latin_name']
+            one_result['probability'] = probs[ind].item()
+            results.append(one_result)
+        return results
+
+    pre = OrderedDict([('resize', resize), ('crop', crop), ('bgr2rgb', bgr2rgb),
+                       ('normalize', normalize), ('transpose', transpose)])
+    post = OrderedDict([('softmax', softmax), ('topk', topk_select), ('label_lookup', label_lookup)])
+    return pre, post
+
+
+def vectorized_stages(config, label_name_dict):
+    """候选实现：各步骤与reference一一对应，合并到其他步骤中的步骤为直通"""
+    resize_short, crop_size, mean, std = config
+    pre, post = reference_stages(config, label_name_dict)
+    # (x / 255 - mean) / std 展开为 x * scale + bias，读取时反转通道顺序（BGR -> RGB）并按CHW写出
+    scale = (1.0 / (255.0 * std)).reshape(3, 1, 1).astype(np.float32)
+    bias = (-mean / std).reshape(3, 1, 1).astype(np.float32)
+    buffer = np.empty((3, crop_size, crop_size), dtype=np.float32)
+    labels = LabelTable([label_name_dict[k]['chinese_name'].split('_')[-1] for k in range(len(label_name_dict))],
+                        [label_name_dict[k]['latin_name'] for k in range(len(label_name_dict))])
+
+    def bgr2rgb(image):
+        # 在normalize中按反转后的通道写入
+        return image
+
+    def normalize(image):
+        np.multiply(image.transpose(2, 0, 1)[::-1], scale, out=buffer)
+        return np.add(buffer, bias, out=buffer)
+
+    def transpose(image):
+        # normalize已写成CHW
+        return image
+
+    def softmax(logits):
+        probs = logits - logits.max()
+        np.exp(probs, out=probs)
+        probs /= probs.sum()
+        return probs
+
+    def topk_select(probs, topk):
+        return probs, top_k_indices(probs, topk)
+
+    def label_lookup(selected):
+        return labels.results(*selected)
+
+    pre.update(bgr2rgb=bgr2rgb, normalize=normalize, transpose=transpose)
+    post.update(softmax=softmax, topk=topk_select, label_lookup=label_lookup)
+    return pre, post
+
+
+IMPLEMENTATIONS = OrderedDict([('reference', reference_stages), ('vectorized', vectorized_stages)])
+
+
+def run_pre(stages, image):
+    for func in stages.values():
+        image = func(image)
+    return image
+
+
+def run_post(stages, logits, topk):
+    probs = stages['softmax'](logits)
+    return stages['label_lookup'](stages['topk'](probs, topk))
+
+
+def time_chain(stages, first_input, repeat, call):
+    """逐步计时，返回每一步的中位耗时（微秒）"""
+    samples = {name: [] for name in stages}
+    for _ in range(repeat):
+        value = first_input
+        for name, func in stages.items():
+            start_time = time.perf_counter()
+            value = call(name, func, value)
+            samples[name].append(time.perf_counter() - start_time)
+    return OrderedDict((name, float(np.median(values)) * 1e6) for name, values in samples.items())
+
+
+def check_equivalent(impls, image, logits, topk):
+    """各实现的输出与reference一致才参与对比"""
+    reference = impls['reference']
+    expected_tensor = run_pre(reference[0], image)
+    expected_results = run_post(reference[1], logits, topk)
+    for name, (pre, post) in impls.items():
+        if name == 'reference':
+            continue
+        tensor = run_pre(pre, image)
+        results = run_post(post, logits, topk)
+        if tensor.shape != expected_tensor.shape or np.abs(tensor - expected_tensor).max() > 1e-4:
+            raise AssertionError(f'{name}: 预处理结果与reference不一致')
+        if [r['latin_name'] for r in results] != [r['latin_name'] for r in expected_results] or \
+                not np.allclose([r['probability'] for r in results],
+                                [r['probability'] for r in expected_results], rtol=1e-5):
+            raise AssertionError(f'{name}: 后处理结果与reference不一致')
+
+
+def measure_pipeline(func, image, repeat):
+    """整体预处理的中位耗时（微秒）与单次调用的峰值临时内存（KB）"""
+    func(image)
+    latencies = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func(image)
+        latencies.append(time.perf_counter() - start_time)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    func(image)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return float(np.median(latencies)) * 1e6, peak / 1024.0
+
+
+def print_table(title, timings):
+    names = list(timings)
+    stages = list(timings[names[0]])
+    print(title)
+    print(f"  {'步骤':<14}" + ''.join(f"{name + '(us)':>16}" for name in names) +
+          (f"{'加速比':>10}" if len(names) > 1 else ''))
+    for stage in stages + ['total']:
+        values = [sum(timings[name].values()) if stage == 'total' else timings[name][stage] for name in names]
+        line = f"  {stage:<14}" + ''.join(f"{value:>16.1f}" for value in values)
+        if len(names) > 1:
+            line += f"{values[0] / values[-1]:>9.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='预处理与后处理各步骤耗时')
+    parser.add_argument('--sizes', nargs='+', default=['640x480', '1280x960', '1920x1080', '4000x3000'],
+                        help='输入图片尺寸（宽x高），即解码后的尺寸')
+    parser.add_argument('--topk', nargs='+', type=int, default=[1, 5, 20], help='top-k取值')
+    parser.add_argument('--impl', choices=list(IMPLEMENTATIONS) + ['both'], default='both',
+                        help='参与计时的实现，both为全部对比')
+    parser.add_argument('--repeat', type=int, default=200, help='每种组合的重复次数')
+    args = parser.parse_args()
+
+    config = (get_config('image_processing', 'resize_short', 224),
+              get_config('image_processing', 'crop_size', 224),
+              np.asarray(get_config('image_processing', 'normalize_mean', [0.485, 0.456, 0.406]), dtype=np.float32),
+              np.asarray(get_config('image_processing', 'normalize_std', [0.229, 0.224, 0.225]), dtype=np.float32))
+    label_name_dict = load_labels()
+    impls = OrderedDict((name, factory(config, label_name_dict)) for name, factory in IMPLEMENTATIONS.items())
+    # PlantEngine使用的融合预处理，整体计时并与reference对比
+    preprocessor = ImagePreprocessor(*config)
+    pipelines = OrderedDict([
+        ('reference', lambda image: run_pre(impls['reference'][0], image)),
+        ('fused', preprocessor.preprocess),
+        ('fused+buffer', lambda image: preprocessor.preprocess(image, out=preprocessor.buffer()[0])),
+    ])
+
+    rng = np.random.RandomState(0)
+    logits = rng.randn(len(label_name_dict)).astype(np.float32) * 4
+    sample_image = rng.randint(0, 256, (480, 640, 3), dtype=np.uint8)
+    check_equivalent(impls, sample_image, logits, max(args.topk))
+    if np.abs(pipelines['fused'](sample_image) - pipelines['reference'](sample_image)).max() > 1e-4:
+        raise AssertionError('fused: 预处理结果与reference不一致')
+    if args.impl != 'both':
+        impls = OrderedDict([(args.impl, impls[args.impl])])
+
+    for size in args.sizes:
+        width, height = (int(v) for v in size.lower().split('x'))
+        image = rng.randint(0, 256, (height, width, 3), dtype=np.uint8)
+        timings = OrderedDict(
+            (name, time_chain(pre, image, args.repeat, lambda _, func, value: func(value)))
+            for name, (pre, _) in impls.items())
+        print_table(f"预处理 {width}x{height}", timings)
+        print(f"  {'整体':<14}{'耗时(us)':>12}{'峰值临时内存(KB)':>18}")
+        for name, func in pipelines.items():
+            latency, peak_kb = measure_pipeline(func, image, args.repeat)
+            print(f"  {name:<14}{latency:>12.1f}{peak_kb:>18.1f}")
+
+    for topk in args.topk:
+        def call(name, func, value, topk=topk):
+            return func(value, topk) if name == 'topk' else func(value)
+
+        timings = OrderedDict((name, time_chain(post, logits, args.repeat, call))
+                              for name, (_, post) in impls.items())
+        print_table(f"后处理 {len(logits)}类 top{topk}", timings)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+图片URL下载对比：逐个urllib.request.urlopen vs URLFetcher并发下载
+
+在本机启动一个模拟图片服务器（每个响应固定延迟）。
+重定向、大小上限、超时与每主机并发数等行为由tests/test_url_fetcher.py检查。
+用法: python benchmarks/bench_url_fetch.py --urls 64 --delay-ms 50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from result_cache import ResultCache
+from url_fetcher import URLFetcher
+
+
+def start_image_server(delay, image_size):
+    """模拟图片服务器: /img/<n>.jpg 等待delay秒后返回图片，其他路径404"""
+    body = os.urandom(image_size)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if not self.path.startswith('/img/'):
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except OSError:
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fetch_serial(urls):
+    for url in urls:
+        urllib.request.urlopen(url).read()
+
+
+async def fetch_concurrent(fetcher, urls):
+    return await asyncio.gather(*[fetcher.fetch(url) for url in urls], return_exceptions=True)
+
+
+async def run_fetcher(args, urls):
+    fetcher = URLFetcher(max_bytes=args.image_kb * 1024 * 4, timeout=args.timeout,
+                         per_host_limit=args.per_host_limit,
+                         digest_cache=ResultCache(max_entries=len(urls)))
+    try:
+        start_time = time.perf_counter()
+        results = await fetch_concurrent(fetcher, urls)
+        elapsed = time.perf_counter() - start_time
+        failed = [r for r in results if isinstance(r, Exception)]
+        print(f"URLFetcher并发:    {elapsed:.2f}s ({len(urls) / elapsed:.1f} images/sec, 失败{len(failed)})")
+    finally:
+        await fetcher.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图片URL下载对比')
+    parser.add_argument('--urls', type=int, default=64, help='URL数量')
+    parser.add_argument('--delay-ms', type=float, default=50, help='模拟服务器响应延迟（毫秒）')
+    parser.add_argument('--image-kb', type=int, default=200, help='模拟图片大小（KB）')
+    parser.add_argument('--per-host-limit', type=int, default=8, help='同一主机的并发下载数')
+    parser.add_argument('--timeout', type=float, default=1.0, help='下载超时（秒）')
+    args = parser.parse_args()
+
+    server = start_image_server(args.delay_ms / 1000, args.image_kb * 1024)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    urls = [f'{base_url}/img/{k}.jpg' for k in range(args.urls)]
+    try:
+        start_time = time.perf_counter()
+        fetch_serial(urls)
+        elapsed = time.perf_counter() - start_time
+        print(f"urlopen逐个下载:   {elapsed:.2f}s ({len(urls) / elapsed:.1f} images/sec)")
+        asyncio.run(run_fetcher(args, urls))
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+fp32与int8模型对比：识别结果一致性、单张推理延迟与内存占用
+
+每个模型版本在独立子进程中加载，分别统计常驻内存与峰值内存。
+以fp32的结果为基准：
+  top1一致率: int8的top1与fp32的top1相同的比例
+  top5一致率: fp32的top1出现在int8的top5中的比例
+  top5重合度: 两者top5集合交集的平均占比
+用法: python benchmarks/compare_model_variants.py --images images --limit 500
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from image_utils import decode_for_inference, list_images
+from plant_engine import MODEL_VARIANTS, PlantEngine, get_model_path
+
+
+def read_memory_mb():
+    """当前常驻内存与峰值常驻内存（MB）"""
+    memory = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                memory[line.split(':')[0]] = int(line.split()[1]) / 1024.0
+    return memory.get('VmRSS', 0.0), memory.get('VmHWM', 0.0)
+
+
+def run_worker(variant, filenames, topk, warmup):
+    """子进程：加载单个模型版本并逐张推理"""
+    base_rss, _ = read_memory_mb()
+    start_time = time.perf_counter()
+    engine = PlantEngine(model_path=get_model_path(variant))
+    load_time = time.perf_counter() - start_time
+    loaded_rss, _ = read_memory_mb()
+
+    tensors = []
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            tensors.append(engine.preprocess(decode_for_inference(f.read())))
+    valid = [tensor for tensor in tensors if tensor is not None]
+    for tensor in valid[:warmup]:
+        engine.forward(tensor[np.newaxis])
+
+    latencies = []
+    predictions = []
+    for tensor in tensors:
+        if tensor is None:
+            predictions.append(None)
+            continue
+        start_time = time.perf_counter()
+        probs = engine.forward(tensor[np.newaxis])[0]
+        latencies.append(time.perf_counter() - start_time)
+        predictions.append(np.argsort(-probs)[:topk].tolist())
+
+    rss, peak = read_memory_mb()
+    print(json.dumps({
+        'predictions': predictions,
+        'load_time': load_time,
+        'latencies': latencies,
+        'model_mb': loaded_rss - base_rss,
+        'rss_mb': rss,
+        'peak_mb': peak,
+    }))
+
+
+def compare(baseline, predictions):
+    """以baseline为基准统计一致率"""
+    top1 = top5 = overlap = count = 0
+    for expected, actual in zip(baseline, predictions):
+        if expected is None or actual is None:
+            continue
+        count += 1
+        top1 += expected[0] == actual[0]
+        top5 += expected[0] in actual
+        overlap += len(set(expected) & set(actual)) / len(expected)
+    if count == 0:
+        return 0, 0.0, 0.0, 0.0
+    return count, top1 / count, top5 / count, overlap / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='fp32与int8模型对比')
+    parser.add_argument('--images', default='images', help='图片目录（递归查找）')
+    parser.add_argument('--limit', type=int, default=0, help='最多使用的图片数，0为全部')
+    parser.add_argument('--variants', nargs='+', default=['fp32', 'int8'], choices=list(MODEL_VARIANTS),
+                        help='参与对比的模型版本，第一个作为基准')
+    parser.add_argument('--warmup', type=int, default=5, help='计时前的预热推理次数')
+    parser.add_argument('--output', default=None, help='把汇总结果保存为JSON')
+    parser.add_argument('--worker', metavar='VARIANT', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    filenames = list_images(args.images, args.limit)
+    if args.worker:
+        run_worker(args.worker, filenames, 5, args.warmup)
+        return
+    if not filenames:
+        print(f"目录中没有图片: {args.images}")
+        sys.exit(1)
+
+    stats = {}
+    for variant in args.variants:
+        model_path = get_model_path(variant)
+        if not os.path.exists(model_path):
+            print(f"{variant}模型不存在: {model_path}，可先运行quantize_model.py生成")
+            sys.exit(1)
+        output = subprocess.check_output([
+            sys.executable, os.path.abspath(__file__), '--worker', variant,
+            '--images', args.images, '--limit', str(args.limit), '--warmup', str(args.warmup)
+        ], cwd=PROJECT_DIR)
+        stats[variant] = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+    baseline = stats[args.variants[0]]['predictions']
+    summary = []
+    print(f"图片数: {len(filenames)}，基准: {args.variants[0]}")
+    print(f"{'版本':>6} {'top1一致':>9} {'top5一致':>9} {'top5重合':>9} {'中位延迟(ms)':>12} "
+          f"{'P95延迟(ms)':>11} {'加载(s)':>8} {'模型内存(MB)':>12} {'峰值内存(MB)':>12}")
+    for variant in args.variants:
+        one_stats = stats[variant]
+        count, top1, top5, overlap = compare(baseline, one_stats['predictions'])
+        latencies = np.asarray(one_stats['latencies']) * 1000
+        row = {
+            'variant': variant,
+            'images': count,
+            'top1_agreement': top1,
+            'top5_agreement': top5,
+            'top5_overlap': overlap,
+            'median_ms': float(np.median(latencies)) if len(latencies) else 0.0,
+            'p95_ms': float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+            'load_time': one_stats['load_time'],
+            'model_mb': one_stats['model_mb'],
+            'peak_mb': one_stats['peak_mb'],
+        }
+        summary.append(row)
+        print(f"{variant:>6} {top1:>9.3f} {top5:>9.3f} {overlap:>9.3f} {row['median_ms']:>12.2f} "
+              f"{row['p95_ms']:>11.2f} {row['load_time']:>8.2f} {row['model_mb']:>12.1f} "
+              f"{row['peak_mb']:>12.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+识别服务压测
+
+以固定并发重放一组不同尺寸的合成图片（或指定目录中的图片），统计延迟分位数、吞吐量、
+错误率以及服务进程的CPU与内存占用，结果可保存为JSON基线，之后与基线对比发现性能回退。
+
+目标服务: api (api_service.py /identify)、simple (simple_api.py /identify)、
+web (web_app.py /api/identify)。运行方式:
+    inprocess  在本进程内通过测试客户端调用，CPU与内存包含压测客户端本身
+    spawn      在子进程中启动服务并通过HTTP调用，统计子进程的CPU与内存
+    --url      压测已运行的服务，指定--pid时统计该进程的CPU与内存
+
+inprocess与spawn默认关闭api_service的请求频率限制，--url时超出限制的请求计为错误（429）。
+CPU与内存读取/proc，仅支持Linux。
+
+用法:
+    python benchmarks/load_test.py api --mode spawn --requests 500 --concurrency 16 --save baselines/api.json
+    python benchmarks/load_test.py api --mode spawn --requests 500 --concurrency 16 --compare baselines/api.json
+    python benchmarks/load_test.py web --url http://localhost:5000 --pid 12345
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+import cv2
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+TARGETS = {
+    'api': {'module': 'api_service', 'path': '/identify', 'field': 'file', 'api_key': 'demo_key'},
+    'simple': {'module': 'simple_api', 'path': '/identify', 'field': 'file', 'api_key': 'demo_key'},
+    'web': {'module': 'web_app', 'path': '/api/identify', 'field': 'image', 'api_key': None},
+}
+
+DEFAULT_SIZES = '320x240,640x480,1280x960,1920x1080'
+
+# 与基线对比的指标，值越大越好的为True
+COMPARED_METRICS = {
+    'throughput_rps': True,
+    'latency_p50_ms': False,
+    'latency_p95_ms': False,
+    'latency_p99_ms': False,
+    'cpu_percent': False,
+    'peak_rss_mb': False,
+}
+
+
+def make_corpus(count, sizes, seed=0):
+    """生成count张JPEG图片，尺寸在sizes中轮换，低分辨率噪声放大后编码，体积接近真实照片"""
+    rng = np.random.RandomState(seed)
+    corpus = []
+    for k in range(count):
+        width, height = sizes[k % len(sizes)]
+        small = rng.randint(0, 256, (max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+        image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+        corpus.append((f'synthetic_{k}_{width}x{height}.jpg', cv2.imencode('.jpg', image)[1].tobytes()))
+    return corpus
+
+
+def load_corpus(image_dir, count):
+    from image_utils import list_images
+
+    corpus = []
+    for filename in list_images(image_dir, count):
+        with open(filename, 'rb') as f:
+            corpus.append((os.path.basename(filename), f.read()))
+    return corpus
+
+
+def parse_sizes(text):
+    return [tuple(int(v) for v in size.lower().split('x')) for size in text.split(',') if size]
+
+
+def read_process_usage(pid):
+    """进程累计CPU时间（秒）、当前与峰值常驻内存（MB）"""
+    with open(f'/proc/{pid}/stat') as f:
+        # 进程名可能包含空格，从右括号之后开始解析
+        fields = f.read().rsplit(')', 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    memory = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                memory[line.split(':')[0]] = int(line.split()[1]) / 1024.0
+    return cpu_seconds, memory.get('VmRSS', 0.0), memory.get('VmHWM', 0.0)
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def disable_rate_limit(module):
+    limiter = getattr(module, 'limiter', None)
+    if limiter is not None:
+        limiter.enabled = False
+
+
+def serve(target, port, keep_rate_limit):
+    """子进程：启动目标服务"""
+    import importlib
+
+    module = importlib.import_module(TARGETS[target]['module'])
+    if not keep_rate_limit:
+        disable_rate_limit(module)
+    if target == 'web':
+        module.app.run(host='127.0.0.1', port=port, threaded=True)
+    else:
+        import uvicorn
+        uvicorn.run(module.app, host='127.0.0.1', port=port, log_level='warning')
+
+
+def wait_ready(base_url, process, timeout=120):
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < timeout:
+        if process.poll() is not None:
+            raise RuntimeError('服务进程已退出')
+        try:
+            urllib.request.urlopen(base_url + '/health', timeout=1).read()
+            return
+        except urllib.error.HTTPError:
+            # 已经能返回HTTP响应，模型状态由压测请求体现
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('等待服务启动超时')
+
+
+class HTTPTransport:
+    """通过HTTP调用服务，每个压测线程一个连接池"""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, path, field, filename, data, headers):
+        import httpx
+
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = httpx.Client(base_url=self.base_url, timeout=self.timeout)
+        response = client.post(path, files={field: (filename, data, 'image/jpeg')}, headers=headers)
+        response.read()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class InProcessTransport:
+    """在本进程内调用服务，FastAPI使用TestClient，Flask使用test_client"""
+
+    def __init__(self, target, keep_rate_limit):
+        import importlib
+
+        module = importlib.import_module(TARGETS[target]['module'])
+        if not keep_rate_limit:
+            disable_rate_limit(module)
+        self.flask = target == 'web'
+        if self.flask:
+            self._local = threading.local()
+            self.app = module.app
+        else:
+            from fastapi.testclient import TestClient
+            # 进入上下文以触发startup事件，TestClient可在多个线程间共享
+            self.client = TestClient(module.app)
+            self.client.__enter__()
+
+    def post(self, path, field, filename, data, headers):
+        if not self.flask:
+            response = self.client.post(path, files={field: (filename, data, 'image/jpeg')}, headers=headers)
+            return response.status_code
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.post(path, data={field: (BytesIO(data), filename)},
+                               content_type='multipart/form-data', headers=headers)
+        return response.status_code
+
+    def close(self):
+        if not self.flask:
+            self.client.__exit__(None, None, None)
+
+
+def run_load(transport, target, corpus, requests, concurrency, topk):
+    """以固定并发发送requests个请求，返回(每个请求的延迟秒数, 状态码)"""
+    config = TARGETS[target]
+    path = config['path'] if target == 'web' else f"{config['path']}?topk={topk}"
+    headers = {'Authorization': f"Bearer {config['api_key']}"} if config['api_key'] else {}
+
+    def send(k):
+        filename, data = corpus[k % len(corpus)]
+        start_time = time.perf_counter()
+        try:
+            status = transport.post(path, config['field'], filename, data, headers)
+        except Exception as e:
+            print(f"请求失败: {e}")
+            status = 0
+        return time.perf_counter() - start_time, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(send, range(requests)))
+
+
+def summarize(samples, elapsed, usage_before, usage_after):
+    latencies = np.asarray([latency for latency, _ in samples]) * 1000
+    statuses = Counter(status for _, status in samples)
+    errors = sum(count for status, count in statuses.items() if status != 200)
+    results = {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': errors / len(samples),
+        'status_codes': {str(status): count for status, count in sorted(statuses.items())},
+        'duration_s': elapsed,
+        'throughput_rps': len(samples) / elapsed,
+        'latency_mean_ms': float(latencies.mean()),
+        'latency_p50_ms': float(np.percentile(latencies, 50)),
+        'latency_p95_ms': float(np.percentile(latencies, 95)),
+        'latency_p99_ms': float(np.percentile(latencies, 99)),
+        'latency_max_ms': float(latencies.max()),
+    }
+    if usage_before is not None and usage_after is not None:
+        results['cpu_percent'] = (usage_after[0] - usage_before[0]) / elapsed * 100
+        results['rss_mb'] = usage_after[1]
+        results['peak_rss_mb'] = usage_after[2]
+    return results
+
+
+def print_results(results):
+    print(f"请求数:   {results['requests']}  错误: {results['errors']} ({results['error_rate']:.1%})  "
+          f"状态码: {results['status_codes']}")
+    print(f"吞吐量:   {results['throughput_rps']:.1f} requests/sec ({results['duration_s']:.2f}s)")
+    print(f"延迟(ms): mean {results['latency_mean_ms']:.1f}  p50 {results['latency_p50_ms']:.1f}  "
+          f"p95 {results['latency_p95_ms']:.1f}  p99 {results['latency_p99_ms']:.1f}  "
+          f"max {results['latency_max_ms']:.1f}")
+    if 'cpu_percent' in results:
+        print(f"服务进程: CPU {results['cpu_percent']:.0f}%  RSS {results['rss_mb']:.0f}MB  "
+              f"峰值RSS {results['peak_rss_mb']:.0f}MB")
+
+
+def compare_baseline(report, baseline, tolerance):
+    """与基线逐项对比，返回变差超过tolerance的指标"""
+    if report['config'] != baseline.get('config'):
+        print(f"注意: 压测参数与基线不同\n  基线: {baseline.get('config')}\n  本次: {report['config']}")
+    current, previous = report['results'], baseline['results']
+    regressions = []
+    print(f"{'指标':<16} {'基线':>10} {'本次':>10} {'变化':>8}")
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        if metric not in current or metric not in previous:
+            continue
+        change = (current[metric] - previous[metric]) / previous[metric] if previous[metric] else 0.0
+        worse = -change if higher_is_better else change
+        flag = '  回退' if worse > tolerance else ''
+        if flag:
+            regressions.append(metric)
+        print(f"{metric:<16} {previous[metric]:>10.1f} {current[metric]:>10.1f} {change:>+8.1%}{flag}")
+    error_increase = current['error_rate'] - previous['error_rate']
+    print(f"{'error_rate':<16} {previous['error_rate']:>10.1%} {current['error_rate']:>10.1%}")
+    if error_increase > 0.001:
+        regressions.append('error_rate')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='识别服务压测')
+    parser.add_argument('target', choices=sorted(TARGETS), help='目标服务')
+    parser.add_argument('--mode', choices=['inprocess', 'spawn'], default='inprocess', help='运行方式')
+    parser.add_argument('--url', default=None, help='压测已运行的服务，如http://localhost:8000')
+    parser.add_argument('--pid', type=int, default=None, help='与--url一起使用，统计该进程的CPU与内存')
+    parser.add_argument('--requests', type=int, default=200, help='请求总数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发数')
+    parser.add_argument('--warmup', type=int, default=5, help='预热请求数，不计入结果')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='合成图片尺寸，宽x高，逗号分隔')
+    parser.add_argument('--corpus-size', type=int, default=0,
+                        help='不同图片的数量，默认与请求数相同；小于请求数时重复的图片会命中结果缓存')
+    parser.add_argument('--images', default=None, help='使用该目录中的图片代替合成图片')
+    parser.add_argument('--topk', type=int, default=5, help='返回结果数量')
+    parser.add_argument('--timeout', type=float, default=60, help='HTTP请求超时（秒）')
+    parser.add_argument('--keep-rate-limit', action='store_true', help='inprocess与spawn时保留请求频率限制')
+    parser.add_argument('--save', default=None, help='把结果保存为JSON基线')
+    parser.add_argument('--compare', default=None, help='与JSON基线对比，有指标回退时返回非0')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='对比基线时允许变差的比例')
+    parser.add_argument('--serve', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.target, args.serve, args.keep_rate_limit)
+        return
+
+    corpus_size = args.corpus_size or args.requests
+    if args.images:
+        corpus = load_corpus(args.images, corpus_size)
+        if not corpus:
+            print(f"目录中没有图片: {args.images}")
+            sys.exit(1)
+    else:
+        corpus = make_corpus(corpus_size, parse_sizes(args.sizes))
+    # 预热使用单独的图片，避免测量阶段命中预热写入的缓存
+    warmup_corpus = make_corpus(max(1, args.warmup), parse_sizes(args.sizes), seed=1)
+
+    mode = 'http' if args.url else args.mode
+    process = None
+    pid = args.pid
+    if args.url:
+        transport = HTTPTransport(args.url, args.timeout)
+    elif args.mode == 'spawn':
+        port = get_free_port()
+        command = [sys.executable, os.path.abspath(__file__), args.target, '--serve', str(port)]
+        if args.keep_rate_limit:
+            command.append('--keep-rate-limit')
+        process = subprocess.Popen(command, cwd=PROJECT_DIR, stdout=subprocess.DEVNULL)
+        base_url = f'http://127.0.0.1:{port}'
+        wait_ready(base_url, process)
+        transport = HTTPTransport(base_url, args.timeout)
+        pid = process.pid
+    else:
+        transport = InProcessTransport(args.target, args.keep_rate_limit)
+        pid = os.getpid()
+
+    try:
+        if args.warmup:
+            run_load(transport, args.target, warmup_corpus, args.warmup, 1, args.topk)
+        usage_before = read_process_usage(pid) if pid else None
+        start_time = time.perf_counter()
+        samples = run_load(transport, args.target, corpus, args.requests, args.concurrency, args.topk)
+        elapsed = time.perf_counter() - start_time
+        usage_after = read_process_usage(pid) if pid else None
+    finally:
+        transport.close()
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report = {
+        'target': args.target,
+        'mode': mode,
+        'timestamp': datetime.now().isoformat(),
+        'config': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'corpus_size': len(corpus),
+            'images': args.images or args.sizes,
+            'topk': args.topk,
+            'rate_limit': bool(args.url or args.keep_rate_limit),
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'ort_intra_op_num_threads': os.environ.get('ORT_INTRA_OP_NUM_THREADS'),
+        },
+        'results': summarize(samples, elapsed, usage_before, usage_after),
+    }
+    print(f"目标: {args.target} ({mode})  并发: {args.concurrency}  图片: {len(corpus)}张")
+    print_results(report['results'])
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print(f"性能回退: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
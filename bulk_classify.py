@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+离线批量识别
+
+把图片列表分块交给多个工作进程，每个进程持有一个推理会话并固定线程数，
+进程内由线程池预读、解码后续图片，推理按批进行。
+结果逐块写入CSV/JSONL/Parquet，已完成的文件记录在检查点中，中断后重新运行同一命令即可继续。
+
+用法:
+    python bulk_classify.py images archive --output results.csv --workers 8
+    python bulk_classify.py images --output results.parquet --threads 2 --batch-size 16
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from image_utils import decode_for_inference, list_images
+from plant_engine import create_plant_identifier, get_ort_config
+
+OUTPUT_FIELDS = ['filename', 'status', 'message', 'chinese_name', 'latin_name', 'probability', 'results']
+
+# 工作进程内的识别器
+engine = None
+
+
+def init_worker(threads: int):
+    """每个工作进程加载一次模型，推理线程数固定为threads"""
+    global engine
+    cv2.setNumThreads(1)
+    ort_config = get_ort_config()
+    ort_config.update(intra_op_num_threads=threads, inter_op_num_threads=1)
+    # 多个进程同时写优化模型缓存会互相覆盖
+    ort_config.pop('optimized_model_dir', None)
+    engine = create_plant_identifier(ort_config=ort_config)
+
+
+def load_image(filename: str):
+    try:
+        with open(filename, 'rb') as f:
+            return decode_for_inference(f.read())
+    except OSError as e:
+        print(f"读取失败 {filename}: {e}")
+        return None
+
+
+def prefetch_images(executor, filenames: list, prefetch: int):
+    """按顺序产出(文件名, 图片)，同时保持后续prefetch张图片在后台读取解码"""
+    pending = []
+    for filename in filenames:
+        pending.append((filename, executor.submit(load_image, filename)))
+        if len(pending) > prefetch:
+            name, future = pending.pop(0)
+            yield name, future.result()
+    for name, future in pending:
+        yield name, future.result()
+
+
+def make_row(filename: str, outputs: dict) -> dict:
+    results = outputs['results']
+    top1 = results[0] if results else {}
+    return {
+        'filename': filename,
+        'status': outputs['status'],
+        'message': outputs['message'],
+        'chinese_name': top1.get('chinese_name', ''),
+        'latin_name': top1.get('latin_name', ''),
+        'probability': top1.get('probability'),
+        'results': json.dumps(results, ensure_ascii=False),
+    }
+
+
+def classify_chunk(task):
+    """工作进程：识别一块文件，返回结果行"""
+    filenames, topk, batch_size, prefetch = task
+    rows = []
+    # 预处理结果直接写入输入缓冲区的下一行，凑满一批后整体推理
+    batch = engine.input_buffer(batch_size)
+    names = []
+
+    def flush():
+        probs = engine.forward(batch[:len(names)])
+        for filename, one_probs in zip(names, probs):
+            rows.append(make_row(filename, engine.postprocess(one_probs, topk)))
+        names.clear()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        for filename, image in prefetch_images(executor, filenames, prefetch):
+            if engine.preprocess(image, out=batch[len(names)]) is None:
+                rows.append(make_row(filename, engine.error_outputs()))
+                continue
+            names.append(filename)
+            if len(names) >= batch_size:
+                flush()
+        if names:
+            flush()
+    return rows
+
+
+class ResultWriter:
+    """按块追加写入结果，支持csv、jsonl、parquet"""
+
+    def __init__(self, path: str, output_format: str):
+        self.format = output_format
+        self.path = path
+        self._parquet = None
+        if output_format == 'csv':
+            write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+            self._file = open(path, 'a', newline='', encoding='utf-8')
+            self._csv = csv.DictWriter(self._file, fieldnames=OUTPUT_FIELDS)
+            if write_header:
+                self._csv.writeheader()
+        elif output_format == 'jsonl':
+            self._file = open(path, 'a', encoding='utf-8')
+        else:
+            self._file = None
+            # parquet无法追加，续跑时写入新的分片文件
+            stem, ext = os.path.splitext(path)
+            part = 0
+            while os.path.exists(self.path):
+                part += 1
+                self.path = f'{stem}-{part}{ext}'
+
+    def write(self, rows: list):
+        if not rows:
+            return
+        if self.format == 'csv':
+            self._csv.writerows(rows)
+        elif self.format == 'jsonl':
+            for row in rows:
+                self._file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            schema = pa.schema([('filename', pa.string()), ('status', pa.int32()), ('message', pa.string()),
+                                ('chinese_name', pa.string()), ('latin_name', pa.string()),
+                                ('probability', pa.float64()), ('results', pa.string())])
+            table = pa.Table.from_pylist(rows, schema=schema)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, schema)
+            self._parquet.write_table(table)
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def load_checkpoint(path: str) -> set:
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r', encoding='utf-8') as f:
+        return {line.rstrip('\n') for line in f if line.strip()}
+
+
+def format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    return '{:02d}:{:02d}:{:02d}'.format(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线批量识别')
+    parser.add_argument('src_dirs', nargs='*', default=['images'], help='图片目录（递归查找）')
+    parser.add_argument('--output', required=True, help='结果文件，.csv/.jsonl/.parquet')
+    parser.add_argument('--format', choices=['csv', 'jsonl', 'parquet'], default=None,
+                        help='输出格式，默认按扩展名判断')
+    parser.add_argument('--checkpoint', default=None, help='检查点文件，默认为输出文件名加.done')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='工作进程数')
+    parser.add_argument('--threads', type=int, default=1, help='每个进程的推理线程数')
+    parser.add_argument('--batch-size', type=int, default=8, help='推理批量')
+    parser.add_argument('--chunk-size', type=int, default=256, help='每次分给工作进程的文件数')
+    parser.add_argument('--prefetch', type=int, default=16, help='每个进程预读解码的图片数')
+    parser.add_argument('--topk', type=int, default=5, help='保存的候选数')
+    parser.add_argument('--sort', choices=['name', 'mtime'], default='name',
+                        help='处理顺序，mtime与demo.py相同（最新的在前），需要额外stat每个文件')
+    parser.add_argument('--log-interval', type=float, default=10, help='进度输出间隔（秒）')
+    args = parser.parse_args()
+    if args.topk < 1:
+        parser.error('--topk须为正整数')
+
+    output_format = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if output_format not in ('csv', 'jsonl', 'parquet'):
+        print(f"无法识别输出格式: {args.output}，请通过--format指定")
+        sys.exit(1)
+    if output_format == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            print("输出parquet需要安装pyarrow: pip install pyarrow")
+            sys.exit(1)
+    checkpoint_path = args.checkpoint or args.output + '.done'
+
+    filenames = sum([list_images(src_dir) for src_dir in args.src_dirs], [])
+    if args.sort == 'mtime':
+        filenames.sort(key=lambda t: os.stat(t).st_mtime, reverse=True)
+    done = load_checkpoint(checkpoint_path)
+    todo = [filename for filename in filenames if filename not in done]
+    print(f"共{len(filenames)}张图片，已完成{len(filenames) - len(todo)}张，待处理{len(todo)}张")
+    if not todo:
+        return
+
+    chunks = [(todo[i: i + args.chunk_size], args.topk, args.batch_size, args.prefetch)
+              for i in range(0, len(todo), args.chunk_size)]
+    writer = ResultWriter(args.output, output_format)
+    processed = failed = 0
+    start_time = last_log = time.time()
+    try:
+        with multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(args.threads,)) as pool, \
+                open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+            for rows in pool.imap_unordered(classify_chunk, chunks):
+                # 先落盘结果再记录检查点，中断时最多重复写入一块
+                writer.write(rows)
+                checkpoint.write(''.join(row['filename'] + '\n' for row in rows))
+                checkpoint.flush()
+                processed += len(rows)
+                failed += sum(row['status'] != 0 for row in rows)
+
+                now = time.time()
+                if now - last_log >= args.log_interval or processed == len(todo):
+                    rate = processed / (now - start_time)
+                    eta = (len(todo) - processed) / rate if rate > 0 else 0
+                    print(f"[{processed}/{len(todo)}] {rate:.1f} images/sec  失败{failed}  "
+                          f"ETA {format_eta(eta)}")
+                    last_log = now
+    finally:
+        writer.close()
+    print(f"完成，耗时{format_eta(time.time() - start_time)}，结果: {writer.path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ import cv2
 import khandy
 import numpy as np
 
-import plantid
+from plant_engine import create_plant_identifier
 
 
 if __name__ == '__main__':
@@ -13,7 +13,7 @@ if __name__ == '__main__':
     src_filenames = sum([khandy.get_all_filenames(src_dir) for src_dir in src_dirs], [])
     src_filenames = sorted(src_filenames, key=lambda t: os.stat(t).st_mtime, reverse=True)
     
-    plant_identifier = plantid.PlantIdentifier()
+    plant_identifier = create_plant_identifier()
     start_time = time.time()
     for k, name in enumerate(src_filenames):
         image = khandy.imread_cv(name)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app_config import get_config
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp'}
+
+# 分块读取大小
+READ_CHUNK_SIZE = 1024 * 1024
+
+# JPEG在DCT域缩小解码支持的比例
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# SOF标记（SOF0-SOF15，排除DHT、JPG、DAC）
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def read_and_hash(stream, chunk_size: int = READ_CHUNK_SIZE,
+                  timings: Optional[dict] = None) -> Tuple[bytearray, str]:
+    """
+    分块读取上传内容，读取的同时计算MD5，避免对数据再扫描一遍
+
+    传入timings时，读取与计算MD5的耗时分别累加到'read'与'hash'。
+    """
+    digest = hashlib.md5()
+    buffer = bytearray()
+    read_time = hash_time = 0.0
+    while True:
+        start_time = time.perf_counter()
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            read_time += time.perf_counter() - start_time
+            break
+        buffer += chunk
+        middle_time = time.perf_counter()
+        digest.update(chunk)
+        read_time += middle_time - start_time
+        hash_time += time.perf_counter() - middle_time
+    if timings is not None:
+        timings['read'] = timings.get('read', 0.0) + read_time
+        timings['hash'] = timings.get('hash', 0.0) + hash_time
+    return buffer, digest.hexdigest()
+
+
+def decode_image(data) -> Optional[np.ndarray]:
+    """解码图片数据为BGR图像，失败时返回None"""
+    if not data:
+        return None
+    nparr = np.frombuffer(data, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+def get_jpeg_size(data) -> Optional[Tuple[int, int]]:
+    """只解析JPEG头部的SOF段获取(宽, 高)，不是JPEG或解析失败时返回None"""
+    data = memoryview(data)
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # 填充字节
+            offset += 1
+            continue
+        if marker in (0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7):
+            offset += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            return None
+        length = (data[offset + 2] << 8) | data[offset + 3]
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 9 > len(data):
+                return None
+            height = (data[offset + 5] << 8) | data[offset + 6]
+            width = (data[offset + 7] << 8) | data[offset + 8]
+            return width, height
+        offset += 2 + length
+    return None
+
+
+def choose_reduction(width: int, height: int, min_short: int) -> int:
+    """选择缩小解码后短边仍不小于min_short的最大比例"""
+    short_side = min(width, height)
+    for factor, _ in REDUCED_DECODE_FLAGS:
+        # DCT缩放后的尺寸向上取整
+        if -(-short_side // factor) >= min_short:
+            return factor
+    return 1
+
+
+def decode_image_reduced(data, min_short: int) -> Optional[np.ndarray]:
+    """
+    解码时直接缩小大尺寸JPEG
+
+    在DCT域按1/2、1/4、1/8解码，短边保持不小于min_short，
+    省去全分辨率解码的大部分计算与内存；其他格式按原尺寸解码。
+    """
+    if not data:
+        return None
+    size = get_jpeg_size(data)
+    if size is not None:
+        factor = choose_reduction(size[0], size[1], min_short)
+        if factor > 1:
+            flag = dict(REDUCED_DECODE_FLAGS)[factor]
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+            if image is not None:
+                return image
+    return decode_image(data)
+
+
+def decode_for_inference(data) -> Optional[np.ndarray]:
+    """按config.yaml的image_processing配置解码用于识别的图片"""
+    if get_config('image_processing', 'reduced_decode', True):
+        return decode_image_reduced(data, get_config('image_processing', 'resize_short', 224))
+    return decode_image(data)
+
+
+def list_images(image_dir: str, limit: int = 0) -> list:
+    """递归列出目录下的图片，按路径排序保证结果可复现"""
+    filenames = []
+    for root, _, names in os.walk(image_dir):
+        for name in names:
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                filenames.append(os.path.join(root, name))
+    filenames.sort()
+    return filenames[:limit] if limit > 0 else filenames
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class InferencePoolFullError(Exception):
+    """推理队列已满"""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("推理队列已满")
+        self.retry_after = retry_after
+
+
+class InferencePool:
+    """
+    专用推理线程池
+
+    图片解码与模型推理在独立线程中执行，不阻塞事件循环；
+    正在执行与排队的任务总数受 max_workers + max_queue_size 限制，
+    超出时立即拒绝而不是无限排队。
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue_size: int = 32, retry_after: int = 1):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue_size = max(0, int(max_queue_size))
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix='inference')
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue_size
+
+    @property
+    def pending(self) -> int:
+        """正在执行与排队的任务数"""
+        return self._pending
+
+    @property
+    def queue_depth(self) -> int:
+        """排队等待执行的任务数"""
+        return max(0, self._pending - self.max_workers)
+
+    def is_saturated(self) -> bool:
+        return self._pending >= self.capacity
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise InferencePoolFullError(self.retry_after)
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func, *args, **kwargs):
+        """
+        在推理线程池中执行func，队列已满时抛出InferencePoolFullError
+
+        名额在线程池任务结束（或排队时被取消）时才归还：等待的协程被取消（如客户端断开）时，
+        已在执行的任务仍占用线程，提前归还会让实际任务数超过上限。
+        """
+        self._acquire()
+        try:
+            future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+预编译的标签索引
+
+把标签文件编译为一个二进制文件，启动时以mmap加载，不再逐行解析文本，
+多个进程共享页缓存中的同一份数据。文件结构（小端）：
+    文件头      magic与各部分的数量、偏移
+    类别记录    int32[类别数, 3]，每个类别各字段在字符串表中的序号
+    字符串偏移  uint32[字符串数 + 1]
+    名称哈希表  uint32[槽数, 3]，(名称的crc32, 字符串序号, 类别)，开放寻址，用于按中文名或拉丁名反查类别
+    字符串表    UTF-8，按偏移切分，序号0为空字符串
+    源文件信息  JSON，编译时标签文件的路径、大小与修改时间，任一不同即需重新编译
+用法: python label_index.py [--output data/label_index/quarrying_plantid_label_map.idx]
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import zlib
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+
+from label_table import read_label_file
+
+MAGIC = b'PLIDX003'
+# magic, 类别数, 字段数, 字符串数, 哈希表槽数, 类别记录/字符串偏移/哈希表/字符串表/源文件信息的起始位置, 源文件信息的长度
+HEADER = struct.Struct('<8s10I')
+# 类别记录的字段，name为标签文件中的完整中文名（科_属_种），各字段均可用于反查类别
+FIELDS = ('name', 'chinese_name', 'latin_name')
+EMPTY_SLOT = 0xFFFFFFFF
+
+
+def name_hash(data: bytes) -> int:
+    return zlib.crc32(data) & 0xFFFFFFFF
+
+
+def align(offset: int, size: int = 8) -> int:
+    return (offset + size - 1) // size * size
+
+
+def source_signature(*source_paths: Optional[str]) -> list:
+    """各源文件的[绝对路径, 大小, 修改时间(ns)]，未配置为None，不存在时大小与修改时间为None"""
+    signature = []
+    for path in source_paths:
+        if not path:
+            signature.append(None)
+        elif os.path.exists(path):
+            stat = os.stat(path)
+            signature.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+        else:
+            signature.append([os.path.abspath(path), None, None])
+    return signature
+
+
+def build_label_index(label_map_path: str, output_path: str) -> str:
+    """编译索引，先写临时文件再替换，正在使用旧索引的进程不受影响"""
+    # 读取前记录源文件信息，编译期间源文件有改动时下次加载会重新编译
+    sources = json.dumps(source_signature(label_map_path)).encode('utf-8')
+    labels = read_label_file(label_map_path)
+    num_classes = max(labels) + 1 if labels else 0
+
+    strings = {'': 0}
+    records = np.zeros((num_classes, len(FIELDS)), dtype=np.int32)
+    for label, (name, latin_name) in labels.items():
+        values = [name, name.split('_')[-1], latin_name]
+        records[label] = [strings.setdefault(value, len(strings)) for value in values]
+
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    offsets[1:] = np.cumsum([len(data) for data in encoded])
+
+    # 反查表的每一项为(名称, 类别)，同名的多个类别各占一项；装载率不超过3/4
+    entries = sorted({(string_id, label) for label in labels
+                      for string_id in records[label].tolist() if string_id})
+    num_slots = 1
+    while num_slots * 3 < len(entries) * 4:
+        num_slots *= 2
+    slots = [(EMPTY_SLOT, EMPTY_SLOT, EMPTY_SLOT)] * num_slots
+    for string_id, label in entries:
+        hash_value = name_hash(encoded[string_id])
+        slot = hash_value & (num_slots - 1)
+        while slots[slot][1] != EMPTY_SLOT:
+            slot = (slot + 1) & (num_slots - 1)
+        slots[slot] = (hash_value, string_id, label)
+    slots = np.array(slots, dtype=np.uint32).reshape(num_slots, 3)
+
+    records_offset = align(HEADER.size)
+    offsets_offset = align(records_offset + records.nbytes)
+    slots_offset = align(offsets_offset + offsets.nbytes)
+    strings_offset = align(slots_offset + slots.nbytes)
+    sources_offset = align(strings_offset + int(offsets[-1]))
+    header = HEADER.pack(MAGIC, num_classes, len(FIELDS), len(encoded), num_slots,
+                         records_offset, offsets_offset, slots_offset, strings_offset, sources_offset, len(sources))
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        for offset, data in ((0, header), (records_offset, records.tobytes()), (offsets_offset, offsets.tobytes()),
+                             (slots_offset, slots.tobytes()), (strings_offset, b''.join(encoded)),
+                             (sources_offset, sources)):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(data)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+class LabelIndex:
+    """
+    以mmap加载的标签索引，接口与LabelTable相同（len、results），另外支持按类别取完整信息与按名称反查
+
+    各数组都是mmap上的视图，只在取到某个类别时才解码对应的字符串。
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, num_classes, num_fields, num_strings, num_slots,
+         records_offset, offsets_offset, slots_offset, strings_offset, _, _) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or num_fields != len(FIELDS):
+            self._mmap.close()
+            raise ValueError(f'不是有效的标签索引文件: {path}')
+        self.path = path
+        self._records = np.frombuffer(self._mmap, dtype=np.int32, count=num_classes * num_fields,
+                                      offset=records_offset).reshape(num_classes, num_fields)
+        self._offsets = np.frombuffer(self._mmap, dtype=np.uint32, count=num_strings + 1, offset=offsets_offset)
+        self._slots = np.frombuffer(self._mmap, dtype=np.uint32, count=num_slots * 3,
+                                    offset=slots_offset).reshape(num_slots, 3)
+        self._strings_offset = strings_offset
+        self._chinese_name = FIELDS.index('chinese_name')
+        self._latin_name = FIELDS.index('latin_name')
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _bytes(self, string_id: int) -> bytes:
+        start = self._strings_offset + int(self._offsets[string_id])
+        return self._mmap[start: self._strings_offset + int(self._offsets[string_id + 1])]
+
+    def _string(self, string_id: int) -> str:
+        return self._bytes(string_id).decode('utf-8')
+
+    def lookup(self, label: int) -> dict:
+        """类别的完整信息，字段见FIELDS"""
+        return {field: self._string(string_id) for field, string_id in zip(FIELDS, self._records[label].tolist())}
+
+    def find(self, name: str) -> List[int]:
+        """按完整中文名、中文种名或拉丁名反查类别，不存在时返回空列表"""
+        data = name.encode('utf-8')
+        if not data or not len(self._slots):
+            return []
+        hash_value = name_hash(data)
+        mask = len(self._slots) - 1
+        slot = hash_value & mask
+        labels = []
+        while True:
+            stored_hash, string_id, label = self._slots[slot].tolist()
+            if string_id == EMPTY_SLOT:
+                return sorted(labels)
+            if stored_hash == hash_value and self._bytes(string_id) == data:
+                labels.append(label)
+            slot = (slot + 1) & mask
+
+    def results(self, probs: np.ndarray, indices: np.ndarray) -> List[dict]:
+        """按indices的顺序生成识别结果，格式与PlantIdentifier.identify的results相同"""
+        records = self._records[indices][:, [self._chinese_name, self._latin_name]].tolist()
+        return [{'chinese_name': self._string(chinese_name), 'latin_name': self._string(latin_name),
+                 'probability': prob}
+                for (chinese_name, latin_name), prob in zip(records, probs[indices].tolist())]
+
+
+def read_sources(index_path: str) -> Optional[list]:
+    """索引中记录的源文件信息，文件不存在或不是当前格式的索引时返回None"""
+    try:
+        with open(index_path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return None
+            fields = HEADER.unpack(header)
+            if fields[0] != MAGIC:
+                return None
+            f.seek(fields[-2])
+            return json.loads(f.read(fields[-1]).decode('utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def is_stale(index_path: str, *source_paths: Optional[str]) -> bool:
+    """
+    索引不存在、格式过旧，或任一源文件的路径、大小、修改时间与编译时不同时需要重新编译
+
+    比较的是是否相同而不是先后，换用同名的其他标签文件或恢复修改时间更早的备份也会重新编译。
+    """
+    return read_sources(index_path) != source_signature(*source_paths)
+
+
+@lru_cache(maxsize=None)
+def load_label_index(index_path: str, label_map_path: str) -> LabelIndex:
+    """加载索引，不存在或已过期时先由标签文件编译；同一索引在进程内只打开一次"""
+    if is_stale(index_path, label_map_path):
+        build_label_index(label_map_path, index_path)
+        print(f"标签索引已生成: {index_path}")
+    return LabelIndex(index_path)
+
+
+def main():
+    from plant_engine import get_label_index_path, get_label_path
+
+    parser = argparse.ArgumentParser(description='编译标签索引')
+    parser.add_argument('--label-map', default=None, help='标签文件，默认取config.yaml中的label_map_path')
+    parser.add_argument('--output', default=None, help='索引文件，默认按label_index_dir与标签文件名生成')
+    args = parser.parse_args()
+
+    label_map_path = get_label_path(args.label_map)
+    output_path = args.output or get_label_index_path(label_map_path)
+    if not output_path:
+        parser.error('config.yaml未配置plant_identification.label_index_dir，请用--output指定索引文件')
+    build_label_index(label_map_path, output_path)
+    index = LabelIndex(output_path)
+    print(f"标签索引已生成: {output_path}（{len(index)}个类别，{os.path.getsize(output_path) / 1024:.1f}KB）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+
+
+def read_label_file(filename: str) -> dict:
+    """读取标签文件（每行: 标签,中文名,拉丁名），返回 标签 -> (中文名, 拉丁名)"""
+    labels = {}
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            label, chinese_name, latin_name = line.split(',', 2)
+            labels[int(label)] = (chinese_name, latin_name)
+    return labels
+
+
+class LabelTable:
+    """
+    按类别序号排列的标签数组，启动时构建一次
+
+    标签文件中的中文名为"科_属_种"，取出的种名与拉丁名分别存为列表，
+    后处理按序号直接取值，不再逐行拆分字符串。
+    """
+
+    def __init__(self, chinese_names: List[str], latin_names: List[str]):
+        self.chinese_names = chinese_names
+        self.latin_names = latin_names
+
+    @classmethod
+    def load(cls, label_map_path: str) -> 'LabelTable':
+        """读取标签文件"""
+        labels = read_label_file(label_map_path)
+        num_classes = max(labels) + 1 if labels else 0
+        chinese_names = [''] * num_classes
+        latin_names = [''] * num_classes
+        for label, (chinese_name, latin_name) in labels.items():
+            chinese_names[label] = chinese_name.split('_')[-1]
+            latin_names[label] = latin_name
+        return cls(chinese_names, latin_names)
+
+    def __len__(self) -> int:
+        return len(self.chinese_names)
+
+    def results(self, probs: np.ndarray, indices: np.ndarray) -> List[dict]:
+        """按indices的顺序生成识别结果，格式与PlantIdentifier.identify的results相同"""
+        chinese_names = self.chinese_names
+        latin_names = self.latin_names
+        return [{'chinese_name': chinese_names[ind], 'latin_name': latin_names[ind], 'probability': prob}
+                for ind, prob in zip(indices.tolist(), probs[indices].tolist())]
+
+
+@lru_cache(maxsize=None)
+def load_label_table(label_map_path: str) -> LabelTable:
+    """同一标签文件在进程内只读取一次；多进程部署时在fork前调用，各工作进程共享"""
+    return LabelTable.load(label_map_path)
+
+
+def top_k_indices(probs: np.ndarray, topk: int) -> np.ndarray:
+    """概率最大的topk个类别，按概率从大到小排列；只对部分选择出的topk个元素排序"""
+    if topk >= len(probs):
+        return np.argsort(-probs)
+    indices = np.argpartition(-probs, topk - 1)[:topk]
+    return indices[np.argsort(-probs[indices])]
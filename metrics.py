@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+from typing import Callable, Optional
+
+from app_config import get_config
+
+try:
+    from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                                   generate_latest)
+    from prometheus_client.core import GaugeMetricFamily
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 单张图片处理的各阶段
+STAGES = ('queue', 'read', 'hash', 'cache_lookup', 'decode', 'near_duplicate', 'preprocess', 'inference',
+          'postprocess')
+
+# 阶段耗时分布的桶（秒），覆盖缓存命中的亚毫秒级到大图解码的秒级
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class StatsCollector:
+    """采集时调用stats()，把其中的数值逐项导出为gauge，如缓存命中率"""
+
+    def __init__(self, prefix: str, stats: Callable[[], dict]):
+        self.prefix = prefix
+        self.stats = stats
+
+    def collect(self):
+        try:
+            stats = self.stats()
+        except Exception as e:
+            print(f"指标采集失败: {e}")
+            return
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauge = GaugeMetricFamily(f'{self.prefix}_{key}', key)
+                gauge.add_metric([], float(value))
+                yield gauge
+
+
+class FunctionCollector:
+    """采集时调用func取值的gauge，多进程模式下为响应抓取的那个进程的值"""
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+
+    def collect(self):
+        gauge = GaugeMetricFamily(self.name, self.documentation)
+        gauge.add_metric([], float(self.func()))
+        yield gauge
+
+
+def is_multiprocess() -> bool:
+    """设置了PROMETHEUS_MULTIPROC_DIR时（如prefork_server.py启动的多个工作进程）汇总各进程的指标"""
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def mark_process_dead(pid: int):
+    """多进程模式下工作进程退出后清理其正在处理的请求数等实时值"""
+    if PROMETHEUS_AVAILABLE and is_multiprocess():
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
+
+
+class ServiceMetrics:
+    """
+    服务指标，以Prometheus文本格式导出
+
+    未安装prometheus_client或monitoring.enabled为false时所有方法均为空操作，
+    调用方无需判断。多进程模式下计数器与直方图写入PROMETHEUS_MULTIPROC_DIR，
+    导出时汇总所有工作进程；队列深度、缓存统计等仍为响应抓取的那个进程的值。
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, prefix: str = 'plantid'):
+        if enabled is None:
+            enabled = get_config('monitoring', 'enabled', True)
+        if enabled and not PROMETHEUS_AVAILABLE:
+            print("未安装prometheus_client，指标导出已关闭")
+        self.enabled = bool(enabled) and PROMETHEUS_AVAILABLE
+        self.prefix = prefix
+        # /stats使用，未启用指标导出时也计数
+        self.total_requests = 0
+        if not self.enabled:
+            return
+
+        self.registry = CollectorRegistry()
+        # 多进程模式下指标值写入共享目录，由MultiProcessCollector导出，不再注册到本进程的registry
+        registry = self.registry
+        if is_multiprocess():
+            from prometheus_client import multiprocess
+            multiprocess.MultiProcessCollector(self.registry)
+            registry = None
+        self.requests = Counter(f'{prefix}_requests_total', '请求数',
+                                ['endpoint', 'method', 'status'], registry=registry)
+        self.request_duration = Histogram(f'{prefix}_request_duration_seconds', '请求处理耗时',
+                                          ['endpoint'], buckets=REQUEST_BUCKETS, registry=registry)
+        self.in_flight = Gauge(f'{prefix}_requests_in_flight', '正在处理的请求数', registry=registry,
+                               multiprocess_mode='livesum')
+        self.stage_duration = Histogram(f'{prefix}_stage_duration_seconds', '单张图片各阶段耗时',
+                                        ['stage'], buckets=STAGE_BUCKETS, registry=registry)
+        self.model_load = Gauge(f'{prefix}_model_load_seconds', '模型加载耗时', registry=registry,
+                                multiprocess_mode='max')
+
+    def observe_request(self, endpoint: str, method: str, status: int, seconds: float):
+        if self.enabled:
+            self.requests.labels(endpoint, method, str(status)).inc()
+            self.request_duration.labels(endpoint).observe(seconds)
+
+    def request_started(self):
+        self.total_requests += 1
+        if self.enabled:
+            self.in_flight.inc()
+
+    def request_finished(self):
+        if self.enabled:
+            self.in_flight.dec()
+
+    def observe_stages(self, timings: dict):
+        """记录一张图片的各阶段耗时，键为STAGES中的阶段名"""
+        if self.enabled:
+            for stage, seconds in timings.items():
+                self.stage_duration.labels(stage).observe(seconds)
+
+    def set_model_load_time(self, seconds: float):
+        if self.enabled:
+            self.model_load.set(seconds)
+
+    def add_gauge(self, name: str, documentation: str, func: Callable[[], float]):
+        """采集时调用func取值的gauge，如推理队列深度"""
+        if self.enabled:
+            self.registry.register(FunctionCollector(f'{self.prefix}_{name}', documentation, func))
+
+    def add_stats(self, stats: Callable[[], dict]):
+        """采集时导出stats()中的各项数值"""
+        if self.enabled:
+            self.registry.register(StatsCollector(self.prefix, stats))
+
+    def render(self) -> bytes:
+        if not self.enabled:
+            return b''
+        return generate_latest(self.registry)
+
+
+class MetricsMiddleware:
+    """
+    记录请求数、耗时与正在处理的请求数的ASGI中间件
+
+    不使用BaseHTTPMiddleware，流式响应发送完毕才算请求结束，
+    也不会干扰流式接口对请求体的读取。
+    """
+
+    def __init__(self, app, metrics: ServiceMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = {'code': 500}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        self.metrics.request_started()
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.request_finished()
+            # 用路由模板作为标签，避免路径参数导致标签数量失控
+            route = scope.get('route')
+            self.metrics.observe_request(getattr(route, 'path', 'unmatched'), scope['method'],
+                                         status['code'], time.perf_counter() - start_time)
+
+
+def install_flask_hooks(app, metrics: ServiceMetrics):
+    """为Flask应用记录请求数、耗时与正在处理的请求数"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_metrics():
+        metrics.request_started()
+        g.metrics_start_time = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_request(endpoint, request.method, response.status_code,
+                                time.perf_counter() - g.metrics_start_time)
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        if 'metrics_start_time' in g:
+            metrics.request_finished()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    动态微批处理
+
+    并发调用identify时，预处理在调用方线程中完成，预处理后的张量
+    交给后台线程；后台线程最多等待max_wait_ms或凑满max_batch_size
+    后堆叠成[N,3,224,224]一次推理，再把概率分发回各调用方做top-k。
+    调用方阻塞等待结果，一个批次最多包含同时调用infer的线程数个张量，
+    因此在线程池中使用时max_batch_size不必超过线程池的线程数。
+    关闭后infer抛出RuntimeError，尚未推理的请求同样以RuntimeError结束。
+    """
+
+    def __init__(self, engine, max_batch_size: int = 10, max_wait_ms: float = 5.0):
+        self.engine = engine
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def infer(self, tensor: np.ndarray) -> np.ndarray:
+        """提交单个预处理后的张量，阻塞直到返回该张量的概率向量"""
+        future = Future()
+        # 与close互斥，关闭信号之后不会再有新的请求入队
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("微批处理器已关闭")
+            self._queue.put((tensor, future))
+        return future.result()
+
+    def identify(self, image: np.ndarray, topk: int = 5) -> dict:
+        """与PlantEngine.identify相同的接口"""
+        tensor = self.engine.preprocess(image)
+        if tensor is None:
+            return self.engine.error_outputs()
+        return self.engine.postprocess(self.infer(tensor), topk)
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # 关闭信号放回队列，处理完当前批次后退出
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = self._collect(item)
+            try:
+                probs = self.engine.forward(np.stack([tensor for tensor, _ in batch]))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), one_probs in zip(batch, probs):
+                future.set_result(one_probs)
+
+    def close(self):
+        """关闭信号之前入队的请求处理完后退出；超时未退出时，仍在排队的请求以RuntimeError结束"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout=5)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                continue
+            _, future = item
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("微批处理器已关闭"))
+        if self._thread.is_alive():
+            # 后台线程仍在推理当前批次，完成后由关闭信号退出
+            self._queue.put(None)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import importlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Sequence
+
+# 模型的加载状态
+IDLE = 'idle'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class ModelNotReadyError(Exception):
+    """模型正在加载"""
+
+    def __init__(self, retry_after: int = 5):
+        super().__init__("模型加载中，请稍后重试")
+        self.retry_after = retry_after
+
+
+class ModelLoader:
+    """
+    在后台线程中加载模型并记录状态
+
+    服务启动时调用start()后立即返回，端口随即开始监听。模型依赖的重量级模块
+    （numpy、cv2、onnxruntime等）在加载线程中才导入，各模块的导入耗时记入import_profile。
+    存活只表示进程在运行，就绪表示模型已加载且预热推理成功、可以处理请求。
+    配置了reload_initial_delay时，加载失败后在后台按指数退避重试，间隔最长reload_max_delay秒。
+    """
+
+    def __init__(self, load: Callable[[], object], imports: Sequence[str] = (), retry_after: int = 5,
+                 warmup: Optional[Callable[[object], None]] = None,
+                 reload_initial_delay: float = 0, reload_max_delay: float = 60):
+        self._load = load
+        self._warmup = warmup
+        self.imports = tuple(imports)
+        self.retry_after = retry_after
+        self.reload_initial_delay = reload_initial_delay
+        self.reload_max_delay = reload_max_delay
+        self.state = IDLE
+        self.model = None
+        self.error = None
+        self.load_time = None
+        self.warmup_time = None
+        self.attempts = 0
+        self.next_retry = None
+        self.import_profile = OrderedDict()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def _begin(self) -> bool:
+        """切换为加载中，已在加载或已就绪时返回False"""
+        with self._lock:
+            if self.state in (LOADING, READY):
+                return False
+            self.state = LOADING
+            self.next_retry = None
+            self._done.clear()
+            return True
+
+    def start(self):
+        """在后台线程中加载，已在加载或已就绪时不重复加载"""
+        if self._begin():
+            threading.Thread(target=self._run, name='model-loader', daemon=True).start()
+
+    def load(self, timeout: Optional[float] = None) -> bool:
+        """在当前线程中加载（加载失败后也会重试），正在后台加载时等待完成，返回是否就绪"""
+        if self._begin():
+            self._run()
+        else:
+            self._done.wait(timeout)
+        return self.ready
+
+    def get(self):
+        """
+        已就绪时返回模型，加载失败且未开启后台重试时返回None，其余情况抛出ModelNotReadyError
+
+        不会在当前线程加载模型，可以在事件循环中直接调用；尚未开始加载时先在后台开始加载。
+        """
+        state = self.state
+        if state == READY:
+            return self.model
+        if state == IDLE:
+            self.start()
+            raise ModelNotReadyError(self.retry_after)
+        if state == LOADING:
+            raise ModelNotReadyError(self.retry_after)
+        next_retry = self.next_retry
+        if next_retry is not None:
+            raise ModelNotReadyError(max(1, int(next_retry - time.time() + 0.999)))
+        return None
+
+    def status(self) -> dict:
+        """当前状态，只读取已记录的值"""
+        return {
+            'state': self.state,
+            'ready': self.ready,
+            'error': self.error,
+            'load_time': round(self.load_time, 3) if self.load_time is not None else None,
+            'warmup_time': round(self.warmup_time, 3) if self.warmup_time is not None else None,
+            'attempts': self.attempts,
+            'next_retry_in': round(max(0.0, self.next_retry - time.time()), 1) if self.next_retry else None,
+        }
+
+    def _retry_delay(self) -> Optional[float]:
+        """第n次失败后等待 reload_initial_delay * 2^(n-1) 秒（不超过reload_max_delay）再重试，未开启重试时返回None"""
+        if self.reload_initial_delay <= 0:
+            return None
+        return min(self.reload_max_delay, self.reload_initial_delay * 2 ** (self.attempts - 1))
+
+    def _schedule_retry(self, delay: float):
+        """在后台重试，调用前状态须已切换为加载失败，否则定时器触发时不会开始加载"""
+        timer = threading.Timer(delay, self.start)
+        timer.daemon = True
+        timer.start()
+        print(f"{delay:g}秒后重新加载模型（第{self.attempts + 1}次）")
+
+    def _import_modules(self):
+        for name in self.imports:
+            start_time = time.perf_counter()
+            importlib.import_module(name)
+            self.import_profile[name] = time.perf_counter() - start_time
+        if self.import_profile:
+            print("模块导入耗时: " + ', '.join(f'{name} {seconds * 1000:.1f}ms'
+                                         for name, seconds in self.import_profile.items()) +
+                  f"，合计 {sum(self.import_profile.values()) * 1000:.1f}ms")
+
+    def _run(self):
+        self.attempts += 1
+        start_time = time.perf_counter()
+        try:
+            if not self.import_profile:
+                self._import_modules()
+            model = self._load()
+            self.load_time = time.perf_counter() - start_time
+            if self._warmup is not None:
+                # 预热推理成功才算就绪
+                warmup_start = time.perf_counter()
+                self._warmup(model)
+                self.warmup_time = time.perf_counter() - warmup_start
+        except Exception as e:
+            self.error = str(e)
+            # 先记录重试时间再切换状态，get()看到加载失败时不会误判为不再重试
+            delay = self._retry_delay()
+            self.next_retry = time.time() + delay if delay is not None else None
+            self.state = FAILED
+            print(f"模型加载失败: {e}")
+            if delay is not None:
+                self._schedule_retry(delay)
+        else:
+            self.model = model
+            self.error = None
+            self.state = READY
+            print(f"模型加载完成，耗时 {self.load_time:.2f}s")
+        finally:
+            self._done.set()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from app_config import get_config
+
+
+def dhash(image, hash_size: int = 8) -> int:
+    """
+    差值哈希（dHash），返回hash_size*hash_size位的整数
+
+    缩小为(hash_size+1) x hash_size的灰度图后比较水平相邻像素的明暗，
+    缩放、重新压缩、去掉EXIF等操作基本不改变结果，相近的图片汉明距离很小。
+    cv2与numpy在首次调用时才导入，服务启动时不必加载。
+    """
+    import cv2
+    import numpy as np
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGRA2GRAY if small.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class MultiIndexHash:
+    """
+    汉明距离近邻查找（multi-index hashing）
+
+    把哈希切分为threshold+1段，每段一张哈希表。两个哈希的距离不超过threshold时，
+    由抽屉原理至少有一段完全相同，因此只需比较与查询在某一段上相同的候选项，
+    条目很多时也只检查一小部分，插入与删除都是O(段数)。
+    """
+
+    def __init__(self, threshold: int, bits: int = 64):
+        num_chunks = max(1, min(bits, threshold + 1))
+        self.threshold = threshold
+        self._chunks = []  # (右移位数, 掩码)
+        shift = 0
+        for k in range(num_chunks):
+            width = bits // num_chunks + (1 if k < bits % num_chunks else 0)
+            self._chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables = [{} for _ in self._chunks]  # 段的值 -> 哈希集合
+        self._values = {}  # 哈希 -> 值
+
+    def __len__(self):
+        return len(self._values)
+
+    def add(self, key: int, value):
+        """加入一个哈希，已存在相同哈希时替换其值"""
+        if key not in self._values:
+            for table, (shift, mask) in zip(self._tables, self._chunks):
+                table.setdefault((key >> shift) & mask, set()).add(key)
+        self._values[key] = value
+
+    def remove(self, key: int):
+        if self._values.pop(key, None) is None:
+            return
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            chunk = (key >> shift) & mask
+            bucket = table[chunk]
+            bucket.discard(key)
+            if not bucket:
+                del table[chunk]
+
+    def find(self, key: int) -> Optional[Tuple[int, int, object]]:
+        """距离不超过threshold的最近一项，返回(距离, 哈希, 值)，没有时返回None"""
+        if key in self._values:
+            return 0, key, self._values[key]
+        best = None
+        checked = set()
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            for candidate in table.get((key >> shift) & mask, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                distance = hamming(key, candidate)
+                if distance <= self.threshold and (best is None or distance < best[0]):
+                    best = (distance, candidate, self._values[candidate])
+        return best
+
+
+class NearDuplicateIndex:
+    """
+    感知哈希近重复索引，结果缓存的第二级
+
+    记录 感知哈希 -> 图片摘要。图片摘要未命中缓存时，按汉明距离查找相近的已识别图片，
+    再用其摘要查询结果缓存，缩放、重新压缩或去掉EXIF后的同一张照片因此可以复用结果。
+    条目超过max_entries时丢弃最早加入的条目，对应的结果已从缓存中过期的条目在查到时删除。
+    只保存在当前进程内。
+    """
+
+    def __init__(self, threshold: int = 6, max_entries: int = 100000):
+        self.threshold = int(threshold)
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()  # 感知哈希 -> 图片摘要，按加入顺序
+        self._index = MultiIndexHash(self.threshold)
+        self._lock = threading.Lock()
+        self.matches = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def find(self, phash: int) -> Optional[str]:
+        """汉明距离不超过threshold的最相近图片的摘要，不计入命中统计"""
+        with self._lock:
+            found = self._index.find(phash)
+        return found[2] if found is not None else None
+
+    def lookup(self, phash: int, get_entry: Callable[[str], object]) -> Optional[Tuple[str, object]]:
+        """
+        查找最相近的图片并由get_entry(图片摘要)取其缓存的结果，返回(图片摘要, 结果)
+
+        取到结果才计为命中；结果已从缓存中过期时删除这条感知哈希并返回None。
+        get_entry可能访问Redis，调用时不持有锁。
+        """
+        with self._lock:
+            found = self._index.find(phash)
+        if found is not None:
+            _, matched_phash, image_hash = found
+            entry = get_entry(image_hash)
+            if entry is not None:
+                with self._lock:
+                    self.matches += 1
+                return image_hash, entry
+            self.remove(matched_phash, image_hash)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def add(self, phash: int, image_hash: str):
+        with self._lock:
+            self._entries[phash] = image_hash
+            self._entries.move_to_end(phash)
+            self._index.add(phash, image_hash)
+            while len(self._entries) > self.max_entries:
+                oldest, _ = self._entries.popitem(last=False)
+                self._index.remove(oldest)
+
+    def remove(self, phash: int, image_hash: str):
+        """删除感知哈希，期间已被替换为其他图片摘要时保留"""
+        with self._lock:
+            if self._entries.get(phash) == image_hash:
+                del self._entries[phash]
+                self._index.remove(phash)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index = MultiIndexHash(self.threshold)
+
+    def stats(self) -> dict:
+        total = self.matches + self.misses
+        return {
+            'near_duplicate_size': len(self._entries),
+            'near_duplicate_matches': self.matches,
+            'near_duplicate_misses': self.misses,
+            'near_duplicate_match_ratio': round(self.matches / total, 4) if total else 0.0,
+        }
+
+
+def create_near_duplicate_index() -> Optional[NearDuplicateIndex]:
+    """按config.yaml的cache配置创建近重复索引，未开启时返回None；与结果缓存一样受ENABLE_CACHE控制"""
+    enabled = os.environ.get('ENABLE_CACHE', str(get_config('cache', 'enabled', True)))
+    if enabled.lower() not in ('1', 'true', 'yes') or not get_config('cache', 'near_duplicate', False):
+        return None
+    return NearDuplicateIndex(threshold=get_config('cache', 'near_duplicate_threshold', 6),
+                              max_entries=get_config('cache', 'near_duplicate_max_entries', 100000))
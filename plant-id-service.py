@@ -1,48 +1,82 @@
-﻿import os
+﻿import json
+import os
+import threading
 import time
+from typing import List
 import cv2
 import khandy
 import numpy as np
-import plantid
-from fastapi import FastAPI
-import urllib.request as request
+from plant_engine import create_plant_identifier
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from app_config import get_config
+from image_utils import decode_for_inference
+from result_cache import create_result_cache, expand_results, make_cache_key, make_entry
+from url_fetcher import FetchError, create_url_fetcher
+from url_pipeline import stream_url_batch
 import sys
 sys.setrecursionlimit(3000)
 
-def readurlimage(url:str=""):
+plant_identifier = None
+plant_identifier_lock = threading.Lock()
+result_cache = create_result_cache()
+url_fetcher = create_url_fetcher()
+
+def get_plant_identifier():
+    """进程内共享的植物识别器，首次使用时加载模型并预热"""
+    global plant_identifier
+    if plant_identifier is None:
+        with plant_identifier_lock:
+            if plant_identifier is None:
+                identifier = create_plant_identifier()
+                identifier.warmup()
+                plant_identifier = identifier
+    return plant_identifier
+
+async def readurlimage(url:str=""):
+    """异步下载图片，返回(图片数据, MD5)"""
     #url="http://127.0.0.1/profile/upload/2025/04/12/ala_20250412111239A003.jpg"
     #url="https://tse1-mm.cn.bing.net/th/id/OIP-C.WrLSSqDLTrCD5Svuax5GiQHaE8?rs=1&pid=ImgDetMain"
-    res = request.urlopen(url)    
-    print(res)
-    img=np.asarray(bytearray(res.read()),dtype="uint8")
-    print(img.shape)
-    img = cv2.imdecode(img, cv2.IMREAD_COLOR)
-    print(img.shape)
-    #img=cv2.imdecode(img,cv2.IMREAD_COLOR)
-    #print(img)
-    return img
-def  recognize_url(url):    
-    image=readurlimage(url)
-    #image = khandy.imread_cv(src_filename)
-    plant_identifier = plantid.PlantIdentifier()
-    outputs = plant_identifier.identify(image,topk=5)
-    #start_time = time.time()
-	#print('[{}] Time: {:.3f}s  {}'.format( len(src_filename), time.time() - start_time, name))
-       
-    if max(image.shape[:2]) > 1080:
-        image = khandy.resize_image_long(image, 1080)
+    try:
+        return await url_fetcher.fetch(url)
+    except FetchError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+def cached_outputs(image_hash, topk):
+    entry = result_cache.get(make_cache_key(image_hash, topk)) if image_hash else None
+    if entry is None:
+        return None
+    return {'results': expand_results(entry), 'status': 0, 'message': 'OK'}
+def identify_data(data, topk):
+    image = decode_for_inference(data)
+    if image is None:
+        return {'results': [], 'status': -1, 'message': 'Image decode error!'}
+    return get_plant_identifier().identify(image,topk=topk)
+async def  recognize_url(url, topk=5):
+    # 结果缓存可能在Redis中，读写都放到线程池，不阻塞事件循环
+    # 最近识别过的URL不再下载与推理
+    outputs = await run_in_threadpool(cached_outputs, url_fetcher.lookup_digest(url), topk)
+    if outputs is not None:
+        return outputs
+    data, image_hash = await readurlimage(url)
+    # 不同URL可能指向同一张图片
+    outputs = await run_in_threadpool(cached_outputs, image_hash, topk)
+    if outputs is not None:
+        return outputs
+    start_time = time.perf_counter()
+    outputs = await run_in_threadpool(identify_data, data, topk)
     if outputs['status'] == 0:
-        print(outputs['results'][0])
-        print(outputs['results'][1])
-        print(outputs['results'][2])
+        await run_in_threadpool(result_cache.set, make_cache_key(image_hash, topk),
+                                make_entry(outputs['results'], time.perf_counter() - start_time))
+        print(outputs['results'][:3])
     else:
         print(outputs)
     return outputs
 def  recognize(src_filename):
     image = khandy.imread_cv(src_filename)
     print(type(image))
-    plant_identifier = plantid.PlantIdentifier()
-    outputs = plant_identifier.identify(image,topk=5)
+    outputs = get_plant_identifier().identify(image,topk=5)
     #start_time = time.time()
 	#print('[{}] Time: {:.3f}s  {}'.format( len(src_filename), time.time() - start_time, name))
     
@@ -57,14 +91,43 @@ def  recognize(src_filename):
         print(outputs)
     return outputs
 app = FastAPI()
+@app.on_event("startup")
+def load_plant_identifier():
+    # 启动时加载并预热模型，完成后才开始接受请求
+    get_plant_identifier()
+@app.on_event("shutdown")
+async def close_url_fetcher():
+    await url_fetcher.close()
 @app.get("/filepath/")
 def recognizefile(path:str=""):
     result=recognize(path)
     return result
 @app.get("/urlpath/")
-def recognizeurl(path:str=""):
-    result=recognize_url(path)
+async def recognizeurl(path:str=""):
+    result=await recognize_url(path)
     return result
+# 与上传识别接口相同，单张图片最多返回20个结果
+MAX_TOPK = 20
+class URLBatchRequest(BaseModel):
+    urls: List[str]
+    topk: int = 5
+@app.post("/urlpath/batch")
+async def recognizeurls(request: URLBatchRequest):
+    """批量识别URL图片，以NDJSON逐行返回，每行带index对应请求中的URL"""
+    max_urls = get_config('url_fetch', 'batch_max_urls', 1000)
+    if len(request.urls) > max_urls:
+        raise HTTPException(status_code=400, detail=f"单次最多{max_urls}个URL")
+    if not 1 <= request.topk <= MAX_TOPK:
+        raise HTTPException(status_code=400, detail=f"topk须在1到{MAX_TOPK}之间")
+    results = stream_url_batch(
+        url_fetcher, get_plant_identifier(), result_cache, request.urls, request.topk,
+        max_downloads=get_config('url_fetch', 'max_inflight_downloads', 32),
+        max_decoded=get_config('url_fetch', 'max_decoded_images', 32),
+        batch_size=get_config('performance', 'batch_size', 10))
+    async def lines():
+        async for result in results:
+            yield json.dumps(result, ensure_ascii=False) + '\n'
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
 #url="https://tse1-mm.cn.bing.net/th/id/OIP-C.WrLSSqDLTrCD5Svuax5GiQHaE8?rs=1&pid=ImgDetMain"
 #result=recognize_url(url)
 #print(result)
\ No newline at end of file
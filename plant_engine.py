@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+import onnxruntime
+
+from app_config import get_config, load_config
+from label_index import load_label_index
+from label_table import load_label_table, top_k_indices
+from preprocessor import ImagePreprocessor
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 模型版本 -> (config.yaml中的路径配置项, 默认路径)
+MODEL_VARIANTS = {
+    'fp32': ('model_path', 'plantid/models/quarrying_plantid_model.onnx'),
+    'int8': ('int8_model_path', 'plantid/models/quarrying_plantid_model.int8.onnx'),
+}
+
+EXECUTION_MODES = {
+    'sequential': onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    'parallel': onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def resolve_path(path: str) -> str:
+    """配置中的相对路径以项目目录为基准"""
+    if os.path.isabs(path):
+        return path
+    return os.path.join(PROJECT_DIR, path)
+
+
+def load_label_map(filename: str) -> dict:
+    """读取标签文件，每行格式为: 标签,中文名,拉丁名"""
+    label_name_dict = {}
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            label, chinese_name, latin_name = line.split(',', 2)
+            label_name_dict[int(label)] = OrderedDict([
+                ('chinese_name', chinese_name),
+                ('latin_name', latin_name)
+            ])
+    return label_name_dict
+
+
+def get_model_variant() -> str:
+    return os.environ.get('PLANTID_MODEL_VARIANT') or \
+        get_config('plant_identification', 'model_variant', 'fp32')
+
+
+def get_model_path(variant: Optional[str] = None) -> str:
+    """按模型版本（fp32/int8）返回模型文件路径"""
+    variant = variant or get_model_variant()
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"未知的模型版本: {variant}，可选: {', '.join(MODEL_VARIANTS)}")
+    key, default = MODEL_VARIANTS[variant]
+    return resolve_path(get_config('plant_identification', key, default))
+
+
+def get_label_path(label_map_path: Optional[str] = None) -> str:
+    """标签文件的路径"""
+    return resolve_path(label_map_path or get_config(
+        'plant_identification', 'label_map_path', 'plantid/models/quarrying_plantid_label_map.txt'))
+
+
+def get_label_index_path(label_map_path: str) -> Optional[str]:
+    """标签索引的路径，按标签文件名分别存放，未配置label_index_dir时返回None"""
+    index_dir = get_config('plant_identification', 'label_index_dir')
+    if not index_dir:
+        return None
+    return os.path.join(resolve_path(index_dir), os.path.splitext(os.path.basename(label_map_path))[0] + '.idx')
+
+
+def load_labels(label_map_path: Optional[str] = None):
+    """
+    标签表
+
+    配置了label_index_dir时以mmap加载预编译的标签索引（不存在或过期时先生成），
+    索引不可用时退回逐行解析文本的LabelTable，两者的接口相同。
+    """
+    label_map_path = get_label_path(label_map_path)
+    index_path = get_label_index_path(label_map_path)
+    if index_path:
+        try:
+            return load_label_index(index_path, label_map_path)
+        except Exception as e:
+            print(f"标签索引加载失败，改为读取标签文件: {e}")
+    return load_label_table(label_map_path)
+
+
+def get_ort_config() -> dict:
+    """config.yaml的onnxruntime配置，线程数与权重共享可由环境变量覆盖"""
+    ort_config = dict(load_config().get('onnxruntime') or {})
+    for key, env_name in (('intra_op_num_threads', 'ORT_INTRA_OP_NUM_THREADS'),
+                          ('inter_op_num_threads', 'ORT_INTER_OP_NUM_THREADS')):
+        if os.environ.get(env_name):
+            ort_config[key] = int(os.environ[env_name])
+    if os.environ.get('ORT_SHARE_WEIGHTS'):
+        ort_config['share_weights'] = os.environ['ORT_SHARE_WEIGHTS'].lower() in ('1', 'true', 'yes')
+    return ort_config
+
+
+def build_session_options(ort_config: dict) -> onnxruntime.SessionOptions:
+    """按配置构建SessionOptions，线程数为0时由onnxruntime自行决定"""
+    options = onnxruntime.SessionOptions()
+    if ort_config.get('intra_op_num_threads'):
+        options.intra_op_num_threads = int(ort_config['intra_op_num_threads'])
+    if ort_config.get('inter_op_num_threads'):
+        options.inter_op_num_threads = int(ort_config['inter_op_num_threads'])
+    options.execution_mode = EXECUTION_MODES[ort_config.get('execution_mode', 'sequential')]
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[
+        ort_config.get('graph_optimization_level', 'all')]
+    options.enable_cpu_mem_arena = bool(ort_config.get('enable_cpu_mem_arena', True))
+    options.enable_mem_pattern = bool(ort_config.get('enable_mem_pattern', True))
+    if not ort_config.get('allow_spinning', True):
+        # 多个进程共享少量CPU时，关闭线程自旋等待可减少空转
+        options.add_session_config_entry('session.intra_op.allow_spinning', '0')
+        options.add_session_config_entry('session.inter_op.allow_spinning', '0')
+    if ort_config.get('share_weights'):
+        # 预打包会把权重复制为各进程私有的副本
+        options.add_session_config_entry('session.disable_prepacking', '1')
+    return options
+
+
+def get_providers() -> list:
+    providers = ['CPUExecutionProvider']
+    if get_config('performance', 'gpu_enabled', False) and \
+            'CUDAExecutionProvider' in onnxruntime.get_available_providers():
+        providers.insert(0, 'CUDAExecutionProvider')
+    return providers
+
+
+def get_optimized_model_path(model_path: str, ort_config: dict) -> Optional[str]:
+    """优化模型缓存的路径，未配置optimized_model_dir时返回None"""
+    optimized_dir = ort_config.get('optimized_model_dir')
+    if not optimized_dir:
+        return None
+    # 不同模型（如fp32与int8）分别缓存，共享权重的版本另存一份
+    model_name = os.path.splitext(os.path.basename(model_path))[0]
+    suffix = '.optimized.shared.onnx' if ort_config.get('share_weights') else '.optimized.onnx'
+    return os.path.join(resolve_path(optimized_dir), model_name + suffix)
+
+
+def load_optimized_session(optimized_path: str, ort_config: dict) -> onnxruntime.InferenceSession:
+    options = build_session_options(ort_config)
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS['disable']
+    return onnxruntime.InferenceSession(optimized_path, options, providers=get_providers())
+
+
+def create_session(model_path: str, ort_config: dict) -> onnxruntime.InferenceSession:
+    """
+    创建推理会话
+
+    配置了optimized_model_dir时，首次启动把图优化后的模型写入该目录，
+    之后只要缓存文件不比原模型旧，就直接加载缓存并跳过图优化。
+    开启share_weights时缓存的权重写入单独的.data文件，onnxruntime以mmap加载外部权重，
+    加载同一缓存的多个进程共享页缓存中的同一份权重，因此生成缓存后也改为从缓存加载。
+    缓存先写入本进程的临时目录再替换到位，多个进程同时首次启动时不会读到写了一半的文件。
+    """
+    providers = get_providers()
+    optimized_path = get_optimized_model_path(model_path, ort_config)
+    if optimized_path is None:
+        return onnxruntime.InferenceSession(
+            model_path, build_session_options(ort_config), providers=providers)
+
+    share_weights = bool(ort_config.get('share_weights'))
+    if os.path.exists(optimized_path) and \
+            os.path.getmtime(optimized_path) >= os.path.getmtime(model_path):
+        try:
+            return load_optimized_session(optimized_path, ort_config)
+        except Exception as e:
+            print(f"优化模型缓存加载失败，重新生成: {e}")
+
+    options = build_session_options(ort_config)
+    tmp_dir = os.path.join(os.path.dirname(optimized_path), f'.tmp-{os.getpid()}')
+    tmp_path = os.path.join(tmp_dir, os.path.basename(optimized_path))
+    try:
+        os.makedirs(tmp_dir, exist_ok=True)
+        options.optimized_model_filepath = tmp_path
+        if share_weights:
+            options.add_session_config_entry('session.optimized_model_external_initializers_file_name',
+                                             os.path.basename(optimized_path) + '.data')
+            options.add_session_config_entry('session.optimized_model_external_initializers_min_size_in_bytes',
+                                             '1024')
+        session = onnxruntime.InferenceSession(model_path, options, providers=providers)
+        if share_weights:
+            # 模型文件按文件名引用外部权重，先让权重就位
+            os.replace(tmp_path + '.data', optimized_path + '.data')
+        os.replace(tmp_path, optimized_path)
+        if not share_weights:
+            return session
+        del session
+        return load_optimized_session(optimized_path, ort_config)
+    except Exception as e:
+        print(f"优化模型缓存写入失败: {e}")
+        return onnxruntime.InferenceSession(
+            model_path, build_session_options(ort_config), providers=providers)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def softmax(logits: np.ndarray, inplace: bool = False) -> np.ndarray:
+    """inplace为True时直接在logits上计算，不再分配中间数组"""
+    probs = logits if inplace else logits.copy()
+    probs -= np.max(probs, axis=-1, keepdims=True)
+    np.exp(probs, out=probs)
+    probs /= np.sum(probs, axis=-1, keepdims=True)
+    return probs
+
+
+class PlantEngine:
+    """
+    植物识别推理引擎
+
+    与plantid.PlantIdentifier使用相同的模型文件与输出格式，
+    额外支持将多张图片堆叠为[N,3,224,224]一次推理。
+    """
+
+    def __init__(self, model_path: Optional[str] = None, label_map_path: Optional[str] = None,
+                 ort_config: Optional[dict] = None):
+        model_path = resolve_path(model_path) if model_path else get_model_path()
+
+        self.sess = create_session(model_path, ort_config if ort_config is not None else get_ort_config())
+        model_input = self.sess.get_inputs()[0]
+        self.input_name = model_input.name
+        self.output_names = [item.name for item in self.sess.get_outputs()]
+        # 导出时固定了batch维度的模型只能逐张推理
+        self.supports_batch = not isinstance(model_input.shape[0], int) or model_input.shape[0] != 1
+
+        self.labels = load_labels(label_map_path)
+        self.num_classes = len(self.labels)
+
+        self.resize_short = get_config('image_processing', 'resize_short', 224)
+        self.crop_size = get_config('image_processing', 'crop_size', 224)
+        self.preprocessor = ImagePreprocessor(
+            self.resize_short, self.crop_size,
+            get_config('image_processing', 'normalize_mean', [0.485, 0.456, 0.406]),
+            get_config('image_processing', 'normalize_std', [0.229, 0.224, 0.225]))
+
+    def preprocess(self, image: np.ndarray, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """BGR图像 -> 归一化后的[3,crop,crop]张量，写入out（默认新建），无法处理时返回None"""
+        return self.preprocessor.preprocess(image, out)
+
+    def input_buffer(self, batch_size: int = 1) -> np.ndarray:
+        """当前线程复用的[batch_size,3,crop,crop]模型输入，内容在本线程下一次调用前有效"""
+        return self.preprocessor.buffer(batch_size)
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        """[N,3,H,W]张量 -> [N,num_classes]概率"""
+        batch = batch.astype(np.float32, copy=False)
+        if self.supports_batch or len(batch) == 1:
+            logits = self.sess.run(self.output_names[:1], {self.input_name: batch})[0]
+        else:
+            logits = np.concatenate([
+                self.sess.run(self.output_names[:1], {self.input_name: batch[i: i + 1]})[0]
+                for i in range(len(batch))
+            ])
+        # 模型输出为新分配的数组，可就地计算
+        return softmax(logits, inplace=True)
+
+    def infer(self, tensor: np.ndarray) -> np.ndarray:
+        """单个预处理后的张量 -> 概率向量，与MicroBatcher.infer接口相同"""
+        return self.forward(tensor[np.newaxis])[0]
+
+    def postprocess(self, probs: np.ndarray, topk: int = 5) -> dict:
+        """单张图片的概率向量 -> 与PlantIdentifier.identify相同格式的结果"""
+        if topk < 1:
+            raise ValueError(f'topk须为正整数: {topk}')
+        topk = min(topk, probs.shape[-1])
+        indices = top_k_indices(probs, topk)
+        return {'results': self.labels.results(probs, indices), 'status': 0, 'message': 'OK'}
+
+    @staticmethod
+    def error_outputs(message: str = 'Image decode error!') -> dict:
+        return {'results': [], 'status': -1, 'message': message}
+
+    def warmup(self):
+        """用空白图片推理一次，让首个请求不承担会话初始化的开销"""
+        image = np.zeros((self.crop_size, self.crop_size, 3), dtype=np.uint8)
+        self.forward(self.preprocess(image)[np.newaxis])
+
+    def identify(self, image: np.ndarray, topk: int = 5) -> dict:
+        batch = self.input_buffer(1)
+        if self.preprocess(image, out=batch[0]) is None:
+            return self.error_outputs()
+        probs = self.forward(batch)
+        return self.postprocess(probs[0], topk)
+
+    def identify_batch(self, images: List[np.ndarray], topk: int = 5) -> List[dict]:
+        """多张图片一次推理，返回与输入顺序一致的结果列表"""
+        # 有效的图片依次写入输入缓冲区，无需再堆叠
+        batch = self.input_buffer(len(images))
+        valid = []
+        for k, image in enumerate(images):
+            if self.preprocess(image, out=batch[len(valid)]) is not None:
+                valid.append(k)
+        outputs = [self.error_outputs() for _ in images]
+        if valid:
+            probs = self.forward(batch[:len(valid)])
+            for k, one_probs in zip(valid, probs):
+                outputs[k] = self.postprocess(one_probs, topk)
+        return outputs
+
+
+def create_plant_identifier(**kwargs) -> PlantEngine:
+    """创建植物识别器，各服务入口统一通过此函数构建以应用config.yaml中的推理配置"""
+    return PlantEngine(**kwargs)
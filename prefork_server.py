@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多进程部署api_service
+
+主进程读取配置、加载标签表并导入api_service后再fork出多个工作进程，
+这些只读数据以写时复制的方式在各工作进程间共享。onnxruntime的推理会话不能跨fork使用，
+因此由各工作进程自行创建：开启share_weights后模型权重以mmap方式从优化模型缓存的.data文件加载，
+所有工作进程共享页缓存中的同一份权重，每个进程只多出会话自身的少量内存。
+主进程只负责监听端口、重启异常退出的工作进程，以及收到SIGTERM/SIGINT时让工作进程处理完当前请求后退出。
+用法: python prefork_server.py --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+
+from app_config import get_config
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='多进程部署植物识别API服务')
+    parser.add_argument('--workers', type=int, default=get_config('prefork', 'workers', 0),
+                        help='工作进程数，0为CPU核数')
+    parser.add_argument('--host', default=get_config('prefork', 'host', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=get_config('prefork', 'port', 8000))
+    parser.add_argument('--no-share-weights', action='store_true',
+                        help='各工作进程分别加载完整的模型权重，用于对比内存占用')
+    return parser.parse_args()
+
+
+def setup_environment(workers: int, share_weights: bool) -> bool:
+    """须在导入onnxruntime与prometheus_client之前调用，返回指标目录是否为临时创建"""
+    os.environ['ORT_SHARE_WEIGHTS'] = '1' if share_weights else '0'
+    # 工作进程之间已经并行，各自的推理线程数按核数平分，避免线程数超过核数
+    os.environ.setdefault('ORT_INTRA_OP_NUM_THREADS', str(max(1, (os.cpu_count() or 1) // workers)))
+    # 各工作进程的指标写入同一目录，/metrics导出时汇总
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir)
+        return False
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='plantid_metrics_')
+    return True
+
+
+def build_model_cache() -> bool:
+    """
+    在子进程中创建一次推理会话，生成优化模型缓存
+
+    主进程自己不创建会话（fork之后不可用），工作进程启动时直接加载已生成的缓存，
+    也避免多个工作进程同时写同一个缓存文件。
+    """
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            from plant_engine import create_plant_identifier
+            create_plant_identifier()
+            code = 0
+        except Exception as e:
+            print(f"优化模型缓存生成失败: {e}")
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+
+
+def run_worker(sock: socket.socket):
+    """工作进程：重置信号处理后在继承的监听socket上运行uvicorn"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    import uvicorn
+    import api_service
+
+    api_service.app.start_time = time.time()
+    config = uvicorn.Config(api_service.app, log_level='info',
+                            timeout_graceful_shutdown=get_config('prefork', 'graceful_timeout', 30))
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    """fork并看护工作进程"""
+
+    def __init__(self, sock: socket.socket, workers: int):
+        self.sock = sock
+        self.workers = workers
+        self.children = {}
+        self.stopping = False
+        self.restart_delay = get_config('prefork', 'restart_delay', 1)
+        self.graceful_timeout = get_config('prefork', 'graceful_timeout', 30)
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.sock)
+            except Exception as e:
+                print(f"工作进程异常退出: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = time.time()
+        print(f"工作进程已启动: pid={pid}")
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reap(self, block: bool) -> list:
+        """回收已退出的工作进程，返回其pid"""
+        exited = []
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                break
+            if pid == 0:
+                break
+            if self.children.pop(pid, None) is not None:
+                from metrics import mark_process_dead
+                mark_process_dead(pid)
+                exited.append((pid, status))
+            if block:
+                break
+        return exited
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+
+        while not self.stopping:
+            for pid, status in self.reap(block=False):
+                if self.stopping:
+                    break
+                print(f"工作进程 {pid} 退出（状态 {status}），{self.restart_delay}秒后重启")
+                time.sleep(self.restart_delay)
+                self.spawn()
+            time.sleep(0.5)
+
+        deadline = time.time() + self.graceful_timeout
+        while self.children and time.time() < deadline:
+            self.reap(block=False)
+            time.sleep(0.1)
+        for pid in list(self.children):
+            print(f"工作进程 {pid} 未在{self.graceful_timeout}秒内退出，强制结束")
+            os.kill(pid, signal.SIGKILL)
+        while self.children:
+            self.reap(block=True)
+        print("所有工作进程已退出")
+
+
+def main():
+    args = parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    temporary_metrics_dir = setup_environment(workers, share_weights=not args.no_share_weights)
+
+    if not build_model_cache():
+        print("警告：优化模型缓存生成失败，工作进程将各自加载模型")
+
+    # fork前加载的只读数据由各工作进程共享
+    from plant_engine import load_labels
+    try:
+        load_labels()
+    except OSError as e:
+        print(f"标签文件读取失败: {e}")
+    import api_service  # noqa: F401
+    # 之后的垃圾回收不再触碰这些对象，避免引用计数以外的写入破坏共享页
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    print(f"植物识别API服务启动中: {workers}个工作进程，共享模型权重: {not args.no_share_weights}")
+    print(f"访问地址: http://{args.host}:{args.port}")
+    Supervisor(sock, workers).run()
+    if temporary_metrics_dir:
+        shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+from typing import Optional, Sequence
+
+import cv2
+import numpy as np
+
+
+class ImagePreprocessor:
+    """
+    BGR图像 -> 归一化后的[3,crop,crop]张量
+
+    缩放、裁剪之后，BGR转RGB、转float32、减均值除标准差与HWC转CHW合并为一次乘加：
+    (x / 255 - mean) / std 展开为 x * scale + bias，按反转后的通道顺序直接写入CHW的输出数组，
+    不再产生中间数组。输出可以是调用方提供的数组（如当前线程复用的模型输入缓冲区）。
+    """
+
+    def __init__(self, resize_short: int = 224, crop_size: int = 224,
+                 mean: Sequence[float] = (0.485, 0.456, 0.406), std: Sequence[float] = (0.229, 0.224, 0.225)):
+        self.resize_short = resize_short
+        self.crop_size = crop_size
+        mean = np.asarray(mean, dtype=np.float64)
+        std = np.asarray(std, dtype=np.float64)
+        self.scale = (1.0 / (255.0 * std)).astype(np.float32).reshape(3, 1, 1)
+        self.bias = (-mean / std).astype(np.float32).reshape(3, 1, 1)
+        self._local = threading.local()
+
+    def buffer(self, batch_size: int = 1) -> np.ndarray:
+        """
+        当前线程复用的[batch_size,3,crop,crop]缓冲区
+
+        容量不足时才重新分配，内容在本线程下一次调用前有效，
+        需要保留张量（如凑批后再推理）时应使用preprocess的默认输出。
+        """
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or len(buffer) < batch_size:
+            buffer = np.empty((batch_size, 3, self.crop_size, self.crop_size), dtype=np.float32)
+            self._local.buffer = buffer
+        return buffer[:batch_size]
+
+    def resize_crop(self, image: np.ndarray) -> Optional[np.ndarray]:
+        """
+        缩放短边并中心裁剪，返回uint8的HWC（灰度图为HW）视图，无法处理时返回None
+
+        与plantid使用的khandy.resize_image_short相同，缩小时用INTER_AREA，放大时用INTER_LINEAR。
+        """
+        if image is None or image.dtype != np.uint8:
+            return None
+        if image.ndim != 2 and (image.ndim != 3 or image.shape[2] not in (3, 4)):
+            return None
+
+        height, width = image.shape[:2]
+        short = min(height, width)
+        new_width = max(self.crop_size, int(round(width * self.resize_short / short)))
+        new_height = max(self.crop_size, int(round(height * self.resize_short / short)))
+        if (new_width, new_height) != (width, height):
+            interpolation = cv2.INTER_AREA if new_width < width and new_height < height else cv2.INTER_LINEAR
+            image = cv2.resize(image, (new_width, new_height), interpolation=interpolation)
+
+        top = (new_height - self.crop_size) // 2
+        left = (new_width - self.crop_size) // 2
+        return image[top: top + self.crop_size, left: left + self.crop_size]
+
+    def preprocess(self, image: np.ndarray, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """写入out（默认新建）并返回，无法处理时返回None且不修改out"""
+        image = self.resize_crop(image)
+        if image is None:
+            return None
+        if out is None:
+            out = np.empty((3, self.crop_size, self.crop_size), dtype=np.float32)
+
+        if image.ndim == 2:
+            # 灰度图三个通道相同，广播即可
+            channels = image[np.newaxis]
+        else:
+            # BGRA只取前三个通道，反转为RGB并转为CHW，均为视图
+            channels = image.transpose(2, 0, 1)[2::-1]
+        np.multiply(channels, self.scale, out=out)
+        np.add(out, self.bias, out=out)
+        return out
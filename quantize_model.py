@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+生成INT8量化模型
+
+dynamic: 只量化权重，激活值在推理时动态量化，不需要校准数据；
+static:  用校准图片统计激活值范围，权重与激活值都量化为INT8（QDQ格式），
+         卷积网络通常比dynamic更快，需要提供--calib-dir。
+
+用法:
+    python quantize_model.py --mode dynamic
+    python quantize_model.py --mode static --calib-dir images --num-calib 200
+生成后在config.yaml中设置plant_identification.model_variant: "int8"，
+再用benchmarks/compare_model_variants.py对比精度与延迟。
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat,
+                                      QuantType, quantize_dynamic, quantize_static)
+
+from image_utils import decode_for_inference, list_images
+from plant_engine import PlantEngine, get_model_path
+
+
+class ImageCalibrationReader(CalibrationDataReader):
+    """按服务中相同的解码与预处理流程逐张提供校准数据"""
+
+    def __init__(self, engine: PlantEngine, filenames: list):
+        self.engine = engine
+        self.filenames = iter(filenames)
+
+    def get_next(self):
+        for filename in self.filenames:
+            with open(filename, 'rb') as f:
+                tensor = self.engine.preprocess(decode_for_inference(f.read()))
+            if tensor is not None:
+                return {self.engine.input_name: tensor[np.newaxis]}
+        return None
+
+
+def preprocess_model(model_path: str, output_path: str) -> str:
+    """量化前做形状推断与图优化，失败时直接使用原模型"""
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        quant_pre_process(model_path, output_path)
+        return output_path
+    except Exception as e:
+        print(f"量化预处理失败，使用原模型: {e}")
+        return model_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成INT8量化模型')
+    parser.add_argument('--mode', choices=['dynamic', 'static'], default='dynamic', help='量化方式')
+    parser.add_argument('--input', default=None, help='fp32模型，默认取config.yaml的model_path')
+    parser.add_argument('--output', default=None, help='输出路径，默认取config.yaml的int8_model_path')
+    parser.add_argument('--calib-dir', default=None, help='静态量化的校准图片目录')
+    parser.add_argument('--num-calib', type=int, default=200, help='最多使用的校准图片数')
+    parser.add_argument('--per-channel', action='store_true', help='按通道量化权重')
+    args = parser.parse_args()
+
+    input_path = os.path.abspath(args.input) if args.input else get_model_path('fp32')
+    output_path = os.path.abspath(args.output) if args.output else get_model_path('int8')
+    if os.path.abspath(input_path) == os.path.abspath(output_path):
+        print("输出路径不能与输入模型相同")
+        sys.exit(1)
+
+    filenames = []
+    if args.mode == 'static':
+        if not args.calib_dir:
+            print("静态量化需要通过--calib-dir指定校准图片目录")
+            sys.exit(1)
+        filenames = list_images(args.calib_dir, args.num_calib)
+        if not filenames:
+            print(f"校准目录中没有图片: {args.calib_dir}")
+            sys.exit(1)
+        print(f"使用{len(filenames)}张图片校准")
+
+    start_time = time.time()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = preprocess_model(input_path, os.path.join(tmp_dir, 'preprocessed.onnx'))
+        if args.mode == 'dynamic':
+            quantize_dynamic(model_path, output_path, per_channel=args.per_channel,
+                             weight_type=QuantType.QInt8)
+        else:
+            engine = PlantEngine(model_path=input_path, ort_config={})
+            quantize_static(model_path, output_path, ImageCalibrationReader(engine, filenames),
+                            quant_format=QuantFormat.QDQ, per_channel=args.per_channel,
+                            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                            calibrate_method=CalibrationMethod.MinMax)
+
+    input_size = os.path.getsize(input_path) / 1024 / 1024
+    output_size = os.path.getsize(output_path) / 1024 / 1024
+    print(f"量化完成({args.mode})，耗时{time.time() - start_time:.1f}s")
+    print(f"{input_path}: {input_size:.1f}MB")
+    print(f"{output_path}: {output_size:.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
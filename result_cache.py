@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, List, Tuple
+
+from app_config import get_config
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# 精简的识别结果: ((中文名, 拉丁名, 概率), ...)
+CompactResults = Tuple[Tuple[str, str, float], ...]
+# 缓存记录: (精简的识别结果, 识别耗时（秒）, 识别时间)，所有服务读写同一种格式，可以共享Redis中的结果
+CacheEntry = Tuple[CompactResults, float, str]
+# 缓存记录格式变化时递增，旧格式的记录不会被读到
+CACHE_VERSION = 2
+
+# 每条缓存记录的固定开销估计（字节）
+ENTRY_OVERHEAD = 256
+ROW_OVERHEAD = 64
+
+
+def compact_results(results: Iterable) -> CompactResults:
+    """将识别结果压缩为元组，支持dict或带属性的对象"""
+    rows = []
+    for result in results:
+        if isinstance(result, dict):
+            rows.append((result['chinese_name'], result['latin_name'], float(result['probability'])))
+        else:
+            rows.append((result.chinese_name, result.latin_name, float(result.probability)))
+    return tuple(rows)
+
+
+def make_entry(results: Iterable, process_time: float) -> CacheEntry:
+    """由识别结果生成缓存记录"""
+    return compact_results(results), round(process_time, 3), datetime.now().isoformat()
+
+
+def expand_results(entry: CacheEntry) -> list:
+    """由缓存记录还原为PlantIdentifier.identify的results格式"""
+    return [OrderedDict([('chinese_name', chinese_name), ('latin_name', latin_name),
+                         ('probability', probability)])
+            for chinese_name, latin_name, probability in entry[0]]
+
+
+def make_cache_key(image_hash: str, topk: int) -> str:
+    """缓存键由记录格式版本、图片摘要和topk组成，不同topk的结果互不覆盖"""
+    return f'v{CACHE_VERSION}:{image_hash}:{topk}'
+
+
+def serialize(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def deserialize(data: bytes):
+    return json.loads(data)
+
+
+def estimate_size(value) -> int:
+    """粗略估计缓存值占用的字节数"""
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (tuple, list)):
+        return ROW_OVERHEAD + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return ROW_OVERHEAD + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return 8
+
+
+class ResultCache:
+    """
+    识别结果缓存
+
+    基于OrderedDict实现O(1)的读写，按条目数与估计字节数做LRU淘汰，
+    过期条目在被访问或被挤到队尾时才删除，不做全表扫描。
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600):
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.ttl = float(ttl)
+        self._data = OrderedDict()  # key -> (过期时间, 字节数, 值)
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self.total_bytes -= size
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def get_many(self, keys: List[str]) -> list:
+        return [self.get(key) for key in keys]
+
+    def set(self, key: str, value):
+        if self.max_entries <= 0:
+            return
+        size = ENTRY_OVERHEAD + estimate_size(key) + estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, size, value)
+            self.total_bytes += size
+            while len(self._data) > self.max_entries or self.total_bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            'cache_size': len(self._data),
+            'cache_bytes': self.total_bytes,
+            'cache_hits': self.hits,
+            'cache_misses': self.misses,
+            'cache_evictions': self.evictions,
+            'cache_hit_ratio': round(self.hit_ratio, 4),
+        }
+
+
+class RedisResultCache:
+    """
+    Redis共享缓存
+
+    多个worker与容器共享同一份结果，服务重启后依然有效。
+    client只需提供get/set/delete/pipeline/scan_iter，测试时可替换为内存实现。
+    Redis不可用时读写按未命中处理，不影响识别。
+    """
+
+    def __init__(self, client, ttl: float = 3600, prefix: str = 'plantid:result:'):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def _on_error(self, e: Exception):
+        self.errors += 1
+        print(f"Redis缓存访问失败: {e}")
+
+    def get(self, key: str):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: List[str]) -> list:
+        """一次pipeline批量读取"""
+        if not keys:
+            return []
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key in keys:
+                pipe.get(self._key(key))
+            raw_values = pipe.execute()
+        except Exception as e:
+            self._on_error(e)
+            self.misses += len(keys)
+            return [None] * len(keys)
+        values = []
+        for raw in raw_values:
+            if raw is None:
+                self.misses += 1
+                values.append(None)
+            else:
+                self.hits += 1
+                values.append(deserialize(raw))
+        return values
+
+    def set(self, key: str, value):
+        try:
+            self.client.set(self._key(key), serialize(value), ex=self.ttl)
+        except Exception as e:
+            self._on_error(e)
+
+    def delete(self, key: str):
+        try:
+            self.client.delete(self._key(key))
+        except Exception as e:
+            self._on_error(e)
+
+    def clear(self):
+        try:
+            keys = list(self.client.scan_iter(match=self.prefix + '*'))
+            if keys:
+                self.client.delete(*keys)
+        except Exception as e:
+            self._on_error(e)
+
+    def stats(self) -> dict:
+        return {
+            'redis_hits': self.hits,
+            'redis_misses': self.misses,
+            'redis_errors': self.errors,
+        }
+
+
+class TieredResultCache:
+    """内存LRU在前、Redis在后的两级缓存，Redis命中的结果回填到内存"""
+
+    def __init__(self, memory: ResultCache, remote: RedisResultCache):
+        self.memory = memory
+        self.remote = remote
+
+    def __len__(self):
+        return len(self.memory)
+
+    def get(self, key: str):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: List[str]) -> list:
+        values = self.memory.get_many(keys)
+        missing = [k for k, value in enumerate(values) if value is None]
+        if missing:
+            remote_values = self.remote.get_many([keys[k] for k in missing])
+            for k, value in zip(missing, remote_values):
+                if value is not None:
+                    self.memory.set(keys[k], value)
+                    values[k] = value
+        return values
+
+    def set(self, key: str, value):
+        self.memory.set(key, value)
+        self.remote.set(key, value)
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        self.remote.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        self.remote.clear()
+
+    def stats(self) -> dict:
+        return {**self.memory.stats(), **self.remote.stats()}
+
+
+def create_result_cache():
+    """
+    根据config.yaml的cache配置创建缓存，未启用时返回一个不存储的缓存
+
+    环境变量ENABLE_CACHE与REDIS_URL优先于配置文件；
+    配置了Redis地址且安装了redis时使用两级缓存。
+    """
+    enabled = os.environ.get('ENABLE_CACHE', str(get_config('cache', 'enabled', True)))
+    enabled = enabled.lower() in ('1', 'true', 'yes')
+    ttl = get_config('cache', 'ttl', 3600)
+    memory = ResultCache(
+        max_entries=get_config('cache', 'max_size', 1000) if enabled else 0,
+        max_bytes=get_config('cache', 'max_bytes', 64 * 1024 * 1024),
+        ttl=ttl
+    )
+
+    redis_url = os.environ.get('REDIS_URL') or get_config('cache', 'redis_url')
+    if not enabled or not redis_url:
+        return memory
+    if not REDIS_AVAILABLE:
+        print("未安装redis，仅使用内存缓存")
+        return memory
+    timeout = get_config('cache', 'redis_timeout', 0.5)
+    client = redis.Redis.from_url(redis_url, socket_timeout=timeout, socket_connect_timeout=timeout)
+    remote = RedisResultCache(client, ttl=ttl,
+                              prefix=get_config('cache', 'redis_prefix', 'plantid:result:'))
+    print(f"已启用Redis共享缓存: {redis_url}")
+    return TieredResultCache(memory, remote)
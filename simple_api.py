@@ -8,26 +8,16 @@ import json
 from datetime import datetime
 from typing import List, Optional
 
-import cv2
-import numpy as np
 from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, status, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
 import uvicorn
 
-# 导入植物识别模块
-try:
-    import plantid
-    PLANTID_AVAILABLE = True
-except ImportError as e:
-    print(f"植物识别模块导入失败: {e}")
-    PLANTID_AVAILABLE = False
-
-if not PLANTID_AVAILABLE:
-    print("植物识别模块不可用，无法启动API服务")
-    exit(1)
+from app_config import get_config
+from model_loader import FAILED, ModelLoader, ModelNotReadyError
+from result_cache import create_result_cache, make_cache_key, make_entry
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -58,8 +48,7 @@ api_keys = {
 }
 
 # 缓存
-cache = {}
-cache_ttl = 3600  # 1小时
+result_cache = create_result_cache()
 
 # 数据模型
 class IdentificationResult(BaseModel):
@@ -82,6 +71,9 @@ class HealthResponse(BaseModel):
     timestamp: str
     uptime: float
     model_loaded: bool
+    live: bool = True
+    ready: bool = False
+    model_state: Optional[str] = None
 
 def get_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """验证API密钥"""
@@ -94,42 +86,47 @@ def get_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
         )
     return api_keys[token]
 
-def init_plant_identifier():
-    """初始化植物识别器"""
+def load_plant_identifier():
+    """创建植物识别器，由model_loader调用；植物识别模块导入失败时记为加载失败"""
     global plant_identifier
-    if plant_identifier is None:
-        try:
-            plant_identifier = plantid.PlantIdentifier()
-            print("植物识别器初始化成功")
-            return True
-        except Exception as e:
-            print(f"植物识别器初始化失败: {e}")
-            return False
-    return True
+    from plant_engine import create_plant_identifier
+    plant_identifier = create_plant_identifier()
+    print("植物识别器初始化成功")
+    return plant_identifier
+
+# 模型加载器，依赖numpy、cv2、onnxruntime的模块在加载线程中才导入
+model_loader = ModelLoader(
+    load_plant_identifier,
+    imports=('numpy', 'cv2', 'onnxruntime', 'image_utils', 'plant_engine'),
+    retry_after=get_config('startup', 'retry_after', 5),
+    reload_initial_delay=get_config('health', 'reload_initial_delay', 1),
+    reload_max_delay=get_config('health', 'reload_max_delay', 60)
+)
+
+def init_plant_identifier():
+    """初始化植物识别器，正在后台加载时等待加载完成"""
+    return model_loader.load()
 
 def get_image_hash(image_data: bytes) -> str:
     """计算图片哈希值用于缓存"""
     return hashlib.md5(image_data).hexdigest()
 
-def check_cache(image_hash: str) -> Optional[dict]:
-    """检查缓存"""
-    if image_hash in cache:
-        cached_data = cache[image_hash]
-        if time.time() - cached_data['timestamp'] < cache_ttl:
-            return cached_data['data']
-    return None
-
-def set_cache(image_hash: str, data: dict):
-    """设置缓存"""
-    cache[image_hash] = {
-        'data': data,
-        'timestamp': time.time()
+def build_response(entry: tuple, image_hash: str, from_cache: bool) -> dict:
+    """由精简的缓存记录构造响应数据"""
+    results, process_time, timestamp = entry
+    return {
+        'status': 'success',
+        'message': '识别成功',
+        'results': [
+            IdentificationResult(chinese_name=chinese_name, latin_name=latin_name,
+                                 probability=probability, rank=i + 1)
+            for i, (chinese_name, latin_name, probability) in enumerate(results)
+        ],
+        'process_time': process_time,
+        'timestamp': timestamp,
+        'image_hash': image_hash,
+        'from_cache': from_cache
     }
-    # 清理过期缓存
-    current_time = time.time()
-    expired_keys = [k for k, v in cache.items() if current_time - v['timestamp'] > cache_ttl]
-    for key in expired_keys:
-        del cache[key]
 
 def validate_image_file(file: UploadFile) -> bool:
     """验证图片文件"""
@@ -139,67 +136,58 @@ def validate_image_file(file: UploadFile) -> bool:
     file_extension = os.path.splitext(file.filename)[1].lower()
     return file_extension in allowed_extensions
 
+# 单张图片最多返回的结果数
+MAX_TOPK = 20
+
+def validate_topk(topk: int):
+    """topk须在1到MAX_TOPK之间，否则返回400，避免返回并缓存全部类别"""
+    if not 1 <= topk <= MAX_TOPK:
+        raise HTTPException(status_code=400, detail=f"topk须在1到{MAX_TOPK}之间")
+
 def process_image(file: UploadFile, topk: int = 5) -> dict:
     """处理图片识别"""
+    from image_utils import decode_for_inference, read_and_hash
     start_time = time.time()
     
-    # 读取图片
-    file_content = file.file.read()
-    nparr = np.frombuffer(file_content, np.uint8)
-    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    # 读取图片，同时计算哈希
+    file_content, image_hash = read_and_hash(file.file)
     
+    # 检查缓存，命中时无需解码
+    cached_result = result_cache.get(make_cache_key(image_hash, topk))
+    if cached_result is not None:
+        return build_response(cached_result, image_hash, from_cache=True)
+    
+    image = decode_for_inference(file_content)
     if image is None:
         raise HTTPException(status_code=400, detail="无法读取图片文件")
     
-    # 检查缓存
-    image_hash = get_image_hash(file_content)
-    cached_result = check_cache(image_hash)
-    if cached_result:
-        cached_result['from_cache'] = True
-        return cached_result
-    
-    # 进行识别
-    if not init_plant_identifier():
+    # 进行识别，模型加载中返回503
+    try:
+        identifier = model_loader.get()
+    except ModelNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    if identifier is None:
         raise HTTPException(status_code=500, detail="植物识别器初始化失败")
     
-    outputs = plant_identifier.identify(image, topk=topk)
+    outputs = identifier.identify(image, topk=topk)
     process_time = time.time() - start_time
     
     if outputs['status'] != 0:
         raise HTTPException(status_code=500, detail=outputs['message'])
     
-    # 格式化结果
-    results = []
-    for i, result in enumerate(outputs['results']):
-        results.append(IdentificationResult(
-            chinese_name=result['chinese_name'],
-            latin_name=result['latin_name'],
-            probability=result['probability'],
-            rank=i + 1
-        ))
-    
-    response_data = {
-        'status': 'success',
-        'message': '识别成功',
-        'results': results,
-        'process_time': round(process_time, 3),
-        'timestamp': datetime.now().isoformat(),
-        'image_hash': image_hash,
-        'from_cache': False
-    }
-    
-    # 设置缓存
-    set_cache(image_hash, response_data)
+    # 缓存精简结果
+    entry = make_entry(outputs['results'], process_time)
+    result_cache.set(make_cache_key(image_hash, topk), entry)
     
-    return response_data
+    return build_response(entry, image_hash, from_cache=False)
 
 @app.on_event("startup")
 async def startup_event():
     """应用启动事件"""
     print("正在启动植物识别API服务...")
-    if init_plant_identifier():
-        print("植物识别器初始化成功")
-    else:
+    if get_config('startup', 'background_load', True):
+        model_loader.start()
+    elif not init_plant_identifier():
         print("警告：植物识别器初始化失败")
 
 @app.get("/", response_model=dict)
@@ -227,6 +215,7 @@ async def identify_plant(
     """
     if not validate_image_file(file):
         raise HTTPException(status_code=400, detail="不支持的文件格式")
+    validate_topk(topk)
     
     try:
         result = process_image(file, topk)
@@ -237,16 +226,27 @@ async def identify_plant(
         raise HTTPException(status_code=500, detail=f"处理失败: {str(e)}")
 
 @app.get("/health", response_model=HealthResponse)
-async def health_check():
-    """健康检查"""
+async def health_check(response: Response):
+    """健康检查，模型就绪时返回200，加载中返回503、加载失败返回500，容器健康检查据此判断是否就绪"""
     uptime = time.time() - getattr(app, 'start_time', time.time())
+    model_state = model_loader.state
+    if model_loader.ready:
+        health_status, message = 'healthy', '服务正常运行'
+    elif model_state == FAILED:
+        health_status, message = 'unhealthy', f'植物识别器初始化失败: {model_loader.error}'
+        response.status_code = 500
+    else:
+        health_status, message = 'starting', '植物识别器加载中'
+        response.status_code = 503
     
     return HealthResponse(
-        status='healthy' if init_plant_identifier() else 'unhealthy',
-        message='服务正常运行' if init_plant_identifier() else '植物识别器未初始化',
+        status=health_status,
+        message=message,
         timestamp=datetime.now().isoformat(),
         uptime=round(uptime, 2),
-        model_loaded=plant_identifier is not None
+        model_loaded=plant_identifier is not None,
+        ready=model_loader.ready,
+        model_state=model_state
     )
 
 @app.get("/test")
@@ -267,7 +267,8 @@ async def http_exception_handler(request, exc):
             "error": exc.detail,
             "timestamp": datetime.now().isoformat(),
             "path": str(request.url)
-        }
+        },
+        headers=getattr(exc, 'headers', None)
     )
 
 @app.exception_handler(Exception)
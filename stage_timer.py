@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+from contextlib import contextmanager
+
+
+class StageTimer(dict):
+    """
+    单个请求的分阶段计时，阶段名 -> 累计秒数
+
+    本身是dict，可直接作为timings传给各处理函数，也直接交给ServiceMetrics.observe_stages，
+    响应中的timings、Server-Timing头与指标因此使用同一份数据。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.started = time.perf_counter()
+        self.cache_hit = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start_time)
+
+    def add(self, name: str, seconds: float):
+        self[name] = self.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        """从创建到现在的总耗时"""
+        return time.perf_counter() - self.started
+
+    def summary(self) -> dict:
+        """响应中返回的timings，单位为秒"""
+        summary = {stage: round(seconds, 4) for stage, seconds in self.items()}
+        summary['total'] = round(self.elapsed(), 4)
+        if self.cache_hit is not None:
+            summary['cache_hit'] = self.cache_hit
+        return summary
+
+    def server_timing(self) -> str:
+        """Server-Timing响应头，单位为毫秒"""
+        entries = [f'{stage};dur={seconds * 1000:.2f}' for stage, seconds in self.items()]
+        if self.cache_hit is not None:
+            entries.append('cache;desc={}'.format('hit' if self.cache_hit else 'miss'))
+        entries.append(f'total;dur={self.elapsed() * 1000:.2f}')
+        return ', '.join(entries)
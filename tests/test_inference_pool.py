@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+
+import pytest
+
+from inference_pool import InferencePool, InferencePoolFullError
+
+
+async def wait_until(condition, timeout: float = 2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_cancelled_caller_keeps_slot_until_task_finishes():
+    async def scenario():
+        pool = InferencePool(max_workers=1, max_queue_size=0)
+        started, release = threading.Event(), threading.Event()
+
+        def blocking():
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        task = asyncio.ensure_future(pool.run(blocking))
+        await wait_until(started.is_set)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # 线程仍在执行，名额不能归还
+        assert pool.pending == 1
+        with pytest.raises(InferencePoolFullError):
+            await pool.run(lambda: None)
+
+        release.set()
+        await wait_until(lambda: pool.pending == 0)
+        assert await pool.run(lambda: 'ok') == 'ok'
+        pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_queued_task_releases_slot():
+    async def scenario():
+        pool = InferencePool(max_workers=1, max_queue_size=1)
+        release = threading.Event()
+        running = asyncio.ensure_future(pool.run(release.wait, 5))
+        queued = asyncio.ensure_future(pool.run(lambda: 'never'))
+        await wait_until(lambda: pool.pending == 2)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        # 还在排队的任务被取消后不会执行，名额立即归还
+        await wait_until(lambda: pool.pending == 1)
+        release.set()
+        assert await running is True
+        assert pool.pending == 0
+        pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_exception_releases_slot():
+    async def scenario():
+        pool = InferencePool(max_workers=1, max_queue_size=0)
+        with pytest.raises(ZeroDivisionError):
+            await pool.run(lambda: 1 / 0)
+        await wait_until(lambda: pool.pending == 0)
+        pool.shutdown()
+
+    asyncio.run(scenario())
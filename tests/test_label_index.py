@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from label_index import FIELDS, is_stale, load_label_index
+from label_table import LabelTable
+
+
+def write_labels(path, num_classes):
+    path.write_text(''.join(f'{k},科{k % 7}_属{k % 13}_种{k},Latin name {k}\n' for k in range(num_classes)),
+                    encoding='utf-8')
+
+
+def test_index_matches_label_table(tmp_path):
+    label_path = tmp_path / 'labels.txt'
+    write_labels(label_path, 50)
+    index = load_label_index(str(tmp_path / 'labels.idx'), str(label_path))
+    table = LabelTable.load(str(label_path))
+    assert len(index) == len(table) == 50
+
+    probs = np.random.default_rng(0).random(50).astype(np.float32)
+    indices = np.array([3, 41, 0, 17])
+    assert index.results(probs, indices) == table.results(probs, indices)
+    assert index.lookup(17) == dict(zip(FIELDS, ('科3_属4_种17', '种17', 'Latin name 17')))
+    assert index.find('种17') == index.find('Latin name 17') == index.find('科3_属4_种17') == [17]
+    assert index.find('种50') == [] and index.find('') == []
+
+
+def test_index_is_rebuilt_when_labels_change(tmp_path):
+    label_path = tmp_path / 'labels.txt'
+    index_path = str(tmp_path / 'labels.idx')
+    write_labels(label_path, 10)
+    load_label_index(index_path, str(label_path))
+    assert not is_stale(index_path, str(label_path))
+    write_labels(label_path, 12)
+    assert is_stale(index_path, str(label_path))
+    # 进程内按参数缓存已打开的索引
+    load_label_index.cache_clear()
+    assert len(load_label_index(index_path, str(label_path))) == 12
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+
+from model_loader import FAILED, IDLE, LOADING, READY, ModelLoader, ModelNotReadyError
+
+
+class Loader:
+    """前failures次加载失败，每次加载等待gate"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.gate.wait(5)
+        if self.calls <= self.failures:
+            raise RuntimeError('加载失败')
+        return 'model'
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_get_starts_background_load_without_blocking():
+    load = Loader()
+    load.gate.clear()
+    loader = ModelLoader(load)
+    assert loader.state == IDLE
+
+    start_time = time.perf_counter()
+    with pytest.raises(ModelNotReadyError):
+        loader.get()
+    with pytest.raises(ModelNotReadyError):
+        loader.get()
+    assert time.perf_counter() - start_time < 1
+    assert loader.state == LOADING
+
+    load.gate.set()
+    wait_for(lambda: loader.ready)
+    assert loader.get() == 'model'
+    assert load.calls == 1
+
+
+def test_failed_without_retry_returns_none_and_never_reloads():
+    load = Loader(failures=1)
+    loader = ModelLoader(load, reload_initial_delay=0)
+    assert not loader.load()
+    assert loader.state == FAILED
+    assert loader.next_retry is None
+    for _ in range(3):
+        assert loader.get() is None
+    assert load.calls == 1
+
+
+def test_failed_with_retry_raises_until_reloaded():
+    load = Loader(failures=1)
+    loader = ModelLoader(load, reload_initial_delay=0.2)
+    assert not loader.load()
+    # 重试时间在切换为加载失败之前记录
+    assert loader.state == FAILED and loader.next_retry is not None
+    with pytest.raises(ModelNotReadyError) as info:
+        loader.get()
+    assert info.value.retry_after >= 1
+    assert load.calls == 1
+
+    wait_for(lambda: loader.state == READY)
+    assert loader.get() == 'model'
+    assert loader.next_retry is None
+    assert load.calls == 2
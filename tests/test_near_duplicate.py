@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from near_duplicate import MultiIndexHash, NearDuplicateIndex, hamming
+
+
+def flip(value: int, *bits: int) -> int:
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+BASE = 0x0123456789ABCDEF
+
+
+def test_multi_index_hash_finds_nearest_within_threshold():
+    index = MultiIndexHash(threshold=4)
+    near, far = flip(BASE, 1, 20, 40), flip(BASE, *range(0, 60, 6))
+    index.add(near, 'near')
+    index.add(far, 'far')
+    assert index.find(BASE) == (3, near, 'near')
+    assert index.find(flip(BASE, *range(0, 64, 2))) is None
+    index.remove(near)
+    assert index.find(BASE) is None
+    assert hamming(BASE, near) == 3
+
+
+def test_lookup_counts_only_cache_hits():
+    index = NearDuplicateIndex(threshold=4)
+    index.add(BASE, 'a')
+    cache = {'a': 'result'}
+
+    assert index.lookup(flip(BASE, 3), cache.get) == ('a', 'result')
+    assert index.lookup(flip(BASE, *range(0, 64, 2)), cache.get) is None
+    stats = index.stats()
+    assert (stats['near_duplicate_matches'], stats['near_duplicate_misses']) == (1, 1)
+
+
+def test_lookup_removes_entry_whose_result_expired():
+    index = NearDuplicateIndex(threshold=4)
+    index.add(BASE, 'a')
+
+    assert index.lookup(flip(BASE, 3), {}.get) is None
+    assert len(index) == 0
+    assert index.find(BASE) is None
+    stats = index.stats()
+    assert (stats['near_duplicate_matches'], stats['near_duplicate_misses']) == (0, 1)
+
+
+def test_remove_keeps_replaced_entry():
+    index = NearDuplicateIndex(threshold=4)
+    index.add(BASE, 'a')
+    index.add(BASE, 'b')
+    index.remove(BASE, 'a')
+    assert index.find(BASE) == 'b'
+    index.remove(BASE, 'b')
+    assert len(index) == 0
+
+
+def test_max_entries_drops_oldest():
+    index = NearDuplicateIndex(threshold=0, max_entries=2)
+    for k, key in enumerate((1, 2, 4)):
+        index.add(key, str(k))
+    assert len(index) == 2
+    assert index.find(1) is None
+    assert index.find(4) == '2'
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from types import SimpleNamespace
+
+import khandy
+import numpy as np
+import pytest
+
+import plant_engine
+from plant_engine import PlantEngine
+
+MEAN = np.array([0.485, 0.456, 0.406])
+STD = np.array([0.229, 0.224, 0.225])
+
+
+class FakeSession:
+    """只提供PlantEngine构造时读取的输入输出信息，预处理不需要模型"""
+
+    def get_inputs(self):
+        return [SimpleNamespace(name='input', shape=['batch', 3, 224, 224])]
+
+    def get_outputs(self):
+        return [SimpleNamespace(name='output')]
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(plant_engine, 'create_session', lambda model_path, ort_config: FakeSession())
+    monkeypatch.setattr(plant_engine, 'load_labels', lambda label_map_path: [])
+    return PlantEngine(model_path='model.onnx', ort_config={})
+
+
+def reference_preprocess(image: np.ndarray) -> np.ndarray:
+    """plantid.PlantIdentifier的预处理：khandy缩放短边、中心裁剪，BGR转RGB后归一化"""
+    image = khandy.resize_image_short(image, 224)
+    image = khandy.center_crop_image(image, 224, 224)
+    image = image[..., ::-1].astype(np.float32) / 255.0
+    image = (image - MEAN) / STD
+    return np.transpose(image, (2, 0, 1)).astype(np.float32)
+
+
+@pytest.mark.parametrize('shape', [(480, 640, 3), (1000, 300, 3), (225, 500, 3), (150, 200, 3)])
+def test_preprocess_matches_plantid(engine, shape):
+    image = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+    np.testing.assert_allclose(engine.preprocess(image), reference_preprocess(image), atol=1e-4)
+
+
+def test_preprocess_writes_into_buffer(engine):
+    image = np.random.default_rng(1).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    out = engine.input_buffer(2)[1]
+    assert engine.preprocess(image, out) is out
+    np.testing.assert_allclose(out, reference_preprocess(image), atol=1e-4)
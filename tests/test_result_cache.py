@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import fnmatch
+
+import pytest
+
+import result_cache
+from result_cache import (RedisResultCache, ResultCache, TieredResultCache, deserialize, expand_results,
+                          make_cache_key, make_entry, serialize)
+
+RESULTS = [
+    {'chinese_name': '蔷薇科_蔷薇属_月季花', 'latin_name': 'Rosa chinensis', 'probability': 0.9},
+    {'chinese_name': '蔷薇科_蔷薇属_玫瑰', 'latin_name': 'Rosa rugosa', 'probability': 0.05},
+]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.keys = []
+
+    def get(self, key):
+        self.keys.append(key)
+
+    def execute(self):
+        return [self.client.get(key) for key in self.keys]
+
+
+class FakeRedis:
+    """内存中的Redis替身，只实现RedisResultCache用到的命令"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}  # key -> (值, 过期时间)
+        self.pipelines = 0
+
+    def get(self, key):
+        value, expire_at = self.data.get(key, (None, None))
+        if expire_at is not None and expire_at <= self.clock():
+            del self.data[key]
+            return None
+        return value
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value, self.clock() + ex if ex else None)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        self.pipelines += 1
+        return FakePipeline(self)
+
+    def scan_iter(self, match='*'):
+        return [key for key in list(self.data) if fnmatch.fnmatchcase(key, match)]
+
+
+class DownRedis:
+    """连接失败的Redis"""
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError('Redis不可用')
+        return fail
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, 'monotonic', clock)
+    return clock
+
+
+def make_tiered(clock, client=None, ttl=60):
+    client = FakeRedis(clock) if client is None else client
+    remote = RedisResultCache(client, ttl=ttl, prefix='test:')
+    return TieredResultCache(ResultCache(max_entries=10, ttl=ttl), remote), client
+
+
+def test_entry_round_trip_through_redis(clock):
+    entry = make_entry(RESULTS, 0.12345)
+    restored = deserialize(serialize(entry))
+    chinese_name, latin_name, probability = restored[0][0]
+    assert (chinese_name, latin_name, probability) == ('蔷薇科_蔷薇属_月季花', 'Rosa chinensis', 0.9)
+    assert restored[1] == 0.123
+    assert expand_results(restored) == RESULTS
+
+
+def test_cache_key_includes_version_and_topk():
+    assert make_cache_key('abc', 3) != make_cache_key('abc', 5)
+    assert make_cache_key('abc', 3).startswith(f'v{result_cache.CACHE_VERSION}:')
+
+
+def test_tiered_get_set(clock):
+    cache, client = make_tiered(clock)
+    key = make_cache_key('abc', 5)
+    assert cache.get(key) is None
+    entry = make_entry(RESULTS, 0.1)
+    cache.set(key, entry)
+    assert cache.get(key) == entry
+    assert 'test:' + key in client.data
+
+
+def test_redis_hit_fills_memory(clock):
+    cache, client = make_tiered(clock)
+    key = make_cache_key('abc', 5)
+    other, _ = make_tiered(clock, client)
+    other.set(key, make_entry(RESULTS, 0.1))
+
+    assert cache.memory.get(key) is None
+    entry = cache.get(key)
+    assert expand_results(entry) == RESULTS
+    assert cache.remote.hits == 1
+    # 回填后直接命中内存
+    client.data.clear()
+    assert cache.get(key) is not None
+
+
+def test_get_many_uses_one_pipeline(clock):
+    cache, client = make_tiered(clock)
+    keys = [make_cache_key(f'img{k}', 5) for k in range(4)]
+    cache.set(keys[0], make_entry(RESULTS, 0.1))
+    cache.memory.clear()
+    client.set('test:' + keys[2], serialize(make_entry(RESULTS[:1], 0.2)))
+
+    values = cache.get_many(keys)
+    assert client.pipelines == 1
+    assert [value is not None for value in values] == [True, False, True, False]
+    assert expand_results(values[2]) == RESULTS[:1]
+    assert cache.get_many([]) == []
+
+
+def test_ttl(clock):
+    cache, client = make_tiered(clock, ttl=60)
+    key = make_cache_key('abc', 5)
+    cache.set(key, make_entry(RESULTS, 0.1))
+    clock.now += 59
+    assert cache.get(key) is not None
+    clock.now += 2
+    assert cache.memory.get(key) is None
+    assert client.get('test:' + key) is None
+    assert cache.get(key) is None
+
+
+def test_redis_down_falls_back_to_memory(clock, capsys):
+    cache, _ = make_tiered(clock, DownRedis())
+    key = make_cache_key('abc', 5)
+    entry = make_entry(RESULTS, 0.1)
+
+    cache.set(key, entry)
+    assert cache.get(key) == entry
+    assert cache.get_many([key, make_cache_key('def', 5)]) == [entry, None]
+    cache.delete(key)
+    cache.clear()
+    assert cache.get(key) is None
+    assert cache.remote.errors >= 4
+    assert 'Redis缓存访问失败' in capsys.readouterr().out
+
+
+def test_clear_only_removes_own_prefix(clock):
+    cache, client = make_tiered(clock)
+    client.set('other:key', b'1')
+    cache.set(make_cache_key('abc', 5), make_entry(RESULTS, 0.1))
+    cache.clear()
+    assert list(client.data) == ['other:key']
+    assert len(cache) == 0
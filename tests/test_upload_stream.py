@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import zipfile
+
+import pytest
+
+from upload_stream import iter_zip
+
+
+def make_zip(members: dict, compression=zipfile.ZIP_STORED) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def test_zip_members_and_per_file_limit():
+    body = make_zip({'a.jpg': b'a' * 10, 'dir/': b'', 'big.jpg': b'b' * 100})
+    assert list(iter_zip(body, max_file_size=50, max_archive_size=1024)) == [
+        ('a.jpg', b'a' * 10, None), ('big.jpg', None, '文件过大')]
+
+
+def test_zip_spool_stops_at_archive_limit():
+    body = make_zip({f'{k}.jpg': bytes([k]) * 1000 for k in range(10)})
+    with pytest.raises(ValueError, match='压缩包超过'):
+        list(iter_zip(body, max_file_size=1000, max_archive_size=5000))
+
+
+def test_zip_bomb_stops_at_extracted_limit():
+    # 压缩后远小于上限，解压后每个成员都不超过单文件上限，但总量超过上限
+    body = make_zip({f'{k}.jpg': b'\0' * 4000 for k in range(10)}, zipfile.ZIP_DEFLATED)
+    assert len(body.getvalue()) < 5000
+    members = iter_zip(body, max_file_size=4000, max_archive_size=10000)
+    assert [name for name, _, _ in (next(members), next(members))] == ['0.jpg', '1.jpg']
+    with pytest.raises(ValueError, match='解压后超过'):
+        next(members)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from result_cache import ResultCache
+from url_fetcher import FetchError, URLFetcher
+
+IMAGE = bytes(range(256)) * 64  # 16KB
+
+
+class ImageServer:
+    """
+    本机的模拟图片服务器
+      /img/<n>.jpg    正常图片，响应前等待delay秒
+      /redirect/<n>   302跳转到/img/<n>.jpg
+      /big.jpg        Content-Length超过上限
+      /chunked.jpg    分块传输、不带Content-Length，总大小超过上限
+      /slow.jpg       超过下载超时
+      /trickle.jpg    每次读取都不超时，但整体发送得很慢
+      其他路径        404
+    """
+
+    def __init__(self, delay=0.0, slow_delay=1.0):
+        self.delay = delay
+        self.slow_delay = slow_delay
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def send(self, handler, status, body=b'', headers=()):
+        handler.send_response(status)
+        for name, value in headers:
+            handler.send_header(name, value)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def handle(self, handler):
+        path = handler.path
+        if path.startswith('/redirect/'):
+            self.send(handler, 302, headers=[('Location', f'/img/{path.rsplit("/", 1)[1]}.jpg')])
+        elif path.startswith('/img/'):
+            with self.lock:
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            try:
+                time.sleep(self.delay)
+                self.send(handler, 200, IMAGE, [('Content-Type', 'image/jpeg')])
+            finally:
+                with self.lock:
+                    self.active -= 1
+        elif path == '/big.jpg':
+            self.send(handler, 200, IMAGE * 4)
+        elif path == '/chunked.jpg':
+            handler.send_response(200)
+            handler.send_header('Transfer-Encoding', 'chunked')
+            handler.end_headers()
+            try:
+                for _ in range(8):
+                    handler.wfile.write(b'%x\r\n%s\r\n' % (len(IMAGE), IMAGE))
+                handler.wfile.write(b'0\r\n\r\n')
+            except OSError:
+                pass
+        elif path == '/trickle.jpg':
+            handler.send_response(200)
+            handler.send_header('Content-Length', str(len(IMAGE)))
+            handler.end_headers()
+            try:
+                for k in range(0, len(IMAGE), 1024):
+                    handler.wfile.write(IMAGE[k: k + 1024])
+                    handler.wfile.flush()
+                    time.sleep(0.1)
+            except OSError:
+                pass
+        elif path == '/slow.jpg':
+            time.sleep(self.slow_delay)
+            try:
+                self.send(handler, 200, IMAGE)
+            except OSError:
+                pass
+        else:
+            self.send(handler, 404)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    server = ImageServer()
+    yield server
+    server.close()
+
+
+def run_fetcher(coro_func, **kwargs):
+    """在新的事件循环中创建下载器并执行coro_func(fetcher)"""
+    async def main():
+        options = {'max_bytes': len(IMAGE) * 2, 'timeout': 0.5, 'digest_cache': ResultCache(max_entries=100)}
+        options.update(kwargs)
+        fetcher = URLFetcher(**options)
+        try:
+            return await coro_func(fetcher)
+        finally:
+            await fetcher.close()
+    return asyncio.run(main())
+
+
+def fetch_error(fetcher_kwargs, url):
+    async def fetch(fetcher):
+        with pytest.raises(FetchError) as info:
+            await fetcher.fetch(url)
+        return info.value
+    return run_fetcher(fetch, **fetcher_kwargs)
+
+
+def test_fetch_and_digest_cache(server):
+    url = f'{server.url}/img/1.jpg'
+
+    async def fetch(fetcher):
+        assert fetcher.lookup_digest(url) is None
+        data, image_hash = await fetcher.fetch(url)
+        return data, image_hash, fetcher.lookup_digest(url)
+
+    data, image_hash, cached_hash = run_fetcher(fetch)
+    assert bytes(data) == IMAGE
+    assert image_hash == cached_hash
+    assert len(image_hash) == 32
+
+
+def test_follows_redirects(server):
+    async def fetch(fetcher):
+        return await fetcher.fetch(f'{server.url}/redirect/7')
+
+    data, _ = run_fetcher(fetch)
+    assert bytes(data) == IMAGE
+
+
+def test_size_cap_by_content_length(server):
+    error = fetch_error({}, f'{server.url}/big.jpg')
+    assert error.status_code == 413
+
+
+def test_size_cap_while_streaming(server):
+    error = fetch_error({}, f'{server.url}/chunked.jpg')
+    assert error.status_code == 413
+
+
+def test_timeout(server):
+    error = fetch_error({'timeout': 0.2}, f'{server.url}/slow.jpg')
+    assert error.status_code == 504
+
+
+def test_total_timeout_for_slow_sender(server):
+    async def fetch(fetcher):
+        start = time.perf_counter()
+        with pytest.raises(FetchError) as info:
+            await fetcher.fetch(f'{server.url}/trickle.jpg')
+        return info.value, time.perf_counter() - start, dict(fetcher._host_slots)
+
+    # 16个数据块间隔0.1秒，每次读取都在timeout之内，整体超过total_timeout
+    error, elapsed, host_slots = run_fetcher(fetch, total_timeout=0.5)
+    assert error.status_code == 504
+    assert elapsed < 1.2
+    assert host_slots == {}
+
+
+def test_http_error_and_bad_url(server):
+    assert fetch_error({}, f'{server.url}/missing').status_code == 502
+    assert fetch_error({}, 'ftp://example.com/a.jpg').status_code == 400
+
+
+def test_per_host_limit_and_idle_hosts_dropped(server):
+    server.delay = 0.1
+
+    async def fetch_all(fetcher):
+        results = await asyncio.gather(*[fetcher.fetch(f'{server.url}/img/{k}.jpg') for k in range(8)])
+        return results, dict(fetcher._host_slots)
+
+    results, host_slots = run_fetcher(fetch_all, per_host_limit=2)
+    assert len(results) == 8
+    assert server.max_active == 2
+    # 下载结束后不再保留主机的信号量
+    assert host_slots == {}
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import tarfile
+import tempfile
+import zipfile
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# 超过该大小的zip上传会落盘
+ZIP_SPOOL_SIZE = 8 * 1024 * 1024
+
+TAR_TYPES = {'application/x-tar', 'application/gzip', 'application/x-gzip', 'application/x-gtar'}
+ZIP_TYPES = {'application/zip', 'application/x-zip-compressed'}
+
+
+class StreamAborted(Exception):
+    """流式处理已被取消（如客户端断开）"""
+
+
+class BodyPipe:
+    """
+    请求体管道
+
+    事件循环一侧把request.stream()的数据块写入有界队列，
+    解析线程一侧以普通文件对象的方式read()；队列满时停止读取socket，形成背压。
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_chunks: int = 8):
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=max_chunks)
+        self._buffer = b''
+        self._eof = False
+        self.aborted = False
+
+    async def feed(self, stream):
+        """在事件循环中读取请求体直到结束，读取出错时按提前结束处理"""
+        try:
+            async for chunk in stream:
+                if chunk:
+                    await self._queue.put(chunk)
+        except Exception as e:
+            print(f"请求体读取中断: {e}")
+        await self._queue.put(b'')
+
+    def call_soon(self, coro):
+        """在解析线程中等待事件循环上的协程，取消时抛出StreamAborted"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        while True:
+            if self.aborted:
+                future.cancel()
+                raise StreamAborted()
+            try:
+                return future.result(timeout=0.5)
+            except FutureTimeoutError:
+                continue
+
+    def _next_chunk(self) -> bytes:
+        if self._eof:
+            return b''
+        chunk = self.call_soon(self._queue.get())
+        if not chunk:
+            self._eof = True
+        return chunk
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            self._buffer += self._next_chunk()
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def iter_multipart(pipe: BodyPipe, boundary: bytes, max_file_size: int):
+    """逐个产出multipart中的文件: (文件名, 内容, 错误)"""
+    state = {'headers': {}, 'field': b'', 'value': b'', 'data': bytearray(), 'too_large': False}
+    completed = []
+
+    def on_part_begin():
+        state.update(headers={}, data=bytearray(), too_large=False)
+
+    def on_header_field(data, start, end):
+        state['field'] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state['value'] += data[start:end]
+
+    def on_header_end():
+        state['headers'][state['field'].lower()] = state['value']
+        state['field'] = state['value'] = b''
+
+    def on_part_data(data, start, end):
+        if state['too_large']:
+            return
+        if len(state['data']) + (end - start) > max_file_size:
+            state['too_large'] = True
+            state['data'] = bytearray()
+            return
+        state['data'] += data[start:end]
+
+    def on_part_end():
+        _, options = parse_options_header(state['headers'].get(b'content-disposition', b''))
+        filename = options.get(b'filename')
+        if filename is None:
+            # 非文件字段忽略
+            return
+        filename = filename.decode('utf-8', 'replace')
+        if state['too_large']:
+            completed.append((filename, None, '文件过大'))
+        else:
+            completed.append((filename, bytes(state['data']), None))
+        state['data'] = bytearray()
+
+    parser = MultipartParser(boundary, {
+        'on_part_begin': on_part_begin,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end,
+    })
+    while True:
+        chunk = pipe.read(64 * 1024)
+        if not chunk:
+            break
+        parser.write(chunk)
+        while completed:
+            yield completed.pop(0)
+    parser.finalize()
+    while completed:
+        yield completed.pop(0)
+
+
+def iter_tar(pipe: BodyPipe, max_file_size: int):
+    """顺序读取tar（含tar.gz）中的文件，不需要随机访问"""
+    with tarfile.open(fileobj=pipe, mode='r|*') as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            if member.size > max_file_size:
+                yield member.name, None, '文件过大'
+                continue
+            yield member.name, archive.extractfile(member).read(), None
+
+
+def iter_zip(pipe: BodyPipe, max_file_size: int, max_archive_size: int):
+    """
+    zip的目录位于文件末尾，先落盘再逐个读取
+
+    落盘的压缩包与解压出的文件总大小都不超过max_archive_size，超过时停止读取并报错，
+    避免单个请求占满磁盘，或用大量小于单文件上限的成员（zip炸弹）放大解压量。
+    """
+    with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_SIZE) as spool:
+        spooled = 0
+        while True:
+            chunk = pipe.read(64 * 1024)
+            if not chunk:
+                break
+            spooled += len(chunk)
+            if spooled > max_archive_size:
+                raise ValueError(f'压缩包超过{max_archive_size}字节')
+            spool.write(chunk)
+        spool.seek(0)
+        extracted = 0
+        with zipfile.ZipFile(spool) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                if info.file_size > max_file_size:
+                    yield info.filename, None, '文件过大'
+                    continue
+                # zipfile读出的数据不会超过目录中登记的大小，按登记的大小累计即可
+                extracted += info.file_size
+                if extracted > max_archive_size:
+                    raise ValueError(f'压缩包解压后超过{max_archive_size}字节')
+                yield info.filename, archive.read(info), None
+
+
+def detect_format(content_type: str):
+    """根据Content-Type判断上传格式: multipart/tar/zip，不支持时返回None"""
+    mime, options = parse_options_header(content_type or '')
+    mime = mime.decode('latin-1') if isinstance(mime, bytes) else mime
+    if mime == 'multipart/form-data' and options.get(b'boundary'):
+        return 'multipart'
+    if mime in TAR_TYPES:
+        return 'tar'
+    if mime in ZIP_TYPES:
+        return 'zip'
+    return None
+
+
+def iter_uploads(pipe: BodyPipe, content_type: str, max_file_size: int, max_archive_size: int):
+    upload_format = detect_format(content_type)
+    if upload_format == 'multipart':
+        _, options = parse_options_header(content_type)
+        return iter_multipart(pipe, options[b'boundary'], max_file_size)
+    if upload_format == 'tar':
+        return iter_tar(pipe, max_file_size)
+    if upload_format == 'zip':
+        return iter_zip(pipe, max_file_size, max_archive_size)
+    raise ValueError(f'不支持的上传类型: {content_type}')
+
+
+def has_allowed_extension(filename: str, allowed_extensions) -> bool:
+    return os.path.splitext(filename)[1].lower() in allowed_extensions
+
+
+async def stream_uploads(request, process, allowed_extensions, max_inflight: int = 4,
+                         max_file_size: int = 16 * 1024 * 1024, max_archive_size: int = 512 * 1024 * 1024):
+    """
+    流式识别上传的图片，每完成一张就产出一条结果
+
+    process(filename, data)是处理单张图片的协程；
+    同时处理与待输出的图片数不超过max_inflight，客户端读取变慢时上传也随之放缓。
+    max_archive_size限制zip上传落盘与解压的总字节数。
+    """
+    loop = asyncio.get_running_loop()
+    pipe = BodyPipe(loop)
+    items = asyncio.Queue(maxsize=1)
+    results = asyncio.Queue()
+    slots = asyncio.Semaphore(max(1, max_inflight))
+    content_type = request.headers.get('content-type', '')
+
+    def extract():
+        """解析线程：把文件逐个放入items队列"""
+        try:
+            for filename, data, error in iter_uploads(pipe, content_type, max_file_size, max_archive_size):
+                if error is None and not has_allowed_extension(filename, allowed_extensions):
+                    data, error = None, '不支持的文件格式'
+                pipe.call_soon(items.put((filename, data, error)))
+        except StreamAborted:
+            return
+        except Exception as e:
+            pipe.call_soon(items.put((None, None, f'上传解析失败: {e}')))
+        pipe.call_soon(items.put(None))
+
+    async def handle(filename, data, error):
+        if error is not None:
+            result = {'filename': filename, 'error': error}
+        else:
+            try:
+                result = {'filename': filename, **(await process(filename, data))}
+            except Exception as e:
+                result = {'filename': filename, 'error': getattr(e, 'detail', None) or str(e)}
+        await results.put(result)
+
+    async def dispatch():
+        tasks = []
+        try:
+            while True:
+                item = await items.get()
+                if item is None:
+                    break
+                await slots.acquire()
+                tasks.append(asyncio.ensure_future(handle(*item)))
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await results.put(None)
+
+    feeder = asyncio.ensure_future(pipe.feed(request.stream()))
+    extractor = loop.run_in_executor(None, extract)
+    dispatcher = asyncio.ensure_future(dispatch())
+    try:
+        while True:
+            result = await results.get()
+            if result is None:
+                break
+            slots.release()
+            yield result
+    finally:
+        pipe.aborted = True
+        feeder.cancel()
+        dispatcher.cancel()
+        await asyncio.gather(feeder, dispatcher, extractor, return_exceptions=True)
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    NDJSON流式响应
+
+    ASGI 2.3下StreamingResponse会并发调用receive()监听断开，
+    会与仍在读取的请求体抢消息；这里只负责发送。
+    """
+
+    media_type = 'application/x-ndjson'
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
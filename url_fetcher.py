@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from app_config import get_config
+from result_cache import ResultCache
+
+
+class FetchError(Exception):
+    """图片下载失败，status_code为返回给调用方的HTTP状态码"""
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class URLFetcher:
+    """
+    异步图片下载器
+
+    共享一个保持长连接的连接池，每个主机的并发下载数有上限；
+    边下载边计算MD5，超过max_bytes立即中止。
+    timeout只限制单次连接与读取，整个下载另受total_timeout限制，
+    持续缓慢发送数据的服务器不能无限期占用下载名额。
+    下载成功后记录URL -> 图片摘要，同一URL再次提交时可直接查结果缓存。
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, timeout: float = 10.0,
+                 connect_timeout: float = 3.0, total_timeout: float = 30.0, max_connections: int = 64,
+                 per_host_limit: int = 8, digest_cache: Optional[ResultCache] = None, transport=None):
+        self.max_bytes = int(max_bytes)
+        self.total_timeout = total_timeout
+        self.per_host_limit = max(1, int(per_host_limit))
+        self.digest_cache = digest_cache if digest_cache is not None else ResultCache(max_entries=0)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            follow_redirects=True,
+            transport=transport,
+        )
+        self._host_slots = {}  # 主机 -> [信号量, 正在下载与等待的请求数]
+
+    @asynccontextmanager
+    async def _host_slot(self, host: str):
+        """占用主机的一个下载名额；只保留有请求的主机，空闲后即删除，访问过的主机再多也不会累积"""
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = [asyncio.Semaphore(self.per_host_limit), 0]
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0:
+                del self._host_slots[host]
+
+    def lookup_digest(self, url: str) -> Optional[str]:
+        """最近下载过的URL对应的图片摘要"""
+        return self.digest_cache.get(url)
+
+    async def _download(self, url: str, digest, buffer: bytearray):
+        async with self.client.stream('GET', url) as response:
+            if response.status_code != 200:
+                raise FetchError(f'下载失败: HTTP {response.status_code}')
+            content_length = response.headers.get('content-length')
+            if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+                raise FetchError('图片过大', 413)
+            async for chunk in response.aiter_bytes():
+                if len(buffer) + len(chunk) > self.max_bytes:
+                    raise FetchError('图片过大', 413)
+                digest.update(chunk)
+                buffer += chunk
+
+    async def fetch(self, url: str) -> Tuple[bytearray, str]:
+        """下载图片，返回(内容, MD5)，失败时抛出FetchError"""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.netloc:
+            raise FetchError(f'不支持的URL: {url}', 400)
+
+        digest = hashlib.md5()
+        buffer = bytearray()
+        try:
+            async with self._host_slot(parts.netloc):
+                # 总时限从占到主机名额开始计算，不包括排队等待名额的时间
+                await asyncio.wait_for(self._download(url, digest, buffer), self.total_timeout)
+        except (httpx.TimeoutException, asyncio.TimeoutError):
+            raise FetchError('下载超时', 504)
+        except httpx.HTTPError as e:
+            raise FetchError(f'下载失败: {e}')
+        if not buffer:
+            raise FetchError('下载内容为空')
+
+        image_hash = digest.hexdigest()
+        self.digest_cache.set(url, image_hash)
+        return buffer, image_hash
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_url_fetcher(**kwargs) -> URLFetcher:
+    """根据config.yaml的url_fetch配置创建下载器，单张大小上限沿用upload.max_file_size"""
+    options = {
+        'max_bytes': get_config('upload', 'max_file_size', 16 * 1024 * 1024),
+        'timeout': get_config('url_fetch', 'timeout', 10),
+        'connect_timeout': get_config('url_fetch', 'connect_timeout', 3),
+        'total_timeout': get_config('url_fetch', 'total_timeout', 30),
+        'max_connections': get_config('url_fetch', 'max_connections', 64),
+        'per_host_limit': get_config('url_fetch', 'per_host_limit', 8),
+        'digest_cache': ResultCache(
+            max_entries=get_config('url_fetch', 'digest_cache_size', 10000),
+            max_bytes=16 * 1024 * 1024,
+            ttl=get_config('url_fetch', 'digest_cache_ttl', 600),
+        ),
+    }
+    options.update(kwargs)
+    return URLFetcher(**options)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from typing import List
+
+from starlette.concurrency import run_in_threadpool
+
+from batch_pipeline import identify_prepared, prepare_image, round_timings
+from result_cache import expand_results, make_cache_key, make_entry
+from url_fetcher import FetchError
+
+
+def url_result(index: int, url: str, outputs: dict, timings: dict, from_cache: bool = False) -> dict:
+    return {'index': index, 'url': url, **outputs, 'from_cache': from_cache,
+            'timings': round_timings(timings)}
+
+
+def url_error(index: int, url: str, message: str, timings: dict) -> dict:
+    return url_result(index, url, {'results': [], 'status': -1, 'message': message}, timings)
+
+
+async def stream_url_batch(fetcher, engine, cache, urls: List[str], topk: int = 5,
+                           max_downloads: int = 32, max_decoded: int = 32, batch_size: int = 10):
+    """
+    批量识别URL图片，每完成一个URL就产出一条结果（顺序与输入无关，按index对应）
+
+    第一阶段并发下载并解码，同时进行的下载不超过max_downloads；
+    第二阶段把已解码的图片按到达顺序凑批推理，等待推理的图片不超过max_decoded，
+    推理跟不上时下载随之暂停，内存占用有上限。
+    结果缓存可能在Redis中，读写都在线程池中进行，不阻塞事件循环。
+    """
+    download_slots = asyncio.Semaphore(max(1, max_downloads))
+    prepared = asyncio.Queue(maxsize=max(1, max_decoded))
+    results = asyncio.Queue()
+
+    async def cached_outputs(image_hash):
+        if not image_hash:
+            return None
+        entry = await run_in_threadpool(cache.get, make_cache_key(image_hash, topk))
+        if entry is None:
+            return None
+        return {'results': expand_results(entry), 'status': 0, 'message': 'OK'}
+
+    def store_entries(items):
+        for key, entry in items:
+            cache.set(key, entry)
+
+    async def download(index, url):
+        timings = {}
+        try:
+            outputs = await cached_outputs(fetcher.lookup_digest(url))
+            if outputs is not None:
+                await results.put(url_result(index, url, outputs, timings, from_cache=True))
+                return
+
+            start_time = time.perf_counter()
+            try:
+                data, image_hash = await fetcher.fetch(url)
+            except FetchError as e:
+                timings['download'] = time.perf_counter() - start_time
+                await results.put(url_error(index, url, str(e), timings))
+                return
+            timings['download'] = time.perf_counter() - start_time
+
+            outputs = await cached_outputs(image_hash)
+            if outputs is not None:
+                await results.put(url_result(index, url, outputs, timings, from_cache=True))
+                return
+
+            tensor, prepare_timings = await run_in_threadpool(prepare_image, engine, data)
+            timings.update(prepare_timings)
+            del data
+            if tensor is None:
+                await results.put(url_error(index, url, 'Image decode error!', timings))
+                return
+            # 推理队列满时在此等待，并继续占用下载名额
+            await prepared.put((index, url, tensor, image_hash, timings))
+        except Exception as e:
+            await results.put(url_error(index, url, f'处理失败: {e}', timings))
+        finally:
+            download_slots.release()
+
+    async def produce():
+        tasks = []
+        try:
+            for index, url in enumerate(urls):
+                await download_slots.acquire()
+                tasks.append(asyncio.ensure_future(download(index, url)))
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        await prepared.put(None)
+
+    async def infer():
+        finished = False
+        try:
+            while not finished:
+                item = await prepared.get()
+                if item is None:
+                    break
+                batch = [item]
+                while len(batch) < batch_size and not prepared.empty():
+                    item = prepared.get_nowait()
+                    if item is None:
+                        finished = True
+                        break
+                    batch.append(item)
+
+                try:
+                    outputs, batch_timings = await run_in_threadpool(
+                        identify_prepared, engine, [item[2] for item in batch], topk)
+                except Exception as e:
+                    print(f"批量推理失败: {e}")
+                    for index, url, _, _, timings in batch:
+                        await results.put(url_error(index, url, f'识别失败: {e}', timings))
+                    continue
+                entries = []
+                for (index, url, _, image_hash, timings), one_outputs in zip(batch, outputs):
+                    timings.update(batch_timings)
+                    if one_outputs['status'] == 0:
+                        process_time = sum(v for stage, v in timings.items() if stage != 'download')
+                        entries.append((make_cache_key(image_hash, topk),
+                                        make_entry(one_outputs['results'], process_time)))
+                    await results.put(url_result(index, url, one_outputs, timings))
+                await run_in_threadpool(store_entries, entries)
+        finally:
+            await results.put(None)
+
+    producer = asyncio.ensure_future(produce())
+    consumer = asyncio.ensure_future(infer())
+    try:
+        while True:
+            result = await results.get()
+            if result is None:
+                break
+            yield result
+    finally:
+        producer.cancel()
+        consumer.cancel()
+        await asyncio.gather(producer, consumer, return_exceptions=True)
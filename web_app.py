@@ -4,49 +4,113 @@
 import os
 import time
 import json
+import threading
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory
 from werkzeug.utils import secure_filename
-import cv2
-import numpy as np
 import base64
 from io import BytesIO
-from PIL import Image
 
-# 导入植物识别模块
-import plantid
+# 导入植物识别模块；依赖numpy、cv2、onnxruntime的模块在模型加载线程中才导入
+from app_config import get_config
+from metrics import CONTENT_TYPE_LATEST, ServiceMetrics, install_flask_hooks
+from model_loader import FAILED, ModelLoader, ModelNotReadyError
+from result_cache import create_result_cache, make_cache_key, make_entry
+from stage_timer import StageTimer
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# 服务指标
+metrics = ServiceMetrics()
+install_flask_hooks(app, metrics)
+
 # 确保上传目录存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 # 允许的文件扩展名
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
 
+# 单张图片最多返回的结果数，与API服务相同
+MAX_TOPK = 20
+
 # 全局植物识别器
 plant_identifier = None
 
+# 识别结果缓存
+result_cache = create_result_cache()
+
+# 批量识别的解码与推理线程池，正在执行与排队的任务数由submit_batch_task计数
+batch_workers = get_config('performance', 'max_workers', 4)
+batch_executor = ThreadPoolExecutor(max_workers=batch_workers, thread_name_prefix='batch')
+batch_pending = 0
+batch_pending_lock = threading.Lock()
+metrics.add_gauge('batch_queue_depth', '批量识别线程池排队的任务数',
+                  lambda: max(0, batch_pending - batch_workers))
+metrics.add_stats(result_cache.stats)
+
+def finish_batch_task(future=None):
+    global batch_pending
+    with batch_pending_lock:
+        batch_pending -= 1
+
+def submit_batch_task(func, *args):
+    """提交到批量识别线程池"""
+    global batch_pending
+    with batch_pending_lock:
+        batch_pending += 1
+    try:
+        future = batch_executor.submit(func, *args)
+    except Exception:
+        finish_batch_task()
+        raise
+    future.add_done_callback(finish_batch_task)
+    return future
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def init_plant_identifier():
-    """初始化植物识别器"""
+def load_plant_identifier():
+    """创建植物识别器，由model_loader调用"""
     global plant_identifier
-    if plant_identifier is None:
-        try:
-            plant_identifier = plantid.PlantIdentifier()
-            print("植物识别器初始化成功")
-        except Exception as e:
-            print(f"植物识别器初始化失败: {e}")
-            return False
-    return True
+    from plant_engine import create_plant_identifier
+    start_time = time.perf_counter()
+    plant_identifier = create_plant_identifier()
+    metrics.set_model_load_time(time.perf_counter() - start_time)
+    print("植物识别器初始化成功")
+    return plant_identifier
+
+# 模型加载器，导入耗时按以下顺序分别统计
+model_loader = ModelLoader(
+    load_plant_identifier,
+    imports=('numpy', 'cv2', 'PIL.Image', 'onnxruntime', 'image_utils', 'batch_pipeline', 'plant_engine'),
+    retry_after=get_config('startup', 'retry_after', 5),
+    reload_initial_delay=get_config('health', 'reload_initial_delay', 1),
+    reload_max_delay=get_config('health', 'reload_max_delay', 60)
+)
+
+def init_plant_identifier():
+    """初始化植物识别器，正在后台加载时等待加载完成"""
+    return model_loader.load()
+
+def model_unavailable():
+    """植物识别器不可用时返回错误响应（加载中为503），可用时返回None"""
+    try:
+        if model_loader.get() is not None:
+            return None
+    except ModelNotReadyError as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503
+    return jsonify({'error': '植物识别器初始化失败'}), 500
 
 def image_to_base64(image):
     """将OpenCV图像转换为base64字符串"""
+    import cv2
+    from PIL import Image
     if image is None:
         return None
     
@@ -83,13 +147,20 @@ def upload_file():
     
     try:
         # 初始化识别器
-        if not init_plant_identifier():
-            return jsonify({'error': '植物识别器初始化失败'}), 500
+        unavailable = model_unavailable()
+        if unavailable is not None:
+            return unavailable
+        import cv2
+        import numpy as np
+        from batch_pipeline import identify_staged
         
-        # 读取图片
-        file_content = file.read()
-        nparr = np.frombuffer(file_content, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # 读取图片，页面需要显示原图，按原尺寸解码
+        timer = StageTimer()
+        with timer.stage('read'):
+            file_content = file.read()
+        with timer.stage('decode'):
+            nparr = np.frombuffer(file_content, np.uint8)
+            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         
         if image is None:
             return jsonify({'error': '无法读取图片'}), 400
@@ -98,7 +169,8 @@ def upload_file():
         start_time = time.time()
         
         # 进行植物识别
-        outputs = plant_identifier.identify(image, topk=5)
+        outputs = identify_staged(plant_identifier, image, 5, timer)
+        metrics.observe_stages(timer)
         
         # 计算处理时间
         process_time = time.time() - start_time
@@ -149,52 +221,79 @@ def batch_upload():
     if not files or files[0].filename == '':
         return jsonify({'error': '没有选择文件'}), 400
     
+    max_files = get_config('api', 'max_batch_files', 10)
+    if len(files) > max_files:
+        return jsonify({'error': f'一次最多处理{max_files}张图片'}), 400
+    
     # 初始化识别器
-    if not init_plant_identifier():
-        return jsonify({'error': '植物识别器初始化失败'}), 500
+    unavailable = model_unavailable()
+    if unavailable is not None:
+        return unavailable
+    from batch_pipeline import identify_prepared, prepare_image, round_timings, split_batches
     
-    results = []
-    total_time = 0
+    batch_start = time.time()
+    valid_files = [file for file in files if file and allowed_file(file.filename)]
+    contents = [file.read() for file in valid_files]
+    
+    # 并行解码与预处理，单个文件出错只记入该文件的结果
+    futures = [submit_batch_task(prepare_image, plant_identifier, file_content) for file_content in contents]
+    prepared = []
+    errors = {}
+    for k, future in enumerate(futures):
+        try:
+            prepared.append(future.result())
+        except Exception as e:
+            prepared.append((None, StageTimer()))
+            errors[k] = str(e)
+    ready = [(k, tensor) for k, (tensor, _) in enumerate(prepared) if tensor is not None]
+    
+    # 按批量大小分组，每组一次模型推理
+    batches = split_batches(ready, get_config('performance', 'batch_size', 10))
+    futures = [submit_batch_task(identify_prepared, plant_identifier, [tensor for _, tensor in batch], 3)
+               for batch in batches]
+    outputs = {}
+    for batch, future in zip(batches, futures):
+        try:
+            batch_outputs, batch_timings = future.result()
+        except Exception as e:
+            for k, _ in batch:
+                errors[k] = str(e)
+            continue
+        for (k, _), one_outputs in zip(batch, batch_outputs):
+            outputs[k] = one_outputs
+            prepared[k][1].update(batch_timings)
     
-    for file in files:
-        if file and allowed_file(file.filename):
-            try:
-                # 读取图片
-                file_content = file.read()
-                nparr = np.frombuffer(file_content, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if image is not None:
-                    start_time = time.time()
-                    outputs = plant_identifier.identify(image, topk=3)
-                    process_time = time.time() - start_time
-                    total_time += process_time
-                    
-                    if outputs['status'] == 0:
-                        top_result = outputs['results'][0]
-                        results.append({
-                            'filename': secure_filename(file.filename),
-                            'chinese_name': top_result['chinese_name'],
-                            'latin_name': top_result['latin_name'],
-                            'probability': round(top_result['probability'] * 100, 2),
-                            'process_time': round(process_time, 3)
-                        })
-                    else:
-                        results.append({
-                            'filename': secure_filename(file.filename),
-                            'error': outputs['message']
-                        })
-                        
-            except Exception as e:
-                results.append({
-                    'filename': secure_filename(file.filename),
-                    'error': str(e)
-                })
+    results = []
+    for k, file in enumerate(valid_files):
+        timings = prepared[k][1]
+        metrics.observe_stages(timings)
+        if k in outputs and outputs[k]['status'] == 0:
+            top_result = outputs[k]['results'][0]
+            results.append({
+                'filename': secure_filename(file.filename),
+                'chinese_name': top_result['chinese_name'],
+                'latin_name': top_result['latin_name'],
+                'probability': round(top_result['probability'] * 100, 2),
+                'process_time': round(sum(timings.values()), 3),
+                'timings': round_timings(timings)
+            })
+        else:
+            if k in errors:
+                error = errors[k]
+            elif k in outputs:
+                error = outputs[k]['message']
+            else:
+                error = '无法读取图片'
+            results.append({
+                'filename': secure_filename(file.filename),
+                'error': error,
+                'timings': round_timings(timings)
+            })
     
     return jsonify({
         'success': True,
         'results': results,
-        'total_time': round(total_time, 3),
+        'total_time': round(time.time() - batch_start, 3),
         'total_files': len(results)
     })
 
@@ -206,56 +305,84 @@ def api_identify():
     
     file = request.files['image']
     topk = request.form.get('topk', 5, type=int)
+    if not 1 <= topk <= MAX_TOPK:
+        return jsonify({'error': f'topk须在1到{MAX_TOPK}之间'}), 400
     
     try:
-        # 初始化识别器
-        if not init_plant_identifier():
-            return jsonify({'error': '植物识别器初始化失败'}), 500
-        
-        # 读取图片
-        file_content = file.read()
-        nparr = np.frombuffer(file_content, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            return jsonify({'error': '无法读取图片'}), 400
-        
-        # 进行识别
-        outputs = plant_identifier.identify(image, topk=topk)
+        from image_utils import read_and_hash
+        # 读取图片，同时计算哈希
+        timer = StageTimer()
+        file_content, image_hash = read_and_hash(file.stream, timings=timer)
+        cache_key = make_cache_key(image_hash, topk)
         
-        if outputs['status'] != 0:
-            return jsonify({'error': outputs['message']}), 500
+        # 检查缓存，命中时无需解码与识别
+        with timer.stage('cache_lookup'):
+            entry = result_cache.get(cache_key)
+        timer.cache_hit = entry is not None
+        if entry is None:
+            # 初始化识别器
+            unavailable = model_unavailable()
+            if unavailable is not None:
+                return unavailable
+            from batch_pipeline import identify_staged
+            from image_utils import decode_for_inference
+            
+            with timer.stage('decode'):
+                image = decode_for_inference(file_content)
+            if image is None:
+                return jsonify({'error': '无法读取图片'}), 400
+            
+            # 进行识别
+            outputs = identify_staged(plant_identifier, image, topk, timer)
+            
+            if outputs['status'] != 0:
+                return jsonify({'error': outputs['message']}), 500
+            
+            entry = make_entry(outputs['results'], timer.elapsed())
+            result_cache.set(cache_key, entry)
+        metrics.observe_stages(timer)
         
         # 格式化结果
         results = []
-        for result in outputs['results']:
+        for chinese_name, latin_name, probability in entry[0]:
             results.append({
-                'chinese_name': result['chinese_name'],
-                'latin_name': result['latin_name'],
-                'probability': result['probability']
+                'chinese_name': chinese_name,
+                'latin_name': latin_name,
+                'probability': probability
             })
         
-        return jsonify({
+        response = jsonify({
             'status': 'success',
             'results': results,
             'timestamp': datetime.now().isoformat()
         })
+        response.headers['Server-Timing'] = timer.server_timing()
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus指标"""
+    if not metrics.enabled:
+        return jsonify({'error': '指标导出未启用'}), 404
+    return Response(metrics.render(), mimetype=CONTENT_TYPE_LATEST)
+
 @app.route('/health')
 def health_check():
-    """健康检查接口"""
-    try:
-        if init_plant_identifier():
-            return jsonify({'status': 'healthy', 'message': '服务正常运行'})
-        else:
-            return jsonify({'status': 'unhealthy', 'message': '植物识别器未初始化'}), 500
-    except Exception as e:
-        return jsonify({'status': 'unhealthy', 'message': str(e)}), 500
+    """健康检查接口，只读取模型加载状态，不会触发加载"""
+    state = {'live': True, 'ready': model_loader.ready, 'model_state': model_loader.state}
+    if model_loader.ready:
+        return jsonify({'status': 'healthy', 'message': '服务正常运行', **state})
+    if model_loader.state == FAILED:
+        return jsonify({'status': 'unhealthy', 'message': f'植物识别器初始化失败: {model_loader.error}', **state}), 500
+    return jsonify({'status': 'starting', 'message': '植物识别器加载中', **state}), 503
 
 if __name__ == '__main__':
     print("正在启动植物识别Web服务...")
     print("访问地址: http://localhost:5000")
+    # 调试模式下由重载器启动的子进程提供服务，只在子进程中加载模型
+    if get_config('startup', 'background_load', True) and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        model_loader.start()
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file